@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+#
+# Serial capture files for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# every byte through a serial pin, written in chunks (see
+# vcd.ChunkedWriter) rather than a line and a flush per byte:
+#
+#   header   magic 'SPSC', version
+#   bytes    (ns, 'R' for avr to us or 'T' for us to avr, byte) until
+#            the end of the file
+
+import struct
+import vcd
+
+MAGIC = 'SPSC'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+RECORD = struct.Struct('<QcB')
+RX = 'R'
+TX = 'T'
+
+class SerialCapture(vcd.ChunkedWriter):
+    def __init__(self, f, chunk=65536):
+        vcd.ChunkedWriter.__init__(self, f, chunk)
+        self.put(HEADER.pack(MAGIC, VERSION))
+
+    # byte is an int
+    def record(self, t, direction, byte):
+        self.put(RECORD.pack(t, direction, byte))
+
+# [(ns, direction, byte)] from a SerialCapture file
+def readCapture(f):
+    data = f.read()
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a serial capture, or the wrong version")
+    return [RECORD.unpack_from(data, pos)
+            for pos in range(HEADER.size, len(data) - RECORD.size + 1, RECORD.size)]
+
+# the bytes that went one way, as a string
+def stream(records, direction):
+    return str(bytearray(byte for t, d, byte in records if d == direction))
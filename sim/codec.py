@@ -2,7 +2,7 @@
 #
 # encoding only, no domain
 #
-# use arduino crc16.h and python crcmod
+# use arduino crc16.h, and crc16 below to match it
 #
 # TODO: use COBS
 
@@ -17,21 +17,57 @@
 #   uint16 crc
 # }
 
-import crcmod
+import binascii
 import struct
 from cobs import cobs
 
+# crc16 xmodem: polynomial 0x1021, initial value 0, nothing reflected or
+# inverted.  that's what binascii.crc_hqx computes, in C; the table
+# version is the same thing for pythons that don't have it.
+def makeCrcTable():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for bit in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xffff
+            else:
+                crc = (crc << 1) & 0xffff
+        table.append(crc)
+    return table
+
+CRC_TABLE = makeCrcTable()
+
+# crc carries on from an earlier crc16(), for data in pieces
+def crc16Table(data, crc=0):
+    table = CRC_TABLE
+    for byte in bytearray(data):
+        crc = ((crc << 8) & 0xff00) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+if hasattr(binascii, 'crc_hqx'):
+    def crc16(data, crc=0):
+        return binascii.crc_hqx(data, crc)
+else:
+    crc16 = crc16Table
+
+# a running crc, for a stream
+class Crc16:
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = crc16(data, self.value)
+        return self.value
+
 #class Payload:
 
 #class Packet:
 
 class Codec:
     crcStruct = struct.Struct("<H")
-    def __init__(self):
-        self.xmodem_crc_func = crcmod.predefined.mkCrcFun('xmodem')
-
     def crc(self, data):
-        return self.xmodem_crc_func(data)
+        return crc16(data)
 
     def packCrc(self, data):
         return Codec.crcStruct.pack(data)
@@ -54,7 +90,6 @@ class Codec:
         return self.unPackCrc(crcBytes)
 
     def packetEncode(self, payloadBytes):
-        crc = self.crc(payloadBytes)
         crcBytes = self.crcBytes(payloadBytes)
         return "%s%s" % (payloadBytes, crcBytes)
 
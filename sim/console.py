@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# Debug console for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# the firmware's debug serial, a line at a time.  lines that get past the
+# filter go in a ring of the last size lines, and to out (anything with
+# write(), like a file, a StringIO, or socket.makefile()) unless there
+# have been more than rate of them in the last simulated second.  so a
+# chatty firmware can't fill the memory or spend all the time writing.
+
+import collections
+
+class DebugConsole(object):
+    # filter takes a line and returns true to keep it
+    def __init__(self, out=None, size=1000, timestamps=False, filter=None,
+                 rate=None, maxLine=1024):
+        self.out = out
+        self.ring = collections.deque(maxlen=size)
+        self.timestamps = timestamps
+        self.filter = filter
+        self.rate = rate          # lines per second of simulated time
+        self.maxLine = maxLine    # longer lines are cut here
+        self.partial = bytearray()
+        self.start = None         # ns of the first byte of partial
+        self.window = None        # second being counted for rate
+        self.written = 0          # in window
+        self.suppressed = 0       # in window
+        self.total = 0            # lines, ever
+
+    # t is the ns of the first byte of data
+    def feed(self, t, data):
+        for byte in bytearray(data):
+            if self.start is None:
+                self.start = t
+            if byte == 10:          # \n
+                self.line(self.start, str(self.partial).rstrip('\r'))
+                del self.partial[:]
+                self.start = None
+            else:
+                self.partial.append(byte)
+                if len(self.partial) >= self.maxLine:
+                    self.line(self.start, str(self.partial))
+                    del self.partial[:]
+                    self.start = None
+
+    def line(self, t, text):
+        if self.filter is not None and not self.filter(text):
+            return
+        if self.timestamps:
+            text = "%.6f %s" % (t / 10.0**9, text)
+        self.total += 1
+        self.ring.append(text)
+        if self.out is None:
+            return
+        if self.rate is not None:
+            window = int(t // 10**9)
+            if window != self.window:
+                self.endWindow()
+                self.window = window
+            if self.written >= self.rate:
+                self.suppressed += 1
+                return
+            self.written += 1
+        self.out.write(text + '\n')
+
+    def endWindow(self):
+        if self.suppressed:
+            self.out.write("[%d lines suppressed]\n" % self.suppressed)
+        self.written = 0
+        self.suppressed = 0
+
+    def flush(self):
+        if self.out is not None:
+            self.out.flush()
+
+    # at the end: the line that never got its newline, and the count of
+    # the last window.  out is left open, it might be stderr.
+    def close(self):
+        if self.partial:
+            self.line(self.start, str(self.partial))
+            del self.partial[:]
+            self.start = None
+        if self.out is not None:
+            self.endWindow()
+        self.flush()
+
+    # oldest first
+    def lines(self):
+        return list(self.ring)
+
+    def clear(self):
+        self.ring.clear()
@@ -6,30 +6,137 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 
-import pysimulavr, sys
-
-# TODO: support for starting, i.e. not a fixed RPM
-class Crank(pysimulavr.PySimulationMember):
-    def __init__(self, rpm, degreesPerStep):
-        pysimulavr.PySimulationMember.__init__(self)
-        self.currentAngleDegrees = 0   # 0-720
-        self.degreesPerStep = degreesPerStep
+import bisect
+import math
+
+# rpm that changes linearly between (seconds, rpm) points and stays at the
+# last rpm after the last point.  each segment between points is worked out
+# up front (start time, total degrees turned so far, degrees per ns and
+# its rate of change), so the angle at a time, or the time at an angle, is
+# one bisect and a little arithmetic however long the profile is.
+#
+# times are ns from the start of the profile, angles are total degrees
+# turned since then, not wrapped at 720.
+class RpmProfile(object):
+    def __init__(self, points):
+        points = sorted(points)
+        if not points or points[0][0] != 0:
+            points.insert(0, (0, points[0][1] if points else 0))
+        self.times = []     # ns
+        self.angles = []    # degrees
+        self.rates = []     # degrees per ns at the start of the segment
+        self.accels = []    # degrees per ns per ns
+        angle = 0.0
+        for pos, (sec, rpm) in enumerate(points):
+            rate = rpm * 360.0 / 60.0 / 10**9
+            if pos + 1 < len(points):
+                nextSec, nextRpm = points[pos + 1]
+                length = (nextSec - sec) * 10.0**9
+                accel = (nextRpm * 360.0 / 60.0 / 10**9 - rate) / length
+            else:
+                length, accel = 0, 0.0
+            self.times.append(sec * 10.0**9)
+            self.angles.append(angle)
+            self.rates.append(rate)
+            self.accels.append(accel)
+            angle += rate * length + accel * length * length / 2
+
+    def rpmAt(self, t):
+        pos = max(0, bisect.bisect_right(self.times, t) - 1)
+        rate = self.rates[pos] + self.accels[pos] * (t - self.times[pos])
+        return rate * 60.0 * 10**9 / 360.0
+
+    def angleAt(self, t):
+        pos = max(0, bisect.bisect_right(self.times, t) - 1)
+        dt = t - self.times[pos]
+        return self.angles[pos] + self.rates[pos] * dt + self.accels[pos] * dt * dt / 2
+
+    # when the total angle gets to angle, or None if it never does
+    def timeAt(self, angle):
+        pos = max(0, bisect.bisect_right(self.angles, angle) - 1)
+        # several segments start at the same angle if the crank is stopped;
+        # the angle is only reached in the last of them.
+        degrees = angle - self.angles[pos]
+        rate = self.rates[pos]
+        accel = self.accels[pos]
+        # 0.5 * accel * dt^2 + rate * dt = degrees, written so that it
+        # still works when accel is zero
+        root = rate * rate + 2 * accel * degrees
+        if root < 0:
+            return None
+        divisor = rate + math.sqrt(root)
+        if divisor <= 0:
+            return None
+        return self.times[pos] + 2 * degrees / divisor
+
+# named drive cycles, (seconds, rpm)
+PROFILES = {
+    # cranking, catch, settle to idle
+    'start': [(0, 200), (3, 200), (3.5, 1200), (5, 850)],
+    # start, idle, wide open throttle to 6000, decel fuel cut, idle
+    'drive': [(0, 200), (3, 200), (3.5, 1200), (5, 850), (8, 850),
+              (12, 6000), (13, 6000), (17, 1200), (18, 850)],
+}
+
+# the angle is worked out from the simulated time when someone asks for it,
+# so nothing steps per degree; the trigger pins ask how long until their
+# next edge and sleep until then.  when the timing changes, the listeners
+# are called, so that anything sleeping until an angle can wake up and ask
+# again.
+class Crank(object):
+    def __init__(self, sc, rpm):
+        self.sc = sc
+        self.profile = None
+        self.offset = 0.0     # degrees added to the profile angle
+        self.listeners = []   # functions of no arguments
         self.SetRPM(rpm)
 
-    # overrides PySimulationMember.DoStep()
-    def DoStep(self, trueHwStep):
-        self.currentAngleDegrees = (self.currentAngleDegrees + self.degreesPerStep) % 720
-        #sys.stdout.write("currentAngleDegrees %f\n" % self.currentAngleDegrees)
-        return self.nsecPerStep
+    def addListener(self, listener):
+        self.listeners.append(listener)
+
+    def changed(self):
+        for listener in self.listeners:
+            listener()
+
+    # 0-720
+    @property
+    def currentAngleDegrees(self):
+        return self.angleAt(self.sc.GetCurrentTime())
+
+    @currentAngleDegrees.setter
+    def currentAngleDegrees(self, angle):
+        now = self.sc.GetCurrentTime()
+        self.offset = angle - self.profile.angleAt(now - self.start)
+        self.changed()
+
+    @property
+    def rpm(self):
+        return self.profile.rpmAt(self.sc.GetCurrentTime() - self.start)
+
+    def angleAt(self, t):
+        return (self.offset + self.profile.angleAt(t - self.start)) % 720
+
+    # ns from now until the crank gets to angle (0-720), always in the future
+    def nsecUntil(self, angle):
+        now = self.sc.GetCurrentTime() - self.start
+        total = self.offset + self.profile.angleAt(now)
+        degrees = (angle - total) % 720
+        if degrees == 0:
+            degrees = 720
+        t = self.profile.timeAt(total - self.offset + degrees)
+        if t is None:
+            return -1   # never
+        # round up so the pin wakes up at or just after the edge
+        return max(1, int(math.ceil(t - now)))
+
+    # follow profile from now on, keeping the angle continuous
+    def SetProfile(self, profile):
+        now = self.sc.GetCurrentTime()
+        angle = self.angleAt(now) if self.profile else 0.0
+        self.profile = profile
+        self.start = now
+        self.offset = angle
+        self.changed()
 
     def SetRPM(self, rpm):
-        self.rpm = rpm
-        self.secPerRev = 60.0 / self.rpm
-        self.secPerDegree = self.secPerRev / 360.0
-        #sys.stdout.write("secPerDegree %f\n" % self.secPerDegree)
-        self.nsecPerDegree = self.secPerDegree * 10**9
-        #sys.stdout.write("nsecPerDegree %f\n" % self.nsecPerDegree)
-        self.nsecPerStep = int(self.nsecPerDegree * self.degreesPerStep)
-        #sys.stdout.write("nsecPerStep %f\n" % self.nsecPerStep)
-        #sys.stdout.write("degreesPerStep %f\n" % self.degreesPerStep)
-        #sys.stdout.flush()
+        self.SetProfile(RpmProfile([(0, rpm)]))
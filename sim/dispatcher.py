@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+# One simulation member for all the Python peripherals
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+
+import pysimulavr
+import collections
+import events
+
+# simulavr calls DoStep() once per distinct wake-up time, and it steps
+# every peripheral that's due then (see events.EventQueue), so the
+# peripherals are plain objects with a step(now) method instead of
+# simulation members of their own.
+#
+# other threads mustn't touch simulavr, so they post() members instead,
+# which are stepped at the next DoStep(), whenever that is.  a member that
+# needs its posts seen sooner polls, by returning a delay from step().
+class Dispatcher(pysimulavr.PySimulationMember):
+    def __init__(self, sc):
+        pysimulavr.PySimulationMember.__init__(self)
+        self.sc = sc
+        self.events = events.EventQueue()
+        self.wakes = set()      # times simulavr is going to call DoStep()
+        self.stepping = False
+        self.posted = collections.deque()   # from other threads
+
+    # call member.step() delay ns from now, or sooner if it's already due
+    # sooner
+    def add(self, member, delay=0):
+        now = self.sc.GetCurrentTime()
+        t = now + delay
+        self.events.add(member, t)
+        if self.stepping:       # DoStep() picks it up on the way out
+            return
+        if not any(wake <= t for wake in self.wakes):
+            self.wakeNow(now)
+
+    # simulavr only lets a member in at the current time
+    def wakeNow(self, now):
+        self.wakes.add(now)
+        self.sc.Add(self)
+
+    def remove(self, member):
+        self.events.remove(member)
+
+    # call member.step() delay ns from now, even if it was due later
+    def reschedule(self, member, delay=0):
+        self.remove(member)
+        self.add(member, delay)
+
+    # call member.step() soon; safe from any thread
+    def post(self, member):
+        self.posted.append(member)
+
+    # overrides PySimulationMember.DoStep()
+    def DoStep(self, trueHwStep):
+        now = self.sc.GetCurrentTime()
+        self.wakes = set(wake for wake in self.wakes if wake > now)
+        posted = self.posted
+        while posted:
+            self.events.add(posted.popleft(), now)
+        self.stepping = True
+        try:
+            t = self.events.run(now)
+        finally:
+            self.stepping = False
+        if t is None or any(wake <= t for wake in self.wakes):
+            return -1  # nothing to do, or an earlier wake-up will see to it
+        self.wakes.add(t)
+        return t - now
@@ -6,9 +6,13 @@ from elftools.elf.elffile import ELFFile
 from elftools.dwarf.descriptions import (describe_attr_value, describe_DWARF_expr, set_global_machine_arch)
 from elftools.dwarf.locationlists import (LocationEntry, LocationExpr, LocationParser)
 from elftools.dwarf.dwarf_expr import (GenericExprVisitor, DW_OP_opcode2name)
+import array
 import struct
+import sys
 import binascii
+import re
 import memory
+import symcache
 
 ## represents the memory of the device
 #class Memory():
@@ -43,13 +47,224 @@ class OpVal(GenericExprVisitor):
         if opcode_name == self.op:
             self.val = args[0]
 
+# dwarf (encoding, byte_size) => (struct format, min, max, integral)
+# see https://docs.python.org/2.7/library/struct.html
+# see http://dwarfstd.org/doc/DWARF4.pdf
+# avr is little-endian.
+FORMATS = {
+    (2, 1): ('<?', 0, 1, False),                    # DW bool => py bool
+    (4, 4): ('<f', None, None, False),              # float (also double, maybe because atmega?) => float
+    (5, 2): ('<h', -32768, 32767, True),            # signed int (16)
+    (5, 4): ('<i', -2147483648, 2147483647, True),  # signed int (32)
+    (6, 1): ('<b', -128, 127, True),                # DW signed char => int
+    (7, 2): ('<H', 0, 65535, True),                 # unsigned int (16), python unsigned short == dwarf unsigned int
+    (7, 4): ('<I', 0, 4294967295, True),            # unsigned int (32)
+    (8, 1): ('<B', 0, 255, True),                   # DW unsigned char => int
+}
+
+# everything needed to read or write one primitive, worked out once from the
+# dwarf, so that a read is one memory fetch and one unpack.
+# these are shared through the cache, so don't change them.
+class Descriptor(object):
+    __slots__ = ('name', 'address', 'byte_size', 'encoding', 'bit_size', 'bit_offset',
+                 'const_value', 'struct', 'low', 'high', 'integral', 'mask', 'shift')
+
+    def __init__(self, name, address, byte_size, encoding,
+                 bit_size=None, bit_offset=None, const_value=None):
+        self.name = name
+        self.address = address
+        self.byte_size = byte_size
+        self.encoding = encoding
+        self.bit_size = bit_size
+        self.bit_offset = bit_offset
+        self.const_value = const_value
+        self.struct = None
+        self.low = None
+        self.high = None
+        self.integral = False
+        if (encoding, byte_size) in FORMATS:
+            fmt, self.low, self.high, self.integral = FORMATS[(encoding, byte_size)]
+            self.struct = struct.Struct(fmt)
+        self.mask = None
+        self.shift = None
+        if bit_size is not None and bit_offset is not None and (encoding, byte_size) == (8, 1):
+            # TOOD: this is a tiny part of the bit field possibilities, do the rest.
+            self.mask = Primitive.mask(byte_size, bit_size, bit_offset)
+            self.shift = 8 - bit_size - bit_offset
+
+    def __str__(self):
+        return "%s: addr %s size %s encoding %s" % (
+            self.name, self.address, self.byte_size, self.encoding)
+
+    # everything but the name, as plain values, for the symbol cache
+    def fields(self):
+        return [self.address, self.byte_size, self.encoding,
+                self.bit_size, self.bit_offset, self.const_value]
+
+    def check(self):
+        if self.struct is None:
+            raise ValueError("unknown encoding %s or byte_size %s" % (self.encoding, self.byte_size))
+
+    def read(self, memory):
+        if self.const_value is not None:
+            return self.const_value
+        self.check()
+        return self.decode(memory.read_block(self.address, self.byte_size), self.address)
+
+    # decode from a buffer holding device memory starting at address base
+    def decode(self, data, base):
+        offset = self.address - base
+        if self.mask is not None:
+            return (data[offset] & self.mask) >> self.shift
+        return self.struct.unpack_from(data, offset)[0]
+
+    def write(self, memory, value):
+        if self.const_value is not None:
+            raise ValueError("const value")
+        self.check()
+        if self.integral and not isinstance(value, int):
+            raise ValueError("value not integral")
+        if self.low is not None and (value < self.low or value > self.high):
+            raise ValueError("value out of bounds")
+        if self.mask is None:
+            data = bytearray(self.struct.pack(value))
+        else:
+            max_value = (1 << self.bit_size) - 1
+            if value > max_value:
+                raise ValueError("value %d out of bounds %d" % (value, max_value))
+            oldval = memory.get(self.address)
+            data = bytearray([((value << self.shift) & self.mask) | (oldval & ~self.mask)])
+        memory.write_block(self.address, data)
+
+# array.array typecodes with the same sizes as FORMATS.  bool comes back as 0/1.
+TYPECODES = {
+    (2, 1): 'B',
+    (4, 4): 'f',
+    (5, 2): 'h',
+    (5, 4): 'i',
+    (6, 1): 'b',
+    (7, 2): 'H',
+    (7, 4): 'I',
+    (8, 1): 'B',
+}
+
+def arrayType(encoding, byte_size):
+    if (encoding, byte_size) not in TYPECODES:
+        raise ValueError("unknown encoding %s or byte_size %s" % (encoding, byte_size))
+    result = array.array(TYPECODES[(encoding, byte_size)])
+    if result.itemsize != byte_size:
+        raise ValueError("no array type of size %d for encoding %d" % (byte_size, encoding))
+    return result
+
+# raw little-endian bytes => array.array, without touching each element
+def decodeArray(encoding, byte_size, data):
+    result = arrayType(encoding, byte_size)
+    result.fromstring(bytes(data))
+    if sys.byteorder == 'big':
+        result.byteswap()
+    return result
+
+# any sequence of values => raw little-endian bytes, with the same bounds
+# as Descriptor.write().  the typecode only bounds the size, so bool (B)
+# is checked against FORMATS too.
+def encodeArray(encoding, byte_size, values):
+    result = arrayType(encoding, byte_size)
+    try:
+        result.extend(values)
+    except OverflowError as e:
+        raise ValueError("value out of bounds: %s" % e)
+    except TypeError as e:      # e.g. a float for an int
+        raise ValueError("value not integral: %s" % e)
+    low, high = FORMATS[(encoding, byte_size)][1:3]
+    if result and low is not None and (min(result) < low or max(result) > high):
+        raise ValueError("value out of bounds %d..%d" % (low, high))
+    if sys.byteorder == 'big':
+        result.byteswap()
+    return bytearray(result.tostring())
+
+# returns stop, defaulting to the end
+def checkSlice(size, start, stop):
+    if stop is None:
+        stop = size
+    if start < 0 or stop > size or start > stop:
+        raise ValueError("bad slice [%d:%d] of %d elements" % (start, stop, size))
+    return stop
+
+# decode a struct's members out of its raw bytes, which start at address base
+def decodeSnapshot(member_descriptors, data, base):
+    result = {}
+    for member_name, descriptor in member_descriptors:
+        result[member_name] = descriptor.decode(data, base)
+    return result
+
 # represents the collection of all the variables in the dwarf
-class Globals:
-    def __init__(self, memory, elf_file_name, cu_name):
+class Globals(object):
+    # with cache=True the flattened layout is kept in a file next to the elf
+    # (see symcache.py), and the dwarf is only parsed if the cache is stale or
+    # something asks for a die.
+    def __init__(self, memory, elf_file_name, cu_name, cache=True):
         self.memory = memory
         self.cu_name = cu_name
         self.dwarf = Dwarf(elf_file_name)
-        self.cu_die = self.dwarf.getCuDie(cu_name)
+        self.structs = {}   # qualified name => [address, byte_size, member names]
+        self.arrays = {}    # qualified name => [address, upper_bound, element byte_size, element encoding]
+        self.snapshot_members = {}  # struct name => [(member name, descriptor)]
+        if cache:
+            self.loadLayout(symcache.SymbolCache(elf_file_name))
+        else:
+            self.dwarf.indexCu(self.cu_die)
+
+    # parses the dwarf if it hasn't been already
+    @property
+    def cu_die(self):
+        return self.dwarf.getCuDie(self.cu_name)
+
+    def loadLayout(self, cache):
+        layout = cache.load(self.cu_name)
+        if layout is None:
+            layout = self.buildLayout()
+            cache.save(self.cu_name, layout)
+        for name, fields in layout['primitives'].iteritems():
+            name = str(name)
+            self.dwarf.descriptors[name] = Descriptor(name, *fields)
+        for name, (address, byte_size, members) in layout['structs'].iteritems():
+            self.structs[str(name)] = [address, byte_size, [str(m) for m in members]]
+        for name, fields in layout['arrays'].iteritems():
+            self.arrays[str(name)] = fields
+
+    # the layout is plain lists and dicts, so it can go in a json file:
+    #
+    # { 'primitives': { qualified name: [ address, byte_size, encoding, bit_size, bit_offset, const_value ] },
+    #   'structs':    { name: [ address, byte_size, [ member names ] ] },
+    #   'arrays':     { name: [ address, upper_bound, element byte_size, element encoding ] } }
+    #
+    # array elements aren't listed, they're worked out from the array.
+    # variables the layout can't describe (pointers, declarations without a
+    # location, etc) are left out and go the slow way, through the dwarf.
+    def buildLayout(self):
+        layout = {'primitives': {}, 'structs': {}, 'arrays': {}}
+        for var_name in set(self.getAllVarNames()):
+            try:
+                var = self.variable(var_name)
+                if isinstance(var, Struct):
+                    member_names = var.getAllMemberNames()
+                    layout['structs'][var_name] = [var.location(), var.byte_size(), member_names]
+                    for member_name in member_names:
+                        try:
+                            descriptor = var.member(member_name).descriptor()
+                        except (ValueError, KeyError):
+                            continue
+                        layout['primitives'][descriptor.name] = descriptor.fields()
+                elif isinstance(var, Array):
+                    element = var.get(0)
+                    layout['arrays'][var_name] = [var.location(), var.upper_bound(),
+                                                  element.byte_size(), element.encoding()]
+                else:
+                    descriptor = var.descriptor()
+                    layout['primitives'][descriptor.name] = descriptor.fields()
+            except (ValueError, KeyError):
+                continue
+        return layout
 
     def variable(self, var_name):
         # check that var_name exists
@@ -58,6 +273,134 @@ class Globals:
             raise ValueError("invalid variable name %s" % var_name)
         return Variable.factory(self.memory, self.cu_name, var_die, None, self.dwarf)
 
+    # find a variable by qualified name, e.g. 'currentStatus.RPM' or 'cltCalibrationTable[3]'
+    def resolve(self, qualified_name):
+        result = None
+        for part in qualified_name.split('.'):
+            match = re.match(r'^(\w+)(?:\[(\d+)\])?$', part)
+            if match is None:
+                raise ValueError("invalid name %s" % qualified_name)
+            name, index = match.groups()
+            if result is None:
+                result = self.variable(name)
+            elif isinstance(result, Struct):
+                result = result.member(name)
+            else:
+                raise ValueError("%s is not a struct" % result.qualifiedName())
+            if index is not None:
+                if not isinstance(result, Array):
+                    raise ValueError("%s is not an array" % result.qualifiedName())
+                result = result.get(int(index))
+        return result
+
+    # the compiled descriptor for a primitive, cached by qualified name
+    def descriptor(self, qualified_name):
+        if qualified_name in self.dwarf.descriptors:
+            return self.dwarf.descriptors[qualified_name]
+        match = re.match(r'^(.*)\[(\d+)\]$', qualified_name)
+        if match is not None and match.group(1) in self.arrays:
+            return self.elementDescriptor(match.group(1), int(match.group(2)))
+        primitive = self.resolve(qualified_name)
+        if not isinstance(primitive, Primitive):
+            raise ValueError("%s is not a primitive" % qualified_name)
+        return primitive.descriptor()
+
+    def elementDescriptor(self, array_name, index):
+        address, upper_bound, byte_size, encoding = self.arrays[array_name]
+        if index > upper_bound:
+            raise ValueError("index %d greater than upper bound %d" % (index, upper_bound))
+        name = "%s[%d]" % (array_name, index)
+        descriptor = Descriptor(name, address + index * byte_size, byte_size, encoding)
+        self.dwarf.descriptors[name] = descriptor
+        return descriptor
+
+    # RAM offset of any variable, member or element
+    def address(self, qualified_name):
+        if qualified_name in self.structs:
+            return self.structs[qualified_name][0]
+        if qualified_name in self.arrays:
+            return self.arrays[qualified_name][0]
+        if qualified_name not in self.dwarf.descriptors and not qualified_name.endswith(']'):
+            return self.resolve(qualified_name).location()
+        descriptor = self.descriptor(qualified_name)
+        if descriptor.address is None:
+            raise ValueError("const value")
+        return descriptor.address
+
+    # in bytes
+    def size(self, qualified_name):
+        if qualified_name in self.structs:
+            return self.structs[qualified_name][1]
+        if qualified_name in self.arrays:
+            address, upper_bound, byte_size, encoding = self.arrays[qualified_name]
+            return (upper_bound + 1) * byte_size
+        if qualified_name in self.dwarf.descriptors or qualified_name.endswith(']'):
+            return self.descriptor(qualified_name).byte_size
+        return self.resolve(qualified_name).byte_size()
+
+    # the raw bytes of any variable, member or element, in one transfer
+    def read_block(self, qualified_name):
+        return self.memory.read_block(self.address(qualified_name), self.size(qualified_name))
+
+    def write_block(self, qualified_name, data):
+        size = self.size(qualified_name)
+        if len(data) != size:
+            raise ValueError("wrong size %d for %s, expected %d" % (len(data), qualified_name, size))
+        self.memory.write_block(self.address(qualified_name), data)
+
+    # arrays come back as array.array, see readArray()
+    def read(self, qualified_name):
+        if qualified_name in self.arrays:
+            return self.readArray(qualified_name)
+        return self.descriptor(qualified_name).read(self.memory)
+
+    def write(self, qualified_name, value):
+        if qualified_name in self.arrays:
+            return self.writeArray(qualified_name, value)
+        self.descriptor(qualified_name).write(self.memory, value)
+
+    # elements [start, stop) as an array.array, from one block read
+    def readArray(self, array_name, start=0, stop=None):
+        if array_name not in self.arrays:
+            return self.variable(array_name).read(start, stop)
+        address, upper_bound, byte_size, encoding = self.arrays[array_name]
+        stop = checkSlice(upper_bound + 1, start, stop)
+        data = self.memory.read_block(address + start * byte_size, (stop - start) * byte_size)
+        return decodeArray(encoding, byte_size, data)
+
+    # values is any sequence, written from element start with one block write
+    def writeArray(self, array_name, values, start=0):
+        if array_name not in self.arrays:
+            return self.variable(array_name).write(values, start)
+        address, upper_bound, byte_size, encoding = self.arrays[array_name]
+        checkSlice(upper_bound + 1, start, start + len(values))
+        self.memory.write_block(address + start * byte_size, encodeArray(encoding, byte_size, values))
+
+    # (member name, descriptor) pairs, worked out once per struct
+    def memberDescriptors(self, struct_name):
+        if struct_name in self.snapshot_members:
+            return self.snapshot_members[struct_name]
+        if struct_name in self.structs:
+            result = []
+            for member_name in self.structs[struct_name][2]:
+                qualified_name = "%s.%s" % (struct_name, member_name)
+                if qualified_name in self.dwarf.descriptors:
+                    result.append((member_name, self.dwarf.descriptors[qualified_name]))
+        else:
+            result = self.variable(struct_name).memberDescriptors()
+        self.snapshot_members[struct_name] = result
+        return result
+
+    # every member of a struct from one block read, see Struct.snapshot()
+    def snapshot(self, struct_name):
+        return decodeSnapshot(self.memberDescriptors(struct_name),
+                              self.read_block(struct_name), self.address(struct_name))
+
+    def getAllMemberNames(self, struct_name):
+        if struct_name in self.structs:
+            return self.structs[struct_name][2]
+        return self.variable(struct_name).getAllMemberNames()
+
     def getAllVarNames(self):
         result = []
         cu_die = self.dwarf.getCuDie(self.cu_name)
@@ -86,6 +429,23 @@ class Variable:
     def name(self):
         return self.var_die.attributes['DW_AT_name'].value
 
+    # all the bytes of the variable, in one transfer
+    def read_block(self):
+        return self.memory.read_block(self.location(), self.byte_size())
+
+    def write_block(self, data):
+        if len(data) != self.byte_size():
+            raise ValueError("wrong size %d for %s, expected %d" % (len(data), self.name(), self.byte_size()))
+        self.memory.write_block(self.location(), data)
+
+    # e.g. 'currentStatus.RPM' or 'cltCalibrationTable[3]'
+    def qualifiedName(self):
+        if self.parent is None:
+            return self.name()
+        if isinstance(self.parent, Array):
+            return "%s[%d]" % (self.parent.qualifiedName(), self.index)
+        return "%s.%s" % (self.parent.qualifiedName(), self.name())
+
     @staticmethod
     def factory(memory, cu_name, var_die, parent, dwarf):
         if dwarf.isStruct(cu_name, var_die):
@@ -106,6 +466,10 @@ class Struct(Variable):
                 return Primitive(self.memory, member_die, self, self.dwarf)
         raise ValueError("no member named %s % member_name")
 
+    def byte_size(self):
+        type_die = self.dwarf.resolveType(self.var_die.cu.get_top_DIE(), self.var_die)
+        return type_die.attributes['DW_AT_byte_size'].value
+
     def getAllMemberNames(self):
         result = []
         type_die = self.dwarf.resolveType(self.var_die.cu.get_top_DIE(), self.var_die)
@@ -117,11 +481,31 @@ class Struct(Variable):
             result.append(member_die.attributes['DW_AT_name'].value)
         return result
 
+    # (member name, descriptor) for every member that has one, i.e. not
+    # nested structs and the like.
+    def memberDescriptors(self):
+        result = []
+        type_die = self.dwarf.resolveType(self.var_die.cu.get_top_DIE(), self.var_die)
+        for member_die in type_die.iter_children():
+            if member_die.tag != 'DW_TAG_member' or 'DW_AT_name' not in member_die.attributes:
+                continue
+            try:
+                descriptor = Primitive(self.memory, member_die, self, self.dwarf).descriptor()
+            except (ValueError, KeyError):
+                continue
+            result.append((member_die.attributes['DW_AT_name'].value, descriptor))
+        return result
+
+    # all the members at once, decoded from one block read.
+    # returns a dict of member name => value.
+    def snapshot(self):
+        return decodeSnapshot(self.memberDescriptors(), self.read_block(), self.location())
+
 class Array(Variable):
 # todo change this to "element"
     def get(self, index):
         if index > self.upper_bound():
-            raise ValueException("index %d greater than upper bound %d" % (index, upper_bound))
+            raise ValueError("index %d greater than upper bound %d" % (index, self.upper_bound()))
         return Primitive(self.memory, self.var_die, self, self.dwarf, index)
 
     def upper_bound(self):
@@ -129,11 +513,31 @@ class Array(Variable):
         for child_die in type_die.iter_children():
             if child_die.tag == 'DW_TAG_subrange_type':
                 return child_die.attributes['DW_AT_upper_bound'].value
-        raise ValueException("no upper bound")
+        raise ValueError("no upper bound")
 
     def size(self):
         return self.upper_bound() + 1
 
+    # of the whole array
+    def byte_size(self):
+        return self.size() * self.get(0).byte_size()
+
+    # elements [start, stop) as an array.array, from one block read
+    def read(self, start=0, stop=None):
+        stop = checkSlice(self.size(), start, stop)
+        element = self.get(0)
+        byte_size = element.byte_size()
+        data = self.memory.read_block(self.location() + start * byte_size, (stop - start) * byte_size)
+        return decodeArray(element.encoding(), byte_size, data)
+
+    # values is any sequence, written from element start with one block write
+    def write(self, values, start=0):
+        checkSlice(self.size(), start, start + len(values))
+        element = self.get(0)
+        byte_size = element.byte_size()
+        data = encodeArray(element.encoding(), byte_size, values)
+        self.memory.write_block(self.location() + start * byte_size, data)
+
 #        type_die = self.dwarf.resolveType(self.var_die.cu.get_top_DIE(), self.var_die)
 #        for die in type_die.iter_children():
 #            if die.tag == 'DW_TAG_subrange_type':
@@ -154,173 +558,26 @@ class Primitive(Variable):
         return binint
         
     def read(self):
-        if 'DW_AT_const_value' in self.var_die.attributes:
-            return self.var_die.attributes['DW_AT_const_value'].value
-        encoding = self.encoding()
-        byte_size = self.byte_size()
-
-        # see https://docs.python.org/2.7/library/struct.html
-        # see http://dwarfstd.org/doc/DWARF4.pdf
-
-        location = self.location()
-        if encoding == 2 and byte_size == 1:  # DW bool => py bool
-            memval = self.memory.get(location)
-            return struct.unpack('?', '%s' % chr(memval))[0]
-
-        if encoding == 4 and byte_size == 4: # float (also double, maybe because atmega?) => float
-            memval = self.memory.get(location)
-            memval1 = self.memory.get(location+1)
-            memval2 = self.memory.get(location+2)
-            memval3 = self.memory.get(location+3)
-            return struct.unpack('f', '%s%s%s%s' % (chr(memval), chr(memval1), chr(memval2), chr(memval3)))[0]  
-
-        if encoding == 5 and byte_size == 2: # signed int (16)
-            memval = self.memory.get(location)
-            memval1 = self.memory.get(location+1)
-            # python unsigned short == dwarf unsigned int
-            return struct.unpack('h', '%s%s' % (chr(memval), chr(memval1)))[0]  
-
-        if encoding == 5 and byte_size == 4: # signed int (32)
-            memval = self.memory.get(location)
-            memval1 = self.memory.get(location+1)
-            memval2 = self.memory.get(location+2)
-            memval3 = self.memory.get(location+3)
-            return struct.unpack('i', '%s%s%s%s' % (chr(memval), chr(memval1), chr(memval2), chr(memval3)))[0]  
-
-        if encoding == 6 and byte_size == 1:  # DW signed char => int
-            memval = self.memory.get(location)
-            return struct.unpack('b', '%s' % chr(memval))[0]
-
-        if encoding == 7 and byte_size == 2: # unsigned int (16)
-            memval = self.memory.get(location)
-            memval1 = self.memory.get(location+1)
-            # python unsigned short == dwarf unsigned int
-            return struct.unpack('H', '%s%s' % (chr(memval), chr(memval1)))[0]  
-
-        if encoding == 7 and byte_size == 4: # unsigned int (32)
-            memval = self.memory.get(location)
-            memval1 = self.memory.get(location+1)
-            memval2 = self.memory.get(location+2)
-            memval3 = self.memory.get(location+3)
-            return struct.unpack('I', '%s%s%s%s' % (chr(memval), chr(memval1), chr(memval2), chr(memval3)))[0]  
-
-        if encoding == 8 and byte_size == 1:  # DW unsigned char => int
-            memval = self.memory.get(location)
-            bit_size = self.bit_size()
-            bit_offset = self.bit_offset()
-            if bit_size is not None and bit_offset is not None:
-                # TOOD: this is a tiny part of the bit field possibilities, do the rest.
-                memval &= Primitive.mask(byte_size, bit_size, bit_offset)
-                shift = 8 - bit_size - bit_offset
-                memval = memval >> shift
-            return struct.unpack('B', '%s' % chr(memval))[0]
-
-        raise ValueError("unknown encoding %d or byte_size %d" % (encoding, byte_size))
+        return self.descriptor().read(self.memory)
 
     def write(self, value):
+        self.descriptor().write(self.memory, value)
+
+    # the type, encoding and location are resolved once per qualified name
+    def descriptor(self):
+        name = self.qualifiedName()
+        if name in self.dwarf.descriptors:
+            return self.dwarf.descriptors[name]
+        descriptor = self.compile()
+        self.dwarf.descriptors[name] = descriptor
+        return descriptor
+
+    def compile(self):
         if 'DW_AT_const_value' in self.var_die.attributes:
-            raise ValueError("const value")
-        encoding = self.encoding()
-        byte_size = self.byte_size()
-
-        if encoding == 2 and byte_size == 1:  # bool
-            if value < 0 or value > 1:
-                raise ValueError("value out of bounds")
-            memval = struct.pack('?', value)
-            location = self.location()
-            self.memory.set(location, bytearray(memval)[0])
-            return
-
-        if encoding == 4 and byte_size == 4:  # float (also double, maybe because atmega?) => float
-            memval = struct.pack('f', value)
-            location = self.location()
-            for i,x in enumerate(bytearray(memval)):
-                self.memory.set(location+i, x)
-            return
-
-        if encoding == 5 and byte_size == 2: # signed int 16
-            if not isinstance(value, int):
-                raise ValueError("value not integral")
-            if value < -32768 or value > 32767:
-                raise ValueError("value out of bounds")
-            memval = struct.pack('h', value)
-            location = self.location()
-            for i,x in enumerate(bytearray(memval)):
-                self.memory.set(location + i, x)
-            return
-
-        if encoding == 5 and byte_size == 4: # signed int 32
-            if not isinstance(value, int):
-                raise ValueError("value not integral")
-            if value < -2147483648 or value > 2147483647:
-                raise ValueError("value out of bounds")
-            memval = struct.pack('i', value)
-            location = self.location()
-            for i,x in enumerate(bytearray(memval)):
-                self.memory.set(location + i, x)
-            return
-
-        if encoding == 6 and byte_size == 1:  # DW signed char => int
-            if not isinstance(value, int):
-                raise ValueError("value not integral")
-            if value < -128 or value > 127:
-                raise ValueError("value out of bounds")
-            memval = struct.pack('b', value)
-            location = self.location()
-            for i,x in enumerate(bytearray(memval)):
-                self.memory.set(location + i, x)
-            return
-
-        if encoding == 7 and byte_size == 2: # unsigned int
-            if not isinstance(value, int):
-                raise ValueError("value not integral")
-            if value < 0 or value > 65535:
-                raise ValueError("value out of bounds")
-            memval = struct.pack('H', value)  # python unsigned short == dwarf unsigned int
-            location = self.location()
-            for i,x in enumerate(bytearray(memval)):
-                self.memory.set(location + i, x)
-            return
-
-        if encoding == 7 and byte_size == 4: # unsigned long
-            if not isinstance(value, int):
-                raise ValueError("value not integral")
-            if value < 0 or value > 4294967295:
-                raise ValueError("value out of bounds")
-            memval = struct.pack('I', value)
-            location = self.location()
-            for i,x in enumerate(bytearray(memval)):
-                self.memory.set(location + i, x)
-            return
-
-        if encoding == 8 and byte_size == 1:  # unsigned char
-            if not isinstance(value, int):
-                raise ValueError("value not integral")
-            if value < 0 or value > 255:
-                raise ValueError("value out of bounds")
-            memval = struct.pack('B', value)
-            memval = bytearray(memval)[0]
-            location = self.location()
-
-            byte_size = self.byte_size()
-            bit_size = self.bit_size()
-            bit_offset = self.bit_offset()
-            if bit_size is not None and bit_offset is not None:
-                max_value = (1 << bit_size) - 1
-                if value > max_value:
-                    raise ValueError("value %d out of bounds %d" % (value, max_value))
-                # TOOD: this is a tiny part of the bit field possibilities, do the rest.
-                shift = 8 - bit_size - bit_offset
-                memval = memval << shift
-                mask = Primitive.mask(byte_size, bit_size, bit_offset)
-                memval &= mask
-                oldval = self.memory.get(location)
-                oldval &= ~mask
-                memval |= oldval
-            self.memory.set(location, memval)
-            return
-
-        raise ValueError("unknown encoding %d or byte_size %d" % (encoding, byte_size))
+            return Descriptor(self.qualifiedName(), None, None, None,
+                              const_value=self.var_die.attributes['DW_AT_const_value'].value)
+        return Descriptor(self.qualifiedName(), self.location(), self.byte_size(), self.encoding(),
+                          self.bit_size(), self.bit_offset())
 
     def encoding(self):
         type_die = self.dwarf.resolveType(self.var_die.cu.get_top_DIE(), self.var_die)
@@ -382,8 +639,28 @@ class Primitive(Variable):
         #return byte_size
 
 class Dwarf:
+    # the elf isn't read until the first getCuDie(), which is where every
+    # die comes from.
     def __init__(self, filename):
-        self.file = open(filename, 'rb')
+        self.filename = filename
+        self.file = None
+        # lookup tables, so that nothing walks the debug info more than once.
+        # the CU names are read on load, the per-CU tables are filled in the
+        # first time each CU is used.
+        self.cu_dies = {}       # CU name => CU die
+        self.var_dies = {}      # CU offset => { variable name => die }
+        self.offset_dies = {}   # absolute offset => die
+        self.type_dies = {}     # die offset => resolved type die
+        self.descriptors = {}   # qualified name => Descriptor
+
+    def __del__(self):
+        if self.file is not None:
+            self.file.close()
+
+    def load(self):
+        if self.file is not None:
+            return
+        self.file = open(self.filename, 'rb')
         self.elffile = ELFFile(self.file)
         self.dwarfinfo = self.elffile.get_dwarf_info()
         self.section_offset = self.dwarfinfo.debug_info_sec.global_offset
@@ -391,10 +668,16 @@ class Dwarf:
         set_global_machine_arch(self.elffile.get_machine_arch())
         self.loc_parser = LocationParser(self.location_lists)
         if not self.dwarfinfo.has_debug_info:
-            raise ValueError("no debug info found in file %s" % filename)
-
-    def __del__(self):
-        self.file.close()
+            raise ValueError("no debug info found in file %s" % self.filename)
+        for cu in self.dwarfinfo.iter_CUs():
+            cu_die = cu.get_top_DIE()
+            if cu_die.tag != 'DW_TAG_compile_unit':
+                continue
+            if 'DW_AT_name' not in cu_die.attributes:
+                continue
+            name = cu_die.attributes['DW_AT_name'].value
+            if name not in self.cu_dies:
+                self.cu_dies[name] = cu_die
 
     def getAll(self):
         cu_die = self.getCuDie(cu_name)
@@ -417,6 +700,13 @@ class Dwarf:
 
     # get the base type die for the specified die
     def resolveType(self, cu_die, die):
+        if die.offset in self.type_dies:
+            return self.type_dies[die.offset]
+        type_die = self.resolveTypeUncached(cu_die, die)
+        self.type_dies[die.offset] = type_die
+        return type_die
+
+    def resolveTypeUncached(self, cu_die, die):
         if die.tag == 'DW_TAG_base_type':
             if 'DW_AT_name' not in die.attributes: raise ValueError("base type has no name")
             if 'DW_AT_byte_size' not in die.attributes: raise ValueError("base type has no byte size")
@@ -465,10 +755,10 @@ class Dwarf:
 
     # get the die at (absolute) offset in the dwarf stream
     def getDieByOffset(self, cu_die, offset):
-        for die in cu_die.iter_children():
-            if die.offset == offset:
-                return die
-        raise ValueError("couldn't find offset")
+        self.indexCu(cu_die)
+        if offset not in self.offset_dies:
+            raise ValueError("couldn't find offset")
+        return self.offset_dies[offset]
 
     # get memory location by var_die
     def getLocation(self, var_die):
@@ -486,20 +776,32 @@ class Dwarf:
 
     # get compilation unit by name
     def getCuDie(self, name):
-        for cu in self.dwarfinfo.iter_CUs():
-            for die in cu.iter_DIEs():
-                if die.tag != 'DW_TAG_compile_unit':
-                    continue
-                if 'DW_AT_name' in die.attributes and die.attributes['DW_AT_name'].value == name:
-                    return die
-        raise ValueError("couldn't find compilation unit %s" % name)
+        self.load()
+        if name not in self.cu_dies:
+            raise ValueError("couldn't find compilation unit %s" % name)
+        return self.cu_dies[name]
 
     # get variable die by name
     def getVarDie(self, cu_die, name):
+        var_dies = self.indexCu(cu_die)
+        if name not in var_dies:
+            raise ValueError("couldn't find variable die %s" % name)
+        return var_dies[name]
+
+    # fill the variable and offset tables for one CU, just once.
+    # returns the variable table for the CU.
+    def indexCu(self, cu_die):
+        if cu_die.cu.cu_offset in self.var_dies:
+            return self.var_dies[cu_die.cu.cu_offset]
+        var_dies = {}
         for die in cu_die.iter_children():
+            self.offset_dies[die.offset] = die
             if die.tag != 'DW_TAG_variable':
                 continue
-            if 'DW_AT_name' in die.attributes and die.attributes['DW_AT_name'].value == name:
-                return die
-        raise ValueError("couldn't find variable die %s" % name)
-
+            if 'DW_AT_name' not in die.attributes:
+                continue
+            name = die.attributes['DW_AT_name'].value
+            if name not in var_dies:   # the first one wins, like the old linear scan
+                var_dies[name] = die
+        self.var_dies[cu_die.cu.cu_offset] = var_dies
+        return var_dies
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# EEPROM image file for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+
+import os
+
+# keeps the device eeprom (dev.eeprom) and an image file in step.
+# the file is read and written in one go, and save() only writes the
+# ranges that changed since the last load or save.
+class EepromImage:
+    def __init__(self, eeprom, filename):
+        self.eeprom = eeprom
+        self.filename = filename
+        self.size = eeprom.GetSize()
+        self.image = None   # what's in the file, None if we don't know
+
+    # the whole device eeprom as a bytearray
+    def read(self):
+        read = self.eeprom.ReadFromAddress
+        return bytearray([read(index) for index in xrange(self.size)])
+
+    def write(self, data, start=0):
+        write = self.eeprom.WriteAtAddress
+        for index, val in enumerate(data):
+            write(start + index, val)
+
+    # file => device.  if the file is short, the rest of the device keeps
+    # what it had, and the next save() writes the file whole, so the file
+    # never has holes where the device doesn't.
+    def load(self):
+        with open(self.filename, 'rb') as f:
+            data = bytearray(f.read(self.size))
+        self.write(data)
+        self.image = self.read() if len(data) == self.size else None
+
+    # [start, end) ranges where the device differs from the file
+    def dirtyRanges(self, current):
+        if self.image is None:
+            return [(0, self.size)]
+        if current == self.image:
+            return []
+        ranges = []
+        start = None
+        for index in xrange(self.size):
+            if current[index] != self.image[index]:
+                if start is None:
+                    start = index
+            elif start is not None:
+                ranges.append((start, index))
+                start = None
+        if start is not None:
+            ranges.append((start, self.size))
+        return ranges
+
+    # device => file, if anything changed.  returns the ranges written.
+    def save(self):
+        current = self.read()
+        ranges = self.dirtyRanges(current)
+        if not ranges:
+            return ranges
+        if self.image is None or not os.path.exists(self.filename):
+            with open(self.filename, 'wb') as f:
+                f.write(current)
+            ranges = [(0, self.size)]
+        else:
+            with open(self.filename, 'r+b') as f:
+                for start, end in ranges:
+                    f.seek(start)
+                    f.write(current[start:end])
+        self.image = current
+        return ranges
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+#
+# Closed-loop engine for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+
+import pulses
+import sensors
+
+# once per engine cycle, feeds the injector and coil pulses of the cycle
+# to a plant.EnginePlant and puts what comes back on the MAP and O2 pins
+# and the crank.  add it to a dispatcher.Dispatcher to get it stepped.
+class Engine(object):
+    # tdcAngle is the crank angle of cylinder 1 TDC, the others are every
+    # 180 degrees after it.
+    def __init__(self, sc, crank, plant, injectors, coils, tpsPin, mapPin, o2Pin,
+                 tdcAngle=0):
+        self.sc = sc
+        self.crank = crank
+        self.plant = plant
+        self.injectors = injectors   # OutputPins
+        self.coils = coils
+        self.tpsPin = tpsPin
+        self.mapPin = mapPin
+        self.o2Pin = o2Pin
+        self.tdcAngle = tdcAngle
+        # edge count of each pin at the end of the last cycle
+        self.since = dict((pin.name, pin.edges.count) for pin in injectors + coils)
+
+    # pulses on pin since the last cycle; one that hasn't finished yet is
+    # left for the next cycle.
+    def newPulses(self, pin, crank=None):
+        edges = pin.edges.edges(self.since[pin.name])
+        pending = edges and edges[-1][1] == pin.active
+        self.since[pin.name] = pin.edges.count - (1 if pending else 0)
+        return pulses.analyze(edges, pin.active, crank)
+
+    # degrees BTDC of a spark at angle, for the nearest TDC
+    def advance(self, angle):
+        advance = (self.tdcAngle - angle) % 180
+        if advance > 90:
+            advance -= 180
+        return advance
+
+    def cycle(self):
+        widths = []
+        for pin in self.injectors:
+            widths.extend(width / 10.0**6 for width in self.newPulses(pin).widths)
+        advances = []
+        for pin in self.coils:
+            advances.extend(map(self.advance, self.newPulses(pin, self.crank).endAngles))
+        throttle = self.tpsPin.GetAnalogValue(sensors.VCC) / sensors.VCC
+        self.plant.cycle(widths, advances, throttle)
+        self.mapPin.SetAnalogValue(sensors.SENSORS['map'](self.plant.mapKpa))
+        self.o2Pin.SetAnalogValue(sensors.SENSORS['o2'](self.plant.afr))
+        self.crank.SetRPM(self.plant.rpm)
+        #print "time %d rpm %d map %f afr %f" % (self.sc.GetCurrentTime(),
+        #    self.plant.rpm, self.plant.mapKpa, self.plant.afr)
+
+    # ns until the next cycle, for dispatcher.Dispatcher
+    def step(self, now):
+        self.cycle()
+        return self.crank.nsecUntil(self.crank.currentAngleDegrees)  # -1 if stalled
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#
+# Timed events for the simulated peripherals
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+
+import heapq, itertools
+
+# when each member wants its step(now) called.  step() has the same
+# contract as PySimulationMember.DoStep(): it returns ns until the next
+# call, or -1 for "don't call anymore".  a member is in the queue at most
+# once; asking for it again only ever brings it forward.
+class EventQueue(object):
+    def __init__(self):
+        self.heap = []   # (time, seq, member), including stale ones
+        self.seq = itertools.count()   # keeps the heap away from comparing members
+        self.due = {}    # id(member): (time, seq) of its live entry
+
+    def __len__(self):
+        return len(self.due)
+
+    # call member.step() at t or sooner
+    def add(self, member, t):
+        key = id(member)
+        if key in self.due and self.due[key][0] <= t:
+            return
+        seq = next(self.seq)
+        self.due[key] = (t, seq)
+        heapq.heappush(self.heap, (t, seq, member))
+
+    def remove(self, member):
+        self.due.pop(id(member), None)
+
+    # the time of the earliest event, or None
+    def next(self):
+        heap = self.heap
+        due = self.due
+        while heap:
+            t, seq, member = heap[0]
+            if due.get(id(member)) == (t, seq):
+                return t
+            heapq.heappop(heap)   # it was removed or brought forward
+        return None
+
+    # steps every member due by now, returns the time of the next event or
+    # None.  members that come due at the same time all run in one call.
+    def run(self, now):
+        heap = self.heap
+        due = self.due
+        while heap and heap[0][0] <= now:
+            t, seq, member = heapq.heappop(heap)
+            key = id(member)
+            if due.get(key) != (t, seq):
+                continue
+            del due[key]
+            delay = member.step(now)
+            if delay >= 0:
+                self.add(member, now + max(1, delay))
+        return self.next()
@@ -6,24 +6,57 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 
-import pysimulavr, random
+import pysimulavr, heapq, itertools
 
-class InputPin(pysimulavr.PySimulationMember, pysimulavr.Pin):
-    def __init__(self, sc, name):
+# just a pin, InputScheduler sets its value.
+class InputPin(pysimulavr.Pin):
+    def __init__(self, name):
         pysimulavr.Pin.__init__(self)
-        pysimulavr.PySimulationMember.__init__(self)
         self.SetPin('a')  # ?
-        self.sc = sc
         self.name = name
 
-    def DoStep(self, trueHwStep):
-        cur = self.GetAnalogValue(5.0) # supplying vcc here is lame
-        # random walk
-        cur += 0.1 * random.random() - 0.05
-        #cur = 4.0 * random.random() + 0.5
-        #cur = (cur + 0.1) % 5.0
-        #print(cur)
-        self.SetAnalogValue(cur)
-        #print "time %d input %s input %f" % (self.sc.GetCurrentTime(), self.name, cur)
-        return 10000000  # 10 ms
-        #return 10**9
+# plays a waveform (see waveforms.py) into each input pin.  there's one
+# dispatcher member for all of them, which only wakes up when some value
+# changes, and sets every pin that changes at that time in one go.  it
+# drops out of the dispatcher when every waveform has ended, and add()
+# puts it back.
+class InputScheduler(object):
+    def __init__(self, sc, dispatcher):
+        self.sc = sc
+        self.dispatcher = dispatcher
+        self.heap = []   # (time, seq, pin, start, volts, waveform)
+        self.seq = itertools.count()   # keeps the heap away from comparing pins
+        self.values = {}  # pin name: volts last set
+
+    # the waveform starts now
+    def add(self, pin, waveform):
+        now = self.sc.GetCurrentTime()
+        self.push(pin, now, waveform)
+        delay = self.update(now)
+        if delay >= 0:
+            self.dispatcher.add(self, delay)
+
+    def push(self, pin, start, waveform):
+        event = next(waveform, None)
+        if event is not None:
+            t, volts = event
+            heapq.heappush(self.heap, (start + t, next(self.seq), pin, start,
+                                       volts, waveform))
+
+    # sets everything due by now, returns ns until the next change or -1
+    def update(self, now):
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            t, seq, pin, start, volts, waveform = heapq.heappop(heap)
+            if self.values.get(pin.name) != volts:
+                pin.SetAnalogValue(volts)
+                self.values[pin.name] = volts
+                #print "time %d input %s input %f" % (now, pin.name, volts)
+            self.push(pin, start, waveform)
+        if not heap:
+            return -1
+        return heap[0][0] - now
+
+    # for dispatcher.Dispatcher
+    def step(self, now):
+        return self.update(now)
@@ -1,11 +1,20 @@
 import ctypes
 
+RAM_END = 8703 # mega2560 has 8k of ram
+
 # represents the memory of the device
 class Memory():
     def get(self,addr):      # int
         raise NotImplementedError()
     def set(self,addr,val):  # int
         raise NotImplementedError()
+    # n bytes starting at addr, as a bytearray
+    def read_block(self, addr, n):
+        return bytearray(self.get(addr + i) for i in range(n))
+    # data is bytes, bytearray or memoryview
+    def write_block(self, addr, data):
+        for i, val in enumerate(bytearray(data)):
+            self.set(addr + i, val)
 
 # internal python, for testing and maybe page flipping?
 # the cpp equivalent has another wrapper (one per byte) with a hook for tracing
@@ -21,13 +30,19 @@ class DictMemory(Memory):
         if not isinstance(val, int):
             raise ValueError("wrong value type: %s " % type(val))
         self.rw[addr] = val
+    def read_block(self, addr, n):
+        rw = self.rw
+        return bytearray(rw.get(a, 0) for a in range(addr, addr + n))
+    def write_block(self, addr, data):
+        data = bytearray(data)
+        self.rw.update(zip(range(addr, addr + len(data)), data))
 
 # interface to pysimulavr memory api
 class SimMemory(Memory):
     def __init__(self, dev):
         self.dev = dev
     def get(self, addr):
-        if addr < 0 or addr > 8703: # mega2560 has 8k of ram
+        if addr < 0 or addr > RAM_END:
             raise ValueError("addr out of bounds: %d" % addr)
         #print "get addr %d" % addr
         val = self.dev.GetRWMem(addr)
@@ -36,7 +51,7 @@ class SimMemory(Memory):
             raise ValueError("wrong value type: %s " % type(val))
         return val
     def set(self, addr, val):
-        if addr < 0 or addr > 8703: # mega2560 has 8k of ram
+        if addr < 0 or addr > RAM_END:
             raise ValueError("addr out of bounds: %d" % addr)
         if not isinstance(val, int):
             raise ValueError("wrong value type: %s " % type(val))
@@ -45,3 +60,17 @@ class SimMemory(Memory):
         #val = ctypes.c_ubyte(ord(val)).value
         val = ctypes.c_ubyte(val).value
         self.dev.SetRWMem(addr, val)
+    # the simulavr api is one byte per call, so the best we can do is check
+    # the range once and keep everything else out of the loop.
+    def read_block(self, addr, n):
+        if addr < 0 or addr + n - 1 > RAM_END:
+            raise ValueError("block out of bounds: %d + %d" % (addr, n))
+        get = self.dev.GetRWMem
+        return bytearray([get(a) for a in xrange(addr, addr + n)])
+    def write_block(self, addr, data):
+        data = bytearray(data)  # also makes sure every value is a byte
+        if addr < 0 or addr + len(data) - 1 > RAM_END:
+            raise ValueError("block out of bounds: %d + %d" % (addr, len(data)))
+        set = self.dev.SetRWMem
+        for a, val in zip(xrange(addr, addr + len(data)), data):
+            set(a, val)
@@ -67,3 +67,91 @@ class Response:
         if len(serialBytes) <= 2:
             raise ValueError("bad serial len %d" % len(serialBytes))
         return Response.unpack(Response.mycodec.serialDecode(serialBytes))
+
+# N requests in one frame, so they pay for one CRC, one COBS frame and
+# one write:
+#
+# struct RequestBatch {
+#   uchar count;
+#   Request requests[count];
+# }
+#
+# a single Request is 3 bytes and a batch is 1 + 3N, so the server can
+# tell them apart by length.  N is at most 255.
+class RequestBatch:
+    countStruct = struct.Struct("<B")
+    mycodec = codec.Codec()
+
+    def __init__(self, requests):
+        self.requests = requests
+
+    def __str__(self):
+        return "[%s]" % ", ".join(str(req) for req in self.requests)
+
+    # returns bytes
+    def pack(self):
+        checkBatchLen(len(self.requests))
+        return RequestBatch.countStruct.pack(len(self.requests)) + ''.join(
+            req.pack() for req in self.requests)
+
+    # returns an object
+    @staticmethod
+    def unpack(packed):
+        return RequestBatch([Request(*fields) for fields in
+                             unpackBatch(Request.requestStruct, packed)])
+
+    def toSerial(self):
+        return RequestBatch.mycodec.serialEncode(self.pack())
+
+    @staticmethod
+    def fromSerial(serialBytes):
+        if len(serialBytes) <= 2:
+            raise ValueError("bad serial len %d" % len(serialBytes))
+        return RequestBatch.unpack(RequestBatch.mycodec.serialDecode(serialBytes))
+
+# the answers to a RequestBatch, in the same order, same layout
+class ResponseBatch:
+    countStruct = struct.Struct("<B")
+    mycodec = codec.Codec()
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def __str__(self):
+        return "[%s]" % ", ".join(str(res) for res in self.responses)
+
+    # returns bytes
+    def pack(self):
+        checkBatchLen(len(self.responses))
+        return ResponseBatch.countStruct.pack(len(self.responses)) + ''.join(
+            res.pack() for res in self.responses)
+
+    # returns an object
+    @staticmethod
+    def unpack(packed):
+        return ResponseBatch([Response(*fields) for fields in
+                              unpackBatch(Response.responseStruct, packed)])
+
+    def toSerial(self):
+        return ResponseBatch.mycodec.serialEncode(self.pack())
+
+    @staticmethod
+    def fromSerial(serialBytes):
+        if len(serialBytes) <= 2:
+            raise ValueError("bad serial len %d" % len(serialBytes))
+        return ResponseBatch.unpack(ResponseBatch.mycodec.serialDecode(serialBytes))
+
+# the count is one byte
+def checkBatchLen(count):
+    if count > 255:
+        raise ValueError("batch of %d, at most 255" % count)
+
+# the field tuples of a count-prefixed array of itemStruct
+def unpackBatch(itemStruct, packed):
+    if len(packed) < 1:
+        raise ValueError("empty batch")
+    count = ord(packed[0])
+    if len(packed) != 1 + count * itemStruct.size:
+        raise ValueError("bad batch len %d for count %d" % (len(packed), count))
+    return [itemStruct.unpack_from(packed, offset)
+            for offset in xrange(1, len(packed), itemStruct.size)]
@@ -7,16 +7,38 @@
 # This file may be distributed under the terms of the GNU GPLv3 license.
 
 import pysimulavr
+import pulses
 
+# remembers its recent edges, see pulses.py to make sense of them.
 class OutputPin(pysimulavr.Pin):
-    def __init__(self, sc, name):
+    def __init__(self, sc, name, active=1):
         pysimulavr.Pin.__init__(self)
         #self.pos = -1
         self.name = name
         self.sc = sc
+        self.active = active   # 1 if the pin is high when on, 0 if low
+        self.state = None
+        self.edges = pulses.EdgeBuffer()
 
     # overrides Pin.SetInState()
     def SetInState(self, pin):
         pysimulavr.Pin.SetInState(self, pin)
-        self.state = pin.outState
+        if pin.outState != self.state:
+            self.state = pin.outState
+            self.edges.record(self.sc.GetCurrentTime(), self.state == self.HIGH)
         #print "time %d output %s state %s" % (self.sc.GetCurrentTime(), self.name, self.state)
+
+    # 1 for high; off until the avr says otherwise
+    def level(self):
+        if self.state is None:
+            return 1 - self.active
+        return int(self.state == self.HIGH)
+
+    # pulses.PulseStats for the pulses since the last call.  a pulse that
+    # hasn't ended yet is kept for next time.
+    def analyze(self, crank=None):
+        edges = self.edges.edges()
+        stats = pulses.analyze(edges, self.active, crank)
+        pending = edges and edges[-1][1] == self.active
+        self.edges.clear(1 if pending else 0)
+        return stats
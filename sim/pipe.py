@@ -7,26 +7,68 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 
-import sys, os, pty, select, fcntl, termios
-import pysimulavr
+import sys, os, pty, select, fcntl, termios, errno
+import threading, collections
 import binascii
 import datetime
 
 
-class Pipe(pysimulavr.PySimulationMember):
-    def __init__(self, port, speed, rxpin, txpin):
-        pysimulavr.PySimulationMember.__init__(self)
+# the pipe only steps when there's something to move: a thread waits on
+# the pty and posts the pipe to the dispatcher when the host writes
+# something, and the rx pin adds it when the avr writes something.  the
+# simulation can't be told about a post, it only sees it the next time
+# the dispatcher steps anything, so the pipe also polls: every latency ns
+# of simulated time while bytes are moving, so a request and its answers
+# aren't held up, and only every idle ns once it's quiet.
+class Pipe(object):
+    MAXPENDING = 65536  # host-bound bytes kept for a host that isn't reading
+
+    # latency is the longest, in ns of simulated time, that host bytes
+    # wait for the avr to see them while there's traffic, and idle is the
+    # longest when there isn't.  dumpfile, if any, gets a line for every
+    # read and write.
+    def __init__(self, port, rxpin, txpin, dispatcher, latency=1000000,
+                 idle=100000000, dumpfile=None):
         self.ptyname = port
         self.fd = self.makePty()
-        self.delay = speed/1000
         self.txpin = txpin
         self.rxpin = rxpin
-        self.dumpfile = open('pipe.dump', 'wb')
-        self.dumpfile.write("START PIPE DUMP\n")
-        self.dumpfile.flush()
+        self.dispatcher = dispatcher
+        self.latency = latency
+        self.idle = idle
+        self.incoming = collections.deque()   # from the reader thread
+        self.outgoing = bytearray()   # for the host, not written yet
+        self.dropped = 0    # host-bound bytes thrown away
+        self.dumpfile = dumpfile
+        if dumpfile is not None:
+            dumpfile.write("START PIPE DUMP\n")
+            dumpfile.flush()
+        rxpin.listener = self
+        dispatcher.add(self, idle)
+        # close() writes to this to stop the thread
+        self.wakeRead, self.wakeWrite = os.pipe()
+        self.thread = threading.Thread(target=self.readthread)
+        self.thread.daemon = True
+        self.thread.start()
 
     def __del__(self):
-        os.unlink(self.ptyname)
+        if self.fd is not None:
+            self.close()
+
+    def close(self):
+        os.write(self.wakeWrite, 'x')
+        self.thread.join()
+        os.close(self.wakeRead)
+        os.close(self.wakeWrite)
+        os.close(self.fd)
+        self.fd = None
+        try:
+            os.unlink(self.ptyname)
+        except os.error:
+            pass
+        if self.dumpfile is not None:
+            self.dumpfile.close()
+        self.dispatcher.remove(self)
 
     def makePty(self):
         mfd, sfd = pty.openpty()
@@ -41,25 +83,67 @@ class Pipe(pysimulavr.PySimulationMember):
         termios.tcsetattr(mfd, termios.TCSADRAIN, old)
         return mfd
 
-    # overrides PySimulationMember.DoStep()
-    def DoStep(self, trueHwStep):
+    # host => incoming, blocks in select() between writes
+    def readthread(self):
+        while True:
+            try:
+                readable = select.select([self.fd, self.wakeRead], [], [])[0]
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            if self.wakeRead in readable:
+                return
+            try:
+                d = os.read(self.fd, 4096)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    continue
+                raise
+            if d:
+                self.incoming.append(d)
+                self.dispatcher.post(self)
+
+    # for dispatcher.Dispatcher
+    def step(self, now):
         # pipe "rx" is avr "tx"
         d = self.rxpin.popChars()
         if d:
             #sys.stdout.write(d)
             #sys.stdout.flush()
-            os.write(self.fd, d)
-            self.dumpfile.write("RX %s %s\n" % (str(datetime.datetime.now()), binascii.hexlify(d)))
-            self.dumpfile.flush()
+            self.outgoing += d
+            if self.dumpfile is not None:
+                self.dumpfile.write("RX %s %d %s\n" % (str(datetime.datetime.now()), now, binascii.hexlify(d)))
+        if self.outgoing:
+            self.flush()
 
         # pipe "tx" is avr "rx"
-        res = select.select([self.fd], [], [], 0)
-        if res[0]:
-            d = os.read(self.fd, 1024)
+        incoming = self.incoming
+        moved = bool(d or incoming)
+        while incoming:
+            d = incoming.popleft()
             #sys.stdout.write(binascii.hexlify(d))
             #sys.stdout.write(' ')
             #sys.stdout.flush()
             self.txpin.pushChars(d)
-            self.dumpfile.write("TX %s %s\n" % (str(datetime.datetime.now()), binascii.hexlify(d)))
-            self.dumpfile.flush()
-        return self.delay
+            if self.dumpfile is not None:
+                self.dumpfile.write("TX %s %d %s\n" % (str(datetime.datetime.now()), now, binascii.hexlify(d)))
+        if moved or self.outgoing or self.txpin.queue:
+            return self.latency
+        return self.idle
+
+    # writes as much of outgoing as the pty takes; the rest waits for the
+    # next step, up to MAXPENDING
+    def flush(self):
+        outgoing = self.outgoing
+        while outgoing:
+            try:
+                written = os.write(self.fd, outgoing)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            del outgoing[:written]
+        if len(outgoing) > Pipe.MAXPENDING:   # nobody's reading
+            self.dropped += len(outgoing) - Pipe.MAXPENDING
+            del outgoing[:-Pipe.MAXPENDING]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Engine plant model for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# a very simple 4 stroke engine, worked out once per cycle (720 degrees)
+# from what the ecu did during the cycle:
+#
+#   MAP      follows the throttle with a first-order lag
+#   air      speed-density, VE * MAP * displacement / (R * T)
+#   fuel     injector open time less dead time, times flow
+#   AFR      air / fuel, seen by the wideband with a first-order lag
+#   torque   air * AFR efficiency * spark efficiency, less friction
+#   RPM      torque / inertia, with the starter holding cranking speed
+#            until the engine first catches
+#
+# the constants are roughly a 2 litre four with 250cc injectors; they're
+# meant to give the right shape of response, not to match any real engine.
+
+import math
+
+class EnginePlant(object):
+    displacement = 0.002        # m^3
+    ve = 0.85
+    intakeKelvin = 300.0
+    baroKpa = 101.3
+    idleMapKpa = 30.0           # closed throttle
+    mapLag = 0.3                # fraction of the way to the target per cycle
+    injectorFlow = 3.0          # mg per ms
+    injectorDeadMs = 1.0
+    o2Lag = 0.5
+    leanAfr = 19.0              # what the wideband reads with no fuel
+    torquePerGram = 60.0        # Nm per gram of air at best AFR and spark
+    bestAfr = 13.0
+    mbtAdvance = 25.0           # degrees
+    frictionNm = 20.0
+    frictionNmPerRpm = 0.015
+    inertia = 0.15              # kg m^2
+    starterRpm = 200.0          # cranking
+
+    def __init__(self, rpm=0.0):
+        self.rpm = float(rpm)
+        self.mapKpa = self.baroKpa
+        self.afr = self.leanAfr     # as the wideband sees it
+        self.airMg = 0.0
+        self.fuelMg = 0.0
+        self.torque = 0.0
+        self.starting = True        # until the first time it runs on its own
+
+    # mg of air in the cylinders for one cycle
+    def airPerCycle(self):
+        return (10.0**6 * self.ve * self.mapKpa * self.displacement /
+                (0.287 * self.intakeKelvin))
+
+    def afrEfficiency(self, afr):
+        return max(0.0, 1.0 - ((afr - self.bestAfr) / 6.0) ** 2)
+
+    def sparkEfficiency(self, advance):
+        return max(0.0, 1.0 - ((advance - self.mbtAdvance) / 40.0) ** 2)
+
+    # widths: ms of every injector pulse in the cycle, all injectors
+    # advances: degrees BTDC of every spark in the cycle
+    # throttle: 0-1
+    def cycle(self, widths, advances, throttle):
+        seconds = 120.0 / self.rpm if self.rpm > 0 else 0.0
+
+        target = self.idleMapKpa + (self.baroKpa - self.idleMapKpa) * throttle
+        self.mapKpa += (target - self.mapKpa) * self.mapLag
+
+        self.airMg = self.airPerCycle()
+        self.fuelMg = self.injectorFlow * sum(
+            max(0.0, width - self.injectorDeadMs) for width in widths)
+        if self.fuelMg > 0:
+            afr = min(self.leanAfr, self.airMg / self.fuelMg)
+        else:
+            afr = self.leanAfr
+        self.afr += (afr - self.afr) * self.o2Lag
+
+        if self.fuelMg > 0 and advances:
+            spark = sum(map(self.sparkEfficiency, advances)) / len(advances)
+            self.torque = (self.torquePerGram * self.airMg / 1000.0 *
+                           self.afrEfficiency(afr) * spark)
+        else:
+            self.torque = 0.0
+        # d(omega) / dt = (torque - friction) / inertia, with the part of the
+        # friction that goes with rpm taken at the end of the cycle so that
+        # long cycles at low rpm don't overshoot.
+        k = seconds / self.inertia * 60.0 / (2 * math.pi)
+        self.rpm = ((self.rpm + (self.torque - self.frictionNm) * k) /
+                    (1 + self.frictionNmPerRpm * k))
+        if self.starting:
+            if self.rpm > 2 * self.starterRpm:
+                self.starting = False
+            else:
+                self.rpm = max(self.rpm, self.starterRpm)
+        self.rpm = max(0.0, self.rpm)
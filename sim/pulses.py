@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Output pin edge capture and pulse analysis for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+
+import array
+
+# the last size edges of one pin, as (ns, 1 for high or 0 for low).  the
+# arrays are allocated once, recording an edge is two stores.
+class EdgeBuffer(object):
+    def __init__(self, size=4096):
+        self.size = size
+        self.times = array.array('d', [0.0]) * size
+        self.states = array.array('B', [0]) * size
+        self.count = 0   # edges ever recorded, including overwritten ones
+        self.first = 0   # count at the last clear()
+
+    def record(self, t, state):
+        pos = self.count % self.size
+        self.times[pos] = t
+        self.states[pos] = state
+        self.count += 1
+
+    # oldest first, the ones recorded since count was since (or since the
+    # last clear()) that are still in the buffer
+    def edges(self, since=None):
+        if since is None:
+            since = self.first
+        since = max(since, self.count - self.size)
+        if since >= self.count:
+            return []
+        start = since % self.size
+        end = self.count % self.size
+        if start < end:
+            return zip(self.times[start:end], self.states[start:end])
+        return zip(self.times[start:] + self.times[:end],
+                   self.states[start:] + self.states[:end])
+
+    # forget all but the last keep edges, for edges()
+    def clear(self, keep=0):
+        self.first = max(self.first, self.count - keep)
+
+class PulseStats(object):
+    def __init__(self, starts, ends, span):
+        self.starts = starts   # ns
+        self.ends = ends
+        self.widths = [end - start for start, end in zip(starts, ends)]
+        self.count = len(self.widths)
+        self.span = span       # ns from the first edge to the last
+        if self.widths:
+            self.minWidth = min(self.widths)
+            self.maxWidth = max(self.widths)
+            self.meanWidth = sum(self.widths) / float(self.count)
+        else:
+            self.minWidth = self.maxWidth = self.meanWidth = 0
+        self.duty = sum(self.widths) / float(span) if span else 0.0
+        self.startAngles = []
+        self.endAngles = []
+
+    # crank angles (0-720) of each start and end.  the crank works these
+    # out from its current profile, so they're right for edges since the
+    # last SetRPM or SetProfile.
+    def addAngles(self, crank):
+        self.startAngles = map(crank.angleAt, self.starts)
+        self.endAngles = map(crank.angleAt, self.ends)
+
+# whole pulses (active, then not) in edges, an edge list from EdgeBuffer.
+# injectors are active high, coils with IgInv = 1 are active low.
+def analyze(edges, active=1, crank=None):
+    starts = []
+    ends = []
+    start = None
+    for t, state in edges:
+        if state == active:
+            start = t
+        elif start is not None:
+            starts.append(start)
+            ends.append(t)
+            start = None
+    span = edges[-1][0] - edges[0][0] if edges else 0
+    stats = PulseStats(starts, ends, span)
+    if crank is not None:
+        stats.addAngles(crank)
+    return stats
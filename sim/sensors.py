@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# Sensor transfer functions for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# turns engineering units (kPa, AFR, degrees C, ...) into the volts the
+# sensor would put on its pin.  each transfer function is evaluated once,
+# at evenly spaced points, so a conversion is an index, a multiply and
+# one linear interpolation, and a whole trace converts with convert().
+
+import math
+
+VCC = 5.0
+
+# the function sampled every step between low and high.  values outside
+# that range are clamped to it, and so are volts outside 0-VCC.
+class TransferTable(object):
+    def __init__(self, name, unit, function, low, high, step):
+        self.name = name
+        self.unit = unit
+        count = max(1, int(round((high - low) / float(step))))
+        self.low = float(low)
+        self.high = float(high)
+        self.step = (self.high - self.low) / count
+        self.volts = [min(VCC, max(0.0, function(self.low + pos * self.step)))
+                      for pos in range(count + 1)]
+
+    def __call__(self, value):
+        if value <= self.low:
+            return self.volts[0]
+        if value >= self.high:
+            return self.volts[-1]
+        pos = (value - self.low) / self.step
+        index = int(pos)
+        v0 = self.volts[index]
+        return v0 + (self.volts[index + 1] - v0) * (pos - index)
+
+    def convert(self, values):
+        return map(self, values)
+
+    # a waveform (see waveforms.py) of values in this sensor's unit,
+    # as volts
+    def waveform(self, values):
+        for t, value in values:
+            yield t, self(value)
+
+# MPX4250 MAP sensor, Vout = Vs * (0.00369 * P + 0.04) with Vs = 5.1
+# https://www.mouser.com/datasheet/2/302/MPX4250-1127330.pdf
+def mpx4250(kpa):
+    return 5.1 * (0.00369 * kpa + 0.04)
+
+# AEM X-series wideband, AFR = (2.3750 * Volts) + 7.3125
+# https://www.aemelectronics.com/files/instructions/30-0310%20X-Series%20Inline%20Wideband%20UEGO%20Sensor%20Controller.pdf
+def aemAfr(afr):
+    return (afr - 7.3125) / 2.375
+
+# GM coolant/air temperature thermistor, (degrees C, ohms)
+GM_THERMISTOR = [
+    (-40, 100700), (-30, 52700), (-20, 28680), (-15, 21450), (-10, 16180),
+    (-5, 12300), (0, 9420), (5, 7280), (10, 5670), (15, 4450), (20, 3520),
+    (25, 2796), (30, 2238), (35, 1802), (40, 1459), (45, 1188), (50, 973),
+    (60, 667), (70, 467), (80, 332), (90, 241), (100, 177)]
+
+# thermistor resistance, interpolating log(ohms) between the points above
+def thermistorOhms(celsius, points=GM_THERMISTOR):
+    for (c0, r0), (c1, r1) in zip(points, points[1:]):
+        if celsius <= c1 or (c1, r1) == points[-1]:
+            frac = (celsius - c0) / float(c1 - c0)
+            return math.exp(math.log(r0) + (math.log(r1) - math.log(r0)) * frac)
+
+# thermistor to ground, 2.49k bias resistor to VCC
+def thermistor(celsius, bias=2490.0):
+    ohms = thermistorOhms(celsius)
+    return VCC * ohms / (ohms + bias)
+
+# 12v through a 3.9/1 divider, so 12.7v is about 2.6v
+def battery(volts):
+    return volts / 4.9
+
+# assuming it's linear, 0-100% is 0-5v
+def tps(percent):
+    return VCC * percent / 100.0
+
+# by input pin name
+SENSORS = {
+    'map': TransferTable('map', 'kPa', mpx4250, 10, 260, 1),
+    'o2': TransferTable('o2', 'AFR', aemAfr, 7.3125, 19.1875, 0.0625),
+    'clt': TransferTable('clt', 'C', thermistor, -40, 130, 1),
+    'iat': TransferTable('iat', 'C', thermistor, -40, 130, 1),
+    'bat': TransferTable('bat', 'V', battery, 0, 24.5, 0.1),
+    'tps': TransferTable('tps', '%', tps, 0, 100, 1),
+}
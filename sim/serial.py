@@ -8,135 +8,136 @@
 # This file may be distributed under the terms of the GNU GPLv3 license.
 
 import pysimulavr, sys
-import binascii
-import datetime
+import collections
+import capture
 
 SERIALBITS = 10 # 8N1 = 1 start, 8 data, 1 stop
 
-# Class to read serial data from AVR serial transmit pin.
-class DebugSerialRxPin(pysimulavr.PySimulationMember, pysimulavr.Pin):
-    def __init__(self, baud):
-        pysimulavr.Pin.__init__(self)
-        pysimulavr.PySimulationMember.__init__(self)
-        self.sc = pysimulavr.SystemClock.Instance()
-        self.delay = 10**9 / baud   # ns to wait?
-        self.current = 0
-        self.pos = -1
-        self.buffer = ""
-
-    # overrides Pin.SetInState()
-    def SetInState(self, pin):
-        pysimulavr.Pin.SetInState(self, pin)
-        self.state = pin.outState
-        if self.pos < 0 and pin.outState == pin.LOW:
-            self.pos = 0
-            self.sc.Add(self)
-
-    # overrides PySimulationMember.DoStep()
-    def DoStep(self, trueHwStep):
-        ishigh = self.state == self.HIGH
-        self.current |= ishigh << self.pos
-        self.pos += 1
-        if self.pos == 1:
-            return int(self.delay * 1.5)
-        if self.pos >= SERIALBITS:
-            newChar = chr((self.current >> 1) & 0xff)
-            sys.stderr.write(newChar)
-            sys.stderr.flush()
-            self.buffer += newChar
-            self.pos = -1
-            self.current = 0
-            return -1  # this means "don't call anymore"
-        return self.delay
-
-    def ClearBuffer(self):
-        self.buffer = ""
-
-    def GetBuffer(self):
-        return self.buffer
+# the pins are stepped by a dispatcher.Dispatcher, which they add
+# themselves to when there's a character to clock in or out.
 
 # Class to read serial data from AVR serial transmit pin.
-class SerialRxPin(pysimulavr.PySimulationMember, pysimulavr.Pin):
-    def __init__(self, baud, dumpfile):
+# it only wakes up once a character, at the stop bit: the edges of the
+# character are kept as they come, and the bits are read off them.
+class SerialRxPin(pysimulavr.Pin):
+    # capture is a capture.SerialCapture, or None
+    def __init__(self, baud, capture, dispatcher):
         pysimulavr.Pin.__init__(self)
-        pysimulavr.PySimulationMember.__init__(self)
         self.sc = pysimulavr.SystemClock.Instance()
+        self.dispatcher = dispatcher
         self.delay = 10**9 / baud   # ns to wait?
-        self.current = 0
-        self.pos = -1
-        self.queue = ""
-        self.dumpfile = dumpfile
-        self.dumpfile.write("START SERIAL RX DUMP\n")
-        self.dumpfile.flush()
+        self.start = None   # ns of the start bit of this character
+        self.edges = []     # (ns, 1 for high) since the start bit
+        self.queue = bytearray()
+        self.capture = capture
+        self.listener = None   # stepped by the dispatcher after each character
 
     # overrides Pin.SetInState()
     def SetInState(self, pin):
         pysimulavr.Pin.SetInState(self, pin)
         self.state = pin.outState
-        if self.pos < 0 and pin.outState == pin.LOW:
-            self.pos = 0
-            self.sc.Add(self)
+        if self.start is None:
+            if pin.outState == pin.LOW:
+                self.start = self.sc.GetCurrentTime()
+                self.edges = []
+                # the middle of the stop bit
+                self.dispatcher.add(self, int(self.delay * (SERIALBITS - 0.5)))
+        else:
+            self.edges.append((self.sc.GetCurrentTime(), pin.outState == pin.HIGH))
+
+    # the data bits, sampled in the middle of each
+    def decode(self):
+        byte = 0
+        level = 0       # the start bit
+        edges = iter(self.edges)
+        edge = next(edges, None)
+        for bit in range(8):
+            sample = self.start + self.delay * (bit + 1.5)
+            while edge is not None and edge[0] <= sample:
+                level = edge[1]
+                edge = next(edges, None)
+            byte |= level << bit
+        return byte
+
+    # for dispatcher.Dispatcher
+    def step(self, now):
+        byte = self.decode()
+        self.queue.append(byte)
+        if self.capture is not None:
+            self.capture.record(self.start, capture.RX, byte)
+        self.start = None
+        if self.listener is not None:
+            self.dispatcher.add(self.listener)
+        return -1  # this means "don't call anymore"
+
+    # up to count of the characters received so far, all by default
+    def popChars(self, count=None):
+        if count is None or count >= len(self.queue):
+            d = str(self.queue)
+            del self.queue[:]
+        else:
+            d = str(self.queue[:count])
+            del self.queue[:count]
+        return d
 
-    # overrides PySimulationMember.DoStep()
-    def DoStep(self, trueHwStep):
-        ishigh = self.state == self.HIGH
-        self.current |= ishigh << self.pos
-        self.pos += 1
-        if self.pos == 1:
-            return int(self.delay * 1.5)
-        if self.pos >= SERIALBITS:
-            newchr = chr((self.current >> 1) & 0xff)
-            self.queue += newchr
+# Class to read the debug serial from the AVR, into a console.DebugConsole.
+class DebugSerialRxPin(SerialRxPin):
+    def __init__(self, baud, dispatcher, console):
+        SerialRxPin.__init__(self, baud, None, dispatcher)
+        self.console = console
 
-            self.dumpfile.write("RX %s %d %s\n" % (str(datetime.datetime.now()), self.sc.GetCurrentTime(), binascii.hexlify(newchr)))
-            self.dumpfile.flush()
+    # for dispatcher.Dispatcher
+    def step(self, now):
+        self.console.feed(self.start, chr(self.decode()))
+        self.start = None
+        return -1  # this means "don't call anymore"
 
-            self.pos = -1
-            self.current = 0
-            return -1  # this means "don't call anymore"
-        return self.delay
+    def ClearBuffer(self):
+        self.console.clear()
 
-    def popChars(self):
-        d = self.queue
-        self.queue = ""
-        return d
+    # the last lines
+    def GetBuffer(self):
+        return '\n'.join(self.console.lines())
 
 # Class to send serial data to AVR serial receive pin.
-class SerialTxPin(pysimulavr.PySimulationMember, pysimulavr.Pin):
-    def __init__(self, baud, dumpfile):
+# bits that are the same as the one before don't need a step of their own,
+# the pin just stays where it is for longer.
+class SerialTxPin(pysimulavr.Pin):
+    # capture is a capture.SerialCapture, or None
+    def __init__(self, baud, capture, dispatcher):
         pysimulavr.Pin.__init__(self)
-        pysimulavr.PySimulationMember.__init__(self)
         self.SetPin('H')
         self.sc = pysimulavr.SystemClock.Instance()
+        self.dispatcher = dispatcher
         self.delay = 10**9 / baud
         self.current = 0
-        self.pos = 0
-        self.queue = ""
-        self.dumpfile = dumpfile
-        self.dumpfile.write("START SERIAL RX DUMP\n")
-        self.dumpfile.flush()
+        self.pos = SERIALBITS   # between characters
+        self.idle = True        # not in the dispatcher
+        self.queue = collections.deque()   # ints
+        self.capture = capture
 
-    # overrides PySimulationMember.DoStep()
-    def DoStep(self, trueHwStep):
-        if not self.pos:
+    # for dispatcher.Dispatcher
+    def step(self, now):
+        if self.pos >= SERIALBITS:
             if not self.queue:
+                self.idle = True
                 return -1  # this means "don't call anymore"
-            newchr = self.queue[0]
-            self.dumpfile.write("TX %s %s\n" % (str(datetime.datetime.now()), binascii.hexlify(newchr)))
-            self.dumpfile.flush()
-            self.current = (ord(self.queue[0]) << 1) | 0x200
-            self.queue = self.queue[1:]
-        newstate = 'L'
-        if self.current & (1 << self.pos):
-            newstate = 'H'
-        self.SetPin(newstate)
-        self.pos += 1
-        if self.pos >= SERIALBITS:
+            byte = self.queue.popleft()
+            if self.capture is not None:
+                self.capture.record(now, capture.TX, byte)
+            self.current = (byte << 1) | 0x200
             self.pos = 0
-        return self.delay
+        current = self.current
+        bit = (current >> self.pos) & 1
+        self.SetPin('H' if bit else 'L')
+        run = 1
+        while self.pos + run < SERIALBITS and (current >> (self.pos + run)) & 1 == bit:
+            run += 1
+        self.pos += run
+        return self.delay * run
 
     def pushChars(self, c):
-        queueEmpty = not self.queue
-        self.queue += c
-        if queueEmpty:
-            self.sc.Add(self)
+        self.queue.extend(bytearray(c))
+        if self.idle:
+            self.idle = False
+            self.dispatcher.add(self)
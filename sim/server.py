@@ -1,128 +1,250 @@
 #!/usr/bin/env python
 # server for PW etc
-# for now, block.
-# eventually, we want a listener thread and a trainer thread
+# one thread waits on all the clients (ptys, or anything else with a
+# non-blocking fd) and, when some are readable, reads everything they
+# have, handles every complete packet and writes all the responses in one
+# go.  what a client isn't ready to take waits in its own buffer until
+# epoll says it's writable, so a slow client never holds up the others,
+# and a client that goes away is just dropped.
+# eventually, we want a trainer thread too
 
-import os,sys,thread, select, fcntl, termios, tty
+import os, sys, threading, select, fcntl, termios, tty, errno, struct
 import messages
+import codec
+from cobs import cobs
+
+# the zero-delimited packets in a byte stream, which can arrive in any
+# size pieces.  the bytes stay where they landed in one bytearray, and
+# each feed() only searches the bytes it brought: scan is where the last
+# find() stopped, start is where the unfinished packet began.  the
+# consumed front is only cut off once there's enough of it to be worth
+# the move, and a packet that runs past MAXFRAME is noise, so it's
+# dropped and the stream realigns at the next zero.
+class FrameBuffer:
+    COMPACT = 4096
+    MAXFRAME = 1024     # the biggest batch is well under this
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.start = 0          # the start of the unfinished packet
+        self.scan = 0           # the first byte not searched yet
+        self.aligned = False    # whether start follows a delimiter
+
+    # packet contents with delimiters stripped, for every packet that
+    # finished in data
+    def feed(self, data):
+        mybuffer = self.buffer
+        mybuffer += data
+        packets = []
+        pos = self.start
+        scan = self.scan
+        if not self.aligned:    # skip whatever comes before the first zero
+            zero = mybuffer.find('\x00', scan)
+            if zero < 0:
+                self.reset()
+                return packets
+            pos = scan = zero + 1
+            self.aligned = True
+        while True:
+            packetEnd = mybuffer.find('\x00', scan)
+            if packetEnd < 0:   # no packet-end found, maybe more bytes coming
+                break
+            if packetEnd - pos > 2:     # skip empty and weird small packets
+                packets.append(str(mybuffer[pos:packetEnd]))
+            pos = scan = packetEnd + 1
+        if len(mybuffer) - pos > FrameBuffer.MAXFRAME:
+            print "dropping %d bytes without a delimiter" % (len(mybuffer) - pos)
+            self.reset()
+            return packets
+        scan = len(mybuffer)
+        if pos == len(mybuffer):
+            del mybuffer[:]
+            pos = scan = 0
+        elif pos >= FrameBuffer.COMPACT:
+            del mybuffer[:pos]
+            scan -= pos
+            pos = 0
+        self.start = pos
+        self.scan = scan
+        return packets
+
+    # forget everything and wait for the next zero
+    def reset(self):
+        del self.buffer[:]
+        self.start = 0
+        self.scan = 0
+        self.aligned = False
+
+# errnos that mean the other end has gone
+DISCONNECTED = (errno.EPIPE, errno.ECONNRESET, errno.EIO)
 
 class Server:
-    def __init__(self, ptyname):
-        print "init %s" % ptyname
-        # open slave pty read/write, non-controlling
-        self.sfd = os.open(ptyname, os.O_RDWR | os.O_NOCTTY)
-        # non-blocking
-        fcntl.fcntl(self.sfd, fcntl.F_SETFL, fcntl.fcntl(self.sfd, fcntl.F_GETFL) | os.O_NONBLOCK)
-        # this sets a combination of flags
-        tty.setraw(self.sfd)
+    mycodec = codec.Codec()
+
+    def __init__(self, ptyname=None):
         self.epoll = select.epoll()
-        self.epoll.register(self.sfd, select.EPOLLIN)
+        self.clients = {}   # fd: FrameBuffer
+        self.outgoing = {}  # fd: bytearray not written yet
+        self.blocked = set()   # fds waiting for EPOLLOUT
+        # stop() writes to this to wake up the thread
+        self.wakeRead, self.wakeWrite = os.pipe()
+        self.epoll.register(self.wakeRead, select.EPOLLIN)
+        self.thread = None
+        self.sfd = None
+        if ptyname is not None:
+            self.sfd = self.addPty(ptyname)
 
     def __del__(self):
-        self.epoll.unregister(self.sfd)
+        for fd in self.clients.keys():
+            self.removeClient(fd)
         self.epoll.close()
-        os.close(self.sfd)
+        os.close(self.wakeRead)
+        os.close(self.wakeWrite)
+
+    # returns the fd
+    def addPty(self, ptyname):
+        print "init %s" % ptyname
+        # open slave pty read/write, non-controlling
+        fd = os.open(ptyname, os.O_RDWR | os.O_NOCTTY)
+        # this sets a combination of flags
+        tty.setraw(fd)
+        self.addClient(fd)
+        return fd
+
+    # fd can be a socket too
+    def addClient(self, fd):
+        # non-blocking
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.clients[fd] = FrameBuffer()
+        self.outgoing[fd] = bytearray()
+        self.epoll.register(fd, select.EPOLLIN)
+
+    def removeClient(self, fd):
+        del self.clients[fd]
+        del self.outgoing[fd]
+        self.blocked.discard(fd)
+        self.epoll.unregister(fd)
+        os.close(fd)
 
     def run(self):
         #print "run"
-        thread.start_new_thread(self.runthread, ())
+        self.thread = threading.Thread(target=self.runthread)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        os.write(self.wakeWrite, 'x')
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
 
     def runthread(self):
         #print "runthread"
         sys.stdout.flush()
-        mybuffer = ''
         while True:
-            #print "poll"
-            events = self.epoll.poll(1) # block here; can we block forever?
-            if len(events) !=  1:       # we timed out
-                continue
-            fileno = events[0][0]
-            if self.sfd != fileno:      # should never happen; skip it if it does
-                continue
-            #for mypacket in Server.readPackets(fileno, mybuffer):
-            #    print "packet"
-            #    self.handlePacket(mypacket)
-            mybuffer = self.readPackets(fileno, mybuffer)
-
-    # prepend and append frame markers
+            try:
+                events = self.epoll.poll()  # block until something happens
+            except IOError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            for fileno, event in events:
+                if fileno == self.wakeRead:
+                    os.read(self.wakeRead, 1)
+                    return
+                if fileno in self.clients and event & select.EPOLLOUT:
+                    self.flush(fileno)
+                if fileno in self.clients and event & ~select.EPOLLOUT:
+                    self.service(fileno)
+
+    # everything fd has to say, and all the answers
+    def service(self, fd):
+        data = self.readAll(fd)
+        if data is None:
+            print "pipe seems dead"
+            self.removeClient(fd)
+            return
+        responses = []
+        for mypacket in self.clients[fd].feed(data):
+            responseBytes = self.handlePacket(mypacket)
+            if responseBytes is not None:
+                responses.append('\x00' + responseBytes + '\x00')
+        if responses:
+            self.send(fd, ''.join(responses))
+
+    # whatever is waiting, or None if the other end has gone
+    def readAll(self, fd):
+        chunks = []
+        while True:
+            try:
+                myread = os.read(fd, 4096)
+            except OSError as e:        # no more to read
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                if e.errno in DISCONNECTED:   # pty or socket closed
+                    return None
+                raise
+            if len(myread) == 0:        # seems to happen when the pipe is dead
+                return None
+            chunks.append(myread)
+        return ''.join(chunks)
+
+    # queue data for fd and write what it will take now
+    def send(self, fd, data):
+        self.outgoing[fd] += data
+        self.flush(fd)
+
+    # writes as much of the buffer as fd takes; the rest goes when epoll
+    # says fd is writable.  drops fd if it has gone.
+    def flush(self, fd):
+        pending = self.outgoing[fd]
+        while pending:
+            try:
+                written = os.write(fd, pending)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                if e.errno in DISCONNECTED:
+                    print "client %d gone" % fd
+                    self.removeClient(fd)
+                    return
+                raise
+            del pending[:written]
+        if pending and fd not in self.blocked:
+            self.blocked.add(fd)
+            self.epoll.modify(fd, select.EPOLLIN | select.EPOLLOUT)
+        elif not pending and fd in self.blocked:
+            self.blocked.discard(fd)
+            self.epoll.modify(fd, select.EPOLLIN)
+
+    # prepend and append frame markers.  from the server thread, or
+    # before run()
     def write(self, data):
-        os.write(self.sfd, '\x00' + data + '\x00')
+        self.send(self.sfd, '\x00' + data + '\x00')
 
-    # encoded Request => encoded Response
+    # encoded Request => encoded Response, or encoded RequestBatch =>
+    # encoded ResponseBatch, or None
     def handlePacket(self, packetBytes):
         #print "handlePacket"
         if len(packetBytes) <= 2:
             print "skip short packet %d" % len(packetBytes)
-            return
-        req = messages.Request.fromSerial(packetBytes)
-        res = messages.Response(2 * req.a, 3 * req.b)
-        responseBytes = res.toSerial()
-        #print "writing %s" % responseBytes.encode('hex')
-        self.write(responseBytes)
-
-    # yields packet contents with delimiters stripped
-    def readPackets(self, fileno, mybuffer):
-        while True:
-            try:
-                #print "try read"
-                myread = os.read(fileno, 1000) # this should return as soon as the buffer is empty
-                                               # TODO: replace this with char-at-a-time
-            except Exception as e:      # no more to read
-                                        # can happen if we're just faster than the sender
-                print "exception %s" % str(e)
-                return mybuffer
-            if myread is None:          # should never happen
-                print "got none"
-                return mybuffer
-            if len(myread) == 0:        # read an empty string, shouldn't happen but does
-                print "got empty"       # seems to happen when the pipe is dead
-                raise Exception("pipe seems dead")
-            #print "myread %s" % myread.encode('hex')
-            #print "mybuffer %s" % mybuffer.encode('hex')
-            mybuffer += myread
-            #print "interpret buffer %s" % mybuffer.encode('hex')
-            if mybuffer[0] == '\x00':   # trim any extra zeros
-                #print "starts with zero"
-                if len(mybuffer) < 2:
-                    #print "just one zero"
-                    return mybuffer
-                while mybuffer[1] == '\x00':
-                    #print "trim zero"
-                    mybuffer = mybuffer[0] + mybuffer[2:]
-                    if len(mybuffer) == 1:
-                        #print "empty buffer"
-                        return mybuffer
-            else:                       # skip the non-zeros and then trim the zeros
-                #print "starts with non-zero"
-                while mybuffer[0] != '\x00':
-                    #print "trim non-zero"
-                    mybuffer = mybuffer[1:]
-                    if len(mybuffer) == 0:
-                        return mybuffer
-                while mybuffer[0] == '\x00':
-                    #print "now trim zero"
-                    mybuffer = mybuffer[1:]
-                    if len(mybuffer) == 0:
-                        return mybuffer
-            # now mybuffer is aligned with a packet
-            packetEnd = mybuffer.find('\x00', 1)
-            if packetEnd < 0:           # no packet-end found, maybe more bytes coming
-                #print "no end found"
-                return mybuffer
-            if packetEnd <= 2:          # weird small packet, discard it
-                #print "small packet"
-                mybuffer = mybuffer[packetEnd:]
-                return mybuffer
-            mypacket = mybuffer[1:packetEnd]
-            mybuffer = mybuffer[packetEnd:]
-            if len(mypacket) <= 2:      # why would this happen?
-                print "wtf"
-                return mybuffer
-            #print "yield"
-            #yield mypacket
-            self.handlePacket(mypacket)
-            return mybuffer
+            return None
+        # a request that's corrupt, or whose answer doesn't fit the
+        # response, is dropped; it mustn't take the loop down for everyone
+        try:
+            payloadBytes = self.mycodec.serialDecode(packetBytes)
+            if len(payloadBytes) == messages.Request.requestStruct.size:
+                return self.respond(messages.Request.unpack(payloadBytes)).toSerial()
+            batch = messages.RequestBatch.unpack(payloadBytes)
+            #print "writing %s" % responseBytes.encode('hex')
+            return messages.ResponseBatch(map(self.respond, batch.requests)).toSerial()
+        except (ValueError, struct.error, cobs.DecodeError) as e:
+            print "bad packet %s" % str(e)
+            return None
 
+    # Request => Response
+    def respond(self, req):
+        return messages.Response(2 * req.a, 3 * req.b)
 
     def calc():
         pass
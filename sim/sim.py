@@ -6,13 +6,25 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 
-import sys, optparse
+import sys, optparse, re
 from serial import SerialRxPin, SerialTxPin, DebugSerialRxPin
 from pipe import Pipe
+from console import DebugConsole
 from output import OutputPin
-from inputs import InputPin
+from inputs import InputPin, InputScheduler
+from dispatcher import Dispatcher
+import waveforms
+import sensors
 from vr import CrankVrPin, CamVrPin
-from crank import Crank
+from crank import Crank, RpmProfile, PROFILES
+from engine import Engine
+from tracer import Tracer
+from simclock import ClockFile
+import vcd
+from plant import EnginePlant
+import triggers
+from eeprom import EepromImage
+from snapshot import DeviceSnapshot
 import pysimulavr
 import binascii
 import dwarf
@@ -39,24 +51,10 @@ def dumpEeprom(dev, start, end):
         print "eeprom: %d: %s" % (ost, ''.join(format(ord(i), '08b') for i in test_str))
         sys.stdout.flush()
 
-def writeEntireEeprom(dev, filename):
-    size = dev.eeprom.GetSize()
-    with open(filename, 'wb') as f:
-        for index in range(0, size):
-            f.write(chr(dev.eeprom.ReadFromAddress(index)))
-
-def readEntireEeprom(dev, filename):
-    index = 0
-    with open(filename, 'rb') as f:
-        b = f.read(1)
-        while b != "":
-            dev.eeprom.WriteAtAddress(index, ord(b[0]))
-            index += 1
-            b = f.read(1)
-
 def dumpRAM(mem, start, end):
+    block = mem.read_block(start, end - start)
     for index in range(start, end):
-        print "%d: %x" % (index - start, mem.get(index))
+        print "%d: %x" % (index - start, block[index - start])
         sys.stdout.flush()
 
 def dumpEepromHex(dev, start, end):
@@ -65,30 +63,30 @@ def dumpEepromHex(dev, start, end):
         sys.stdout.flush()
 
 def writeCalibrationTablesToEeprom(eeprom, variables):
-    clt = variables.variable('cltCalibrationTable')
-    iat = variables.variable('iatCalibrationTable')
-    o2 = variables.variable('o2CalibrationTable')
+    clt = variables.readArray('cltCalibrationTable')
+    iat = variables.readArray('iatCalibrationTable')
+    o2 = variables.readArray('o2CalibrationTable')
     for x in range(0, CALIBRATION_TABLE_SIZE):
         #print "write cal x: %d" % x
         #sys.stdout.flush()
-        eeprom.WriteAtAddress(EEPROM_CALIBRATION_CLT + x, clt.get(x).read())
-        eeprom.WriteAtAddress(EEPROM_CALIBRATION_IAT + x, iat.get(x).read())
-        eeprom.WriteAtAddress(EEPROM_CALIBRATION_O2 + x, o2.get(x).read())
+        eeprom.WriteAtAddress(EEPROM_CALIBRATION_CLT + x, clt[x])
+        eeprom.WriteAtAddress(EEPROM_CALIBRATION_IAT + x, iat[x])
+        eeprom.WriteAtAddress(EEPROM_CALIBRATION_O2 + x, o2[x])
 
-def writeOneConfigToEeprom(mem, eeprom, variable, start, end):
+def writeOneConfigToEeprom(mem, eeprom, location, start, end):
+    block = mem.read_block(location, end - start)
     for x in range(start, end):
         #eeprom_relative = x - start
-        var_relative = variable.location() + x - start
-        val = mem.get(var_relative)
+        val = block[x - start]
         #print "addr %d val %d " % (x, val)
         eeprom.WriteAtAddress(x, val)
 
 def writeConfigToEeprom(variables, mem, dev):
-    writeOneConfigToEeprom(mem, dev.eeprom, variables.variable('configPage2'),
+    writeOneConfigToEeprom(mem, dev.eeprom, variables.address('configPage2'),
                            EEPROM_CONFIG2_START, EEPROM_CONFIG2_END)
-    writeOneConfigToEeprom(mem, dev.eeprom, variables.variable('configPage4'),
+    writeOneConfigToEeprom(mem, dev.eeprom, variables.address('configPage4'),
                            EEPROM_CONFIG4_START, EEPROM_CONFIG4_END)
-    writeOneConfigToEeprom(mem, dev.eeprom, variables.variable('configPage6'),
+    writeOneConfigToEeprom(mem, dev.eeprom, variables.address('configPage6'),
                            EEPROM_CONFIG6_START, EEPROM_CONFIG6_END)
     print "done writing config to eeprom"
     sys.stdout.flush()
@@ -119,84 +117,81 @@ def printPins(variables):
     for var in vars:
         printVarVal(variables, var)
 
-def writeDefaults(variables):
+# selects the decoder that matches the simulated wheels
+def writeTriggerConfig(variables, trigger):
+    for name, value in sorted(trigger.config.items()):
+        variables.write('configPage4.' + name, value)
+
+def writeDefaults(variables, trigger):
     print "write config2"
     sys.stdout.flush()
-    configPage2 = variables.variable('configPage2')
-    configPage2.member('pinMapping').write(3)  # for the 0.4 shield.
-    configPage2.member('mapSample').write(0)  # instantaneous
-    configPage2.member('nCylinders').write(4)  # instantaneous
-    configPage2.member('tpsMin').write(0)
-    configPage2.member('tpsMax').write(255)
-    configPage2.member('stoich').write(147)
-    configPage2.member('mapMin').write(0)
-    configPage2.member('mapMax').write(255)
-    #configPage2.member('pinMapping').write(41)  # for the UA4C
-    configPage2.member('injLayout').write(0)  # paired
-    configPage2.member('CTPSPolarity').write(0) # don't use throttle switch
-    configPage2.member('CTPSEnabled').write(0) # don't use throttle switch
+    variables.write('configPage2.pinMapping', 3)  # for the 0.4 shield.
+    variables.write('configPage2.mapSample', 0)  # instantaneous
+    variables.write('configPage2.nCylinders', 4)  # instantaneous
+    variables.write('configPage2.tpsMin', 0)
+    variables.write('configPage2.tpsMax', 255)
+    variables.write('configPage2.stoich', 147)
+    variables.write('configPage2.mapMin', 0)
+    variables.write('configPage2.mapMax', 255)
+    #variables.write('configPage2.pinMapping', 41)  # for the UA4C
+    variables.write('configPage2.injLayout', 0)  # paired
+    variables.write('configPage2.CTPSPolarity', 0) # don't use throttle switch
+    variables.write('configPage2.CTPSEnabled', 0) # don't use throttle switch
 
     print "write config4"
     sys.stdout.flush()
-    configPage4 = variables.variable('configPage4')
-    configPage4.member('triggerAngle').write(36)
-    configPage4.member('FixAng').write(22)
-    configPage4.member('CrankAng').write(53)
-    configPage4.member('TrigAngMul').write(121)
-    configPage4.member('TrigEdge').write(0)    # rising
-    configPage4.member('TrigSpeed').write(0)   # wheel on crank
-    configPage4.member('IgInv').write(1)
-    configPage4.member('TrigPattern').write(0) # missing tooth
-    configPage4.member('TrigEdgeSec').write(0) # secondary rising
-    configPage4.member('fuelPumpPin').write(1)
-    configPage4.member('useResync').write(1)
-    configPage4.member('StgCycles').write(0)   # ignition immediately
-    configPage4.member('sparkMode').write(0)   # wasted
-    configPage4.member('triggerFilter').write(0)   # no filter
-    configPage4.member('trigPatternSec').write(0) # secondary pattern (unimplemented)
-    configPage4.member('triggerTeeth').write(36)  # number of teeth (incl missing one)
-    configPage4.member('triggerMissingTeeth').write(1)  # number of missing teeth
-    configPage4.member('crankRPM').write(200)  # less than this is cranking
-    configPage4.member('batVoltCorrect').write(0)  # no correction
-    configPage4.member('ADCFILTER_TPS').write(0)  # was 128
-    configPage4.member('ADCFILTER_CLT').write(0)  # was 180
-    configPage4.member('ADCFILTER_IAT').write(0)  # was 180
-    configPage4.member('ADCFILTER_O2').write(0)   # was 128
-    configPage4.member('ADCFILTER_BAT').write(0)  # was 128
-    configPage4.member('ADCFILTER_MAP').write(0)  # was 20
-    configPage4.member('ADCFILTER_BARO').write(0) # was 64
+    variables.write('configPage4.triggerAngle', 36)
+    variables.write('configPage4.FixAng', 22)
+    variables.write('configPage4.CrankAng', 53)
+    variables.write('configPage4.TrigAngMul', 121)
+    variables.write('configPage4.TrigEdge', 0)    # rising
+    variables.write('configPage4.TrigSpeed', 0)   # wheel on crank
+    variables.write('configPage4.IgInv', 1)
+    writeTriggerConfig(variables, trigger)  # 36-1 is TrigPattern 0, 36 teeth, 1 missing
+    variables.write('configPage4.TrigEdgeSec', 0) # secondary rising
+    variables.write('configPage4.fuelPumpPin', 1)
+    variables.write('configPage4.useResync', 1)
+    variables.write('configPage4.StgCycles', 0)   # ignition immediately
+    variables.write('configPage4.sparkMode', 0)   # wasted
+    variables.write('configPage4.triggerFilter', 0)   # no filter
+    variables.write('configPage4.trigPatternSec', 0) # secondary pattern (unimplemented)
+    variables.write('configPage4.crankRPM', 200)  # less than this is cranking
+    variables.write('configPage4.batVoltCorrect', 0)  # no correction
+    variables.write('configPage4.ADCFILTER_TPS', 0)  # was 128
+    variables.write('configPage4.ADCFILTER_CLT', 0)  # was 180
+    variables.write('configPage4.ADCFILTER_IAT', 0)  # was 180
+    variables.write('configPage4.ADCFILTER_O2', 0)   # was 128
+    variables.write('configPage4.ADCFILTER_BAT', 0)  # was 128
+    variables.write('configPage4.ADCFILTER_MAP', 0)  # was 20
+    variables.write('configPage4.ADCFILTER_BARO', 0) # was 64
 
     print "write config6"
     sys.stdout.flush()
-    configPage6 = variables.variable('configPage6')
-    configPage6.member('egoType').write(2) # wideband
+    variables.write('configPage6.egoType', 2) # wideband
 
     print "write cal"
     sys.stdout.flush()
     populateCalibrationTables(variables)
 
 def writeZeros(variables):
-    configPage4 = variables.variable('configPage4')
-    configPage4.member('triggerAngle').write(0)
-    configPage4.member('FixAng').write(0)
-    configPage4.member('CrankAng').write(0)
-    configPage4.member('TrigAngMul').write(0)
-    configPage4.member('TrigEdge').write(0)
-    configPage4.member('TrigSpeed').write(0)
-    configPage4.member('IgInv').write(0)
-    configPage4.member('TrigPattern').write(0)
-    configPage4.member('TrigEdgeSec').write(0)
-    configPage4.member('fuelPumpPin').write(0)
-    configPage4.member('useResync').write(0)
+    variables.write('configPage4.triggerAngle', 0)
+    variables.write('configPage4.FixAng', 0)
+    variables.write('configPage4.CrankAng', 0)
+    variables.write('configPage4.TrigAngMul', 0)
+    variables.write('configPage4.TrigEdge', 0)
+    variables.write('configPage4.TrigSpeed', 0)
+    variables.write('configPage4.IgInv', 0)
+    variables.write('configPage4.TrigPattern', 0)
+    variables.write('configPage4.TrigEdgeSec', 0)
+    variables.write('configPage4.fuelPumpPin', 0)
+    variables.write('configPage4.useResync', 0)
 
 
 def populateOneCalibrationTable(variables, name):
     print "write cal %s" % name
     sys.stdout.flush()
-    arrayVar = variables.variable(name)
-    for x in range(0, CALIBRATION_TABLE_SIZE):
-        #print "write i %d v %d" % (x, x >> 1)
-        arrayVar.get(x).write(x >> 1)  # TODO: use real values here
+    # TODO: use real values here
+    variables.writeArray(name, [x >> 1 for x in range(0, CALIBRATION_TABLE_SIZE)])
 
 def populateCalibrationTables(variables):
     populateOneCalibrationTable(variables, 'cltCalibrationTable')
@@ -205,11 +200,11 @@ def populateCalibrationTables(variables):
 
 def printOneCalibrationTable(variables, name):
     print "CALIBRATION TABLE %s" % name
-    arrayVar = variables.variable(name)
+    table = variables.readArray(name)
     index = 0
     for x in range(0, CALIBRATION_TABLE_SIZE):
-        #sys.stdout.write("%xs %3d: %3d" % (name, x, arrayVar.get(x).read())
-        sys.stdout.write("%02x" % arrayVar.get(x).read())
+        #sys.stdout.write("%xs %3d: %3d" % (name, x, table[x])
+        sys.stdout.write("%02x" % table[x])
         index += 1
         if index % 32 == 0:
             sys.stdout.write("\n")
@@ -223,7 +218,6 @@ def printCalibrationTables(variables):
 def printConfig(variables):
     print "========================= CONFIG2 ========================="
     sys.stdout.flush()
-    configPage2 = variables.variable('configPage2')
     vars = [
             'reqFuel',
             'divider',
@@ -239,11 +233,9 @@ def printConfig(variables):
             'mapMax',
             'stoich'
             ]
-    for var in vars:
-        printMemberVal(configPage2, var)
+    printMemberVals(variables, 'configPage2', vars)
     print "========================= CONFIG4 ========================="
     sys.stdout.flush()
-    configPage4 = variables.variable('configPage4')
     vars = [ 'triggerAngle', 'FixAng', 'CrankAng', 'TrigAngMul', 'TrigEdge',
              'TrigSpeed', 'IgInv', 'TrigPattern', 'TrigEdgeSec', 'fuelPumpPin',
              'useResync', 'StgCycles', 'sparkMode', 'triggerFilter', 'triggerTeeth',
@@ -257,36 +249,36 @@ def printConfig(variables):
              'ADCFILTER_BARO',
              'batVoltCorrect',
             ]
-    for var in vars:
-        printMemberVal(configPage4, var)
+    printMemberVals(variables, 'configPage4', vars)
     print "========================= CONFIG6 ========================="
     sys.stdout.flush()
-    configPage6 = variables.variable('configPage6')
     vars = [ 'egoType'
             ]
-    for var in vars:
-        printMemberVal(configPage6, var)
+    printMemberVals(variables, 'configPage6', vars)
     sys.stdout.flush()
 
     #printCalibrationTables(variables)
 
 
 def printVarVal(variables, name):
-    print "%26s: %8d" % (name, variables.variable(name).read())
+    print "%26s: %8d" % (name, variables.read(name))
     sys.stdout.flush()
 
-def printMemberVal(variable, name):
-    print "%26s: %8d" % (name, variable.member(name).read())
+# reads the whole struct once, then prints the named members
+def printMemberVals(variables, struct_name, names):
+    snapshot = variables.snapshot(struct_name)
+    for name in names:
+        print "%26s: %8d" % (name, snapshot[name])
 
 def printFullStatus(variables):
     print "========================= FULL STATUS ========================="
-    vars = currentStatus.getAllMemberNames()
-    for var in vars:
-        printMemberVal(currentStatus, var)
+    snapshot = variables.snapshot('currentStatus')
+    for var in variables.getAllMemberNames('currentStatus'):
+        if var in snapshot:   # skips nested structs etc
+            print "%26s: %8d" % (var, snapshot[var])
 
 def printStatus(variables):
     print "========================= STATUS ========================="
-    currentStatus = variables.variable('currentStatus')
     vars = [
              "engine",  # bits
              "status1", # bits
@@ -313,8 +305,7 @@ def printStatus(variables):
              "nSquirts", # TS freaks out if this is zero
              "nChannels",
             ]
-    for var in vars:
-        printMemberVal(currentStatus, var)
+    printMemberVals(variables, 'currentStatus', vars)
 
 def printVars(variables):
     print "========================= VARIABLES ========================="
@@ -353,10 +344,27 @@ def printVars(variables):
     for var in vars:
         printVarVal(variables, var)
 
+# a recorded trace if there is one, otherwise a random walk from start
+# (volts).  traces are in the sensor's units, see sensors.py.
+def inputWaveform(traces, seed, name, start):
+    if name in traces:
+        return sensors.SENSORS[name].waveform(waveforms.trace(traces[name]))
+    return waveforms.randomWalk(start, "%d-%s" % (seed, name))
+
+def printPulses(crank, pins):
+    print "========================= PULSES ========================="
+    for pin in pins:
+        stats = pin.analyze(crank)
+        angles = ' '.join('%d' % angle for angle in stats.startAngles[-4:])
+        print "%s pulses %d width us min %d mean %d max %d duty %.3f start angles %s" % (
+            pin.name, stats.count, stats.minWidth / 1000, stats.meanWidth / 1000,
+            stats.maxWidth / 1000, stats.duty, angles)
+
 def printDebugStream(pin):
     print "========================= DEBUG STREAM ========================="
     print pin.GetBuffer()
     pin.ClearBuffer()
+    pin.console.flush()
 
 def main():
     #d = 'hello'
@@ -368,9 +376,75 @@ def main():
     #opts.add_option("-p", "--port", type="string", dest="port",
     #                default="/tmp/pseudoserial",
     #                help="pseudo-tty device to create for serial port")
+    opts.add_option("-n", "--cycles", type="int", dest="cycles", default=100,
+                    help="number of one-second run cycles")
+    opts.add_option("--rpm", type="int", dest="rpm",
+                    help="fixed crank rpm (default 2000)")
+    opts.add_option("--rpm-profile", type="choice", dest="rpm_profile",
+                    choices=sorted(PROFILES),
+                    help="follow this drive cycle instead of a fixed rpm, one of %s" %
+                         ", ".join(sorted(PROFILES)))
+    opts.add_option("--trigger", type="choice", dest="trigger",
+                    choices=sorted(triggers.PATTERNS),
+                    help="trigger wheel pattern, one of %s (default %s, or"
+                         " whatever is in the eeprom)" % (
+                             ", ".join(sorted(triggers.PATTERNS)), triggers.DEFAULT))
+    opts.add_option("--closed-loop", action="store_true", dest="closed_loop",
+                    help="let an engine model driven by the injectors and coils"
+                         " set rpm, map and o2")
+    opts.add_option("--seed", type="int", dest="seed", default=0,
+                    help="seed for the analog input random walks")
+    opts.add_option("--input-trace", type="string", dest="input_traces",
+                    action="append", default=[], metavar="NAME=FILE",
+                    help="play a csv trace into input NAME, lines of seconds and"
+                         " volts for bat, %% for tps, kPa for map, C for iat"
+                         " and clt, AFR for o2")
+    opts.add_option("--trace", type="string", dest="trace",
+                    help="write pin edges and some currentStatus fields to this"
+                         " file, vcd if it ends in .vcd, otherwise binary")
+    opts.add_option("--trace-ring", type="int", dest="trace_ring", default=0,
+                    help="only write the last this many changes, at the end")
+    opts.add_option("--trace-fields", type="string", dest="trace_fields",
+                    default="hasSync,RPM,MAP,TPS,O2,PW1,advance,egoCorrection",
+                    help="currentStatus fields to trace, comma separated")
+    opts.add_option("--save-snapshot", type="string", dest="save_snapshot",
+                    help="save the device state to this file at the end")
+    opts.add_option("--restore-snapshot", type="string", dest="restore_snapshot",
+                    help="start from the device state in this file")
+    opts.add_option("--debug-log", type="string", dest="debug_log",
+                    help="write the firmware debug serial to this file instead"
+                         " of stderr")
+    opts.add_option("--debug-lines", type="int", dest="debug_lines", default=1000,
+                    help="debug serial lines to keep for each run cycle")
+    opts.add_option("--debug-timestamps", action="store_true", dest="debug_timestamps",
+                    help="start debug serial lines with the simulated time")
+    opts.add_option("--debug-filter", type="string", dest="debug_filter",
+                    help="only debug serial lines that match this regex")
+    opts.add_option("--debug-rate", type="int", dest="debug_rate",
+                    help="write at most this many debug serial lines per"
+                         " simulated second, count the rest")
+    opts.add_option("--clock-file", type="string", dest="clock_file",
+                    help="keep the simulated time in this file, for tsbench.py")
     options, args = opts.parse_args()
     if len(args) != 1:
         opts.error("Incorrect number of arguments")
+    trigger = triggers.PATTERNS[options.trigger or triggers.DEFAULT]
+    if options.closed_loop and options.rpm is not None:
+        opts.error("--rpm: the engine sets the rpm with --closed-loop")
+    if options.closed_loop and options.rpm_profile:
+        opts.error("--rpm-profile: the engine sets the rpm with --closed-loop")
+    traces = {}
+    for trace in options.input_traces:
+        name, equals, tracefile = trace.partition('=')
+        if not equals or not tracefile:
+            opts.error("--input-trace %s should be NAME=FILE" % trace)
+        if name not in sensors.SENSORS:
+            opts.error("--input-trace %s: no input %s, it's one of %s" % (
+                trace, name, ", ".join(sorted(sensors.SENSORS))))
+        if options.closed_loop and name in ('map', 'o2'):
+            opts.error("--input-trace %s: the engine sets %s with --closed-loop" % (
+                trace, name))
+        traces[name] = tracefile
     filename = args[0]
     eeprom_filename = 'eeprom.dump'
     ptyname = '/tmp/pseudoserial' # options.port
@@ -398,6 +472,9 @@ def main():
     dev.SetClockFreq(10**9 / speed)
     sc.Add(dev)
 
+    # everything below that steps is stepped by this, not by sc
+    dispatcher = Dispatcher(sc)
+
     mem = memory.SimMemory(dev)
 
     cu_name = 'speeduino/speeduino.ino.cpp'
@@ -432,8 +509,8 @@ def main():
     # it adds and removes itself from the sim stepper
     # 1 = PE1
     # use the hardware for this now
-    # serialdumpfile = open('serial.dump','wb')
-    # rxpin = SerialRxPin(baud, serialdumpfile)
+    # serialcapture = capture.SerialCapture(open('serial.capture','wb'))
+    # rxpin = SerialRxPin(baud, serialcapture, dispatcher)
     # netD1 = pysimulavr.Net()
     # netD1.Add(rxpin)
     # netD1.Add(dev.GetPin("E1"))
@@ -442,23 +519,28 @@ def main():
     # it adds and removes itself from the sim stepper
     # D0 = PE0
     # use the hardware for this now
-    # txpin = SerialTxPin(baud, serialdumpfile)
+    # txpin = SerialTxPin(baud, serialcapture, dispatcher)
     # netD0 = pysimulavr.Net()
     # netD0.Add(txpin)
     # netD0.Add(dev.GetPin("E0"))
 
     # Named pipe for TunerStudio
     # replaced with the HWUart thing
-    # pipe = Pipe(ptyname, speed, rxpin, txpin)
-    # runs all the time
-    # sc.Add(pipe)
+    # pipe = Pipe(ptyname, rxpin, txpin, dispatcher, dumpfile=open('pipe.dump', 'wb'))
+    # it polls every ms of simulated time while bytes are moving and every
+    # 100 ms when it's quiet
 
     # serial2 for debugging, also on arduino not schematic
     # (also D17 = PH0 TODO: hook up the tx pin)
 
     # 16 = PH1
-    #rxpin2 = DebugSerialRxPin(baud)
-    rxpin2 = DebugSerialRxPin(57600)
+    debugConsole = DebugConsole(
+        open(options.debug_log, 'wb') if options.debug_log else sys.stderr,
+        options.debug_lines, options.debug_timestamps,
+        re.compile(options.debug_filter).search if options.debug_filter else None,
+        options.debug_rate)
+    #rxpin2 = DebugSerialRxPin(baud, dispatcher, debugConsole)
+    rxpin2 = DebugSerialRxPin(57600, dispatcher, debugConsole)
     netH1 = pysimulavr.Net()
     netH1.Add(rxpin2)
     netH1.Add(dev.GetPin("H1"))
@@ -468,39 +550,45 @@ def main():
     print "DATA VERSION %d" % dev.eeprom.ReadFromAddress(0)
     # ============ simulated engine parts: ============
     # crank models engine revolutions
-    crank = Crank(2000, 1)
-    #crank = Crank(1, 1)
-    # runs all the time
-    sc.Add(crank)
+    # it doesn't step, the trigger pins ask it when their next edge is
+    crank = Crank(sc, options.rpm if options.rpm is not None else 2000)
     
 
     # ============ inputs that work ============
 
-    # 36-1 crank wheel
+    # crank wheel, 36-1 by default
     # 19 = PD2 (all boards)
-    tach1 = CrankVrPin(crank, sc)
-    sc.Add(tach1)
+    tach1 = CrankVrPin(crank, sc, trigger)
+    dispatcher.add(tach1)
     netD19 = pysimulavr.Net()
     netD19.Add(tach1)
     netD19.Add(dev.GetPin("D2"))
 
-    # 1-tooth cam wheel
+    # cam wheel, 1-tooth by default
     # TODO: implement sec trigger wheel correctly in speeduino
     # 18 = PD3 (all boards)
-    tach2 = CamVrPin(crank, sc)
-    sc.Add(tach2)
+    tach2 = CamVrPin(crank, sc, trigger)
+    dispatcher.add(tach2)
+    # they sleep until their next edge, so a new rpm (or a stall ending)
+    # has to wake them up
+    def wakeTriggers():
+        dispatcher.reschedule(tach1)
+        dispatcher.reschedule(tach2)
+    crank.addListener(wakeTriggers)
     netD18 = pysimulavr.Net()
     netD18.Add(tach2)
     netD18.Add(dev.GetPin("D3"))
 
     # ============ inputs that don't yet work ============
 
+    # one dispatcher member drives all the analog inputs
+    inputs = InputScheduler(sc, dispatcher)
+
     # 12v through 3.9/1 divider => 12.7v becomes 2.6v
     # A2 = PF2 (ua4c)
     # A4 = PF4 (0.4)
-    bat = InputPin(sc, 'bat')
-    bat.SetAnalogValue(2.6)
-    sc.Add(bat)
+    bat = InputPin('bat')
+    inputs.add(bat, inputWaveform(traces, options.seed, 'bat', 2.6))
     netA4 = pysimulavr.Net()
     netA4.Add(bat)
     netA4.Add(dev.GetPin("F4"))
@@ -510,9 +598,8 @@ def main():
     # A3 = PF3 (ua4c)
     # A2 = PF2 (0.4)
     # pin set to A2 and is actually 56
-    tps = InputPin(sc, 'tps')
-    #tps.SetAnalogValue(0.1)
-    sc.Add(tps)
+    tps = InputPin('tps')
+    inputs.add(tps, inputWaveform(traces, options.seed, 'tps', 0.0))
     netA2 = pysimulavr.Net()
     netA2.Add(tps)
     netA2.Add(dev.GetPin("F2"))
@@ -523,9 +610,11 @@ def main():
     # https://www.mouser.com/datasheet/2/302/MPX4250-1127330.pdf
     # A0 = PF0 (ua4c)
     # A3 = PF3  (0.4)
-    mapPin = InputPin(sc, 'map')
-    mapPin.SetAnalogValue(1.0)
-    sc.Add(mapPin)
+    mapPin = InputPin('map')
+    if options.closed_loop:
+        mapPin.SetAnalogValue(1.0)   # the engine sets it
+    else:
+        inputs.add(mapPin, inputWaveform(traces, options.seed, 'map', 1.0))
     netA3 = pysimulavr.Net()
     netA3.Add(mapPin)
     netA3.Add(dev.GetPin("F3"))
@@ -535,9 +624,8 @@ def main():
     # don't want that, use 0-5v.  where's the calibration?
     # A5 = PF5 (ua4c)
     # A0 = PF0 (0.4) == "56" on the board
-    iat = InputPin(sc, 'iat')
-    iat.SetAnalogValue(1.0)
-    sc.Add(iat)
+    iat = InputPin('iat')
+    inputs.add(iat, inputWaveform(traces, options.seed, 'iat', 1.0))
     netA0 = pysimulavr.Net()
     netA0.Add(iat)
     netA0.Add(dev.GetPin("F0"))
@@ -547,9 +635,8 @@ def main():
     # don't want that, use 0.5v.  where's the calibration?
     # A4 = PF4 (ua4c)
     # A1 = PF1 (0.4)
-    clt = InputPin(sc, 'clt')
-    clt.SetAnalogValue(1.0)
-    sc.Add(clt)
+    clt = InputPin('clt')
+    inputs.add(clt, inputWaveform(traces, options.seed, 'clt', 1.0))
     netA1 = pysimulavr.Net()
     netA1.Add(clt)
     netA1.Add(dev.GetPin("F1"))
@@ -559,13 +646,16 @@ def main():
     # https://www.aemelectronics.com/files/instructions/30-0310%20X-Series%20Inline%20Wideband%20UEGO%20Sensor%20Controller.pdf
     # A1 = PF1 (ua4c)
     # A8 = PK0 (0.4)
-    o2 = InputPin(sc, 'o2')
-    o2.SetAnalogValue(2.5)
-    sc.Add(o2)
+    o2 = InputPin('o2')
+    if options.closed_loop:
+        o2.SetAnalogValue(2.5)   # the engine sets it
+    else:
+        inputs.add(o2, inputWaveform(traces, options.seed, 'o2', 2.5))
     netA8 = pysimulavr.Net()
     netA8.Add(o2)
     netA8.Add(dev.GetPin("K0"))
     #netA8.Add(dev.GetPin("A8"))
+    # the adds put it in the dispatcher, it stops when it has nothing to do
 
     # outputs
     # do not need Stepping
@@ -600,38 +690,60 @@ def main():
 
     # 35 = PC2 (ua4c)
     # 40 = PG1 (0.4)
-    ign1 =  OutputPin(sc, 'ign1')
+    ign1 =  OutputPin(sc, 'ign1', 0)  # IgInv = 1, charging when low
     netD40 = pysimulavr.Net()
     netD40.Add(ign1)
     netD40.Add(dev.GetPin("G1"))
 
     # 36 = PC1 (ua4c)
     # 38 = PD7 (0.4)
-    ign2 =  OutputPin(sc, 'ign2')
+    ign2 =  OutputPin(sc, 'ign2', 0)  # IgInv = 1, charging when low
     netD38 = pysimulavr.Net()
     netD38.Add(ign2)
     netD38.Add(dev.GetPin("D7"))
 
     # 33 = PC4 (ua4c)
     # 52 = PB1 (0.4)
-    ign3 =  OutputPin(sc, 'ign3')
+    ign3 =  OutputPin(sc, 'ign3', 0)  # IgInv = 1, charging when low
     netD52 = pysimulavr.Net()
     netD52.Add(ign3)
     netD52.Add(dev.GetPin("B1"))
 
     # 34 = PC3 (ua4c)
     # 50 = PB3 (0.4)
-    ign4 =  OutputPin(sc, 'ign4')
+    ign4 =  OutputPin(sc, 'ign4', 0)  # IgInv = 1, charging when low
     netD50 = pysimulavr.Net()
     netD50.Add(ign4)
     netD50.Add(dev.GetPin("B3"))
 
+    # ============ closed loop ============
+    if options.closed_loop:
+        # it starts by cranking; --rpm and --rpm-profile aren't allowed
+        engine = Engine(sc, crank, EnginePlant(EnginePlant.starterRpm),
+                        [inj1, inj2, inj3, inj4], [ign1, ign2, ign3, ign4],
+                        tps, mapPin, o2)
+        dispatcher.add(engine)
+
+    # ============ tracing ============
+    if options.trace:
+        tracePins = [('crank', tach1), ('cam', tach2),
+                     ('inj1', inj1), ('inj2', inj2), ('inj3', inj3), ('inj4', inj4),
+                     ('ign1', ign1), ('ign2', ign2), ('ign3', ign3), ('ign4', ign4)]
+        traceFields = options.trace_fields.split(',')
+        traceFile = vcd.openTrace(options.trace,
+            Tracer.signals(tracePins, variables, 'currentStatus', traceFields),
+            initial=Tracer.initial(tracePins, variables, 'currentStatus', traceFields))
+        # with a ring, the file is only written at the end
+        traceSink = vcd.TraceRing(options.trace_ring) if options.trace_ring else traceFile
+        tracer = Tracer(sc, traceSink, tracePins, variables, 'currentStatus', traceFields)
+        dispatcher.add(tracer)
+
+    if options.clock_file:
+        dispatcher.add(ClockFile(options.clock_file))
+
     print "Starting AVR simulation: machine=%s speed=%d" % (proc, speed)
     print "Serial: port=%s baud=%d" % (ptyname, baud)
 
-    configPage4 = variables.variable('configPage4')
-    currentStatus = variables.variable('currentStatus')
-
     print "S0 uninitialized"
 
     printVars(variables)
@@ -643,7 +755,7 @@ def main():
     print "S0 write"
     sys.stdout.flush()
 
-    #writeDefaults(variables)
+    #writeDefaults(variables, trigger)
 
     print "S0 initialized"
 
@@ -652,15 +764,21 @@ def main():
 
     print "S0 now what's in ram"
     sys.stdout.flush()
-    dumpRAM(mem, configPage4.location(), configPage4.location() + 10)
+    dumpRAM(mem, variables.address('configPage4'), variables.address('configPage4') + 10)
     print "S0 first load the eprom"
-    readEntireEeprom(dev, eeprom_filename)
+    eepromImage = EepromImage(dev.eeprom, eeprom_filename)
+    eepromImage.load()
     print "S0 what's in eeprom before writing?"
     sys.stdout.flush()
     dumpEeprom(dev, EEPROM_CONFIG4_START, EEPROM_CONFIG4_START + 10)
     print "S0 write to eeprom"
     sys.stdout.flush()
     #writeConfigToEeprom(variables, mem, dev)
+    if options.trigger:
+        print "S0 write trigger config for %s" % trigger.name
+        writeTriggerConfig(variables, trigger)
+        writeOneConfigToEeprom(mem, dev.eeprom, variables.address('configPage4'),
+                               EEPROM_CONFIG4_START, EEPROM_CONFIG4_END)
     sys.stdout.flush()
     print "S0 done with eeprom write"
     print "S0 now what's in eeprom"
@@ -681,10 +799,21 @@ def main():
     printDebugStream(rxpin2)
     sys.stdout.flush()
 
-    for cy in range(100):
+    deviceSnapshot = DeviceSnapshot(dev, mem, eepromImage, crank,
+        {'bat': bat, 'tps': tps, 'map': mapPin, 'iat': iat, 'clt': clt, 'o2': o2},
+        {'crank': tach1, 'cam': tach2})
+    if options.restore_snapshot:
+        print "restore snapshot %s" % options.restore_snapshot
+        # this sets the crank, so wakeTriggers() reschedules tach1 and tach2
+        deviceSnapshot.restore(options.restore_snapshot)
+    if options.rpm_profile:
+        print "rpm profile %s" % options.rpm_profile
+        crank.SetProfile(RpmProfile(PROFILES[options.rpm_profile]))
+
+    for cy in range(options.cycles):
         print "================================= RUN CYCLE %d =================================" % cy 
         print "NOW %s" % str(datetime.datetime.now())
-        writeEntireEeprom(dev, eeprom_filename)
+        eepromImage.save()   # only writes if the firmware changed something
 
         # try setting stuff here?
 
@@ -700,14 +829,30 @@ def main():
         print "DONE %s" % str(datetime.datetime.now())
         printDebugStream(rxpin2)
         print "time %f" % (sc.GetCurrentTime() / 10**9)  # ns -> sec
-        print "crank angle: %d crank: %s cam: %s" % (
-            crank.currentAngleDegrees, tach1.state, tach2.state)
+        print "crank angle: %d rpm: %d crank: %s cam: %s" % (
+            crank.currentAngleDegrees, crank.rpm, tach1.state, tach2.state)
+        printPulses(crank, [inj1, inj2, inj3, inj4, ign1, ign2, ign3, ign4])
         printPins(variables)
         printStatus(variables)
         printVars(variables)
         printConfig(variables)
         #exit()
 
+    if options.trace:
+        tracer.collect()
+        if options.trace_ring:
+            traceSink.writeTo(traceFile)
+        traceFile.close()
+        print "trace %s, %d edges dropped" % (options.trace, tracer.dropped)
+
+    if options.save_snapshot:
+        print "save snapshot %s" % options.save_snapshot
+        deviceSnapshot.save(options.save_snapshot)
+
+    debugConsole.close()
+    if options.debug_log:
+        debugConsole.out.close()
+
     #d.stop()
 
 if __name__ == '__main__':
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+#
+# Simulated time for other processes
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# an 8 byte file with the simulated time in it, mmapped at both ends, so
+# reading it costs nothing.  it's only as fine as the period it's written
+# at.
+
+import mmap
+import struct
+
+TIME = struct.Struct('<Q')   # ns
+
+# add it to a dispatcher.Dispatcher to get it stepped.
+class ClockFile(object):
+    def __init__(self, filename, period=100000):
+        f = open(filename, 'w+b')
+        f.write('\0' * TIME.size)
+        f.flush()
+        self.map = mmap.mmap(f.fileno(), TIME.size)
+        f.close()
+        self.period = period
+
+    # for dispatcher.Dispatcher
+    def step(self, now):
+        TIME.pack_into(self.map, 0, now)
+        return self.period
+
+    def close(self):
+        self.map.close()
+
+class ClockReader(object):
+    def __init__(self, filename):
+        f = open(filename, 'rb')
+        self.map = mmap.mmap(f.fileno(), TIME.size, access=mmap.ACCESS_READ)
+        f.close()
+
+    # ns, read until two reads agree so a write in the middle doesn't matter
+    def now(self):
+        t = TIME.unpack_from(self.map, 0)[0]
+        while True:
+            again = TIME.unpack_from(self.map, 0)[0]
+            if again == t:
+                return t
+            t = again
+
+    def close(self):
+        self.map.close()
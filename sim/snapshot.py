@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+#
+# Device state snapshots for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# saves the state of a warmed-up simulation, so that many scenarios can
+# start from it without simulating boot and sync again.
+#
+# file format, all little-endian:
+#
+#   header   magic 'SPDS', version, ram size, eeprom size, pin count,
+#            PC, crank angle, crank rpm
+#   ram      the whole data space (registers, io and sram), of which only
+#            sram, the cpu registers and the io registers that just hold
+#            configuration are written back
+#   eeprom   the whole eeprom
+#   pins     pin count * (name, kind, value)
+#
+# what's not in the data space isn't saved: the simulated clock keeps
+# going from wherever it is, and peripheral state that isn't visible
+# through registers (prescaler counts etc) starts fresh.
+
+import mmap
+import struct
+import memory
+
+MAGIC = 'SPDS'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHHIdd')
+PIN = struct.Struct('<16scd')   # name, 'a' (volts) or 'd' (ord of the pin state)
+RAM_SIZE = memory.RAM_END + 1
+
+SRAM_START = 0x200
+SREG = 0x5f
+SPL = 0x5d
+SPH = 0x5e
+
+# the 16 bit timers: TCCRnA, then the high byte before the low one (the
+# low byte write is what takes both, through TEMP) of TCNTn, ICRn, OCRnA,
+# OCRnB and OCRnC, then TCCRnC and TCCRnB, which starts the clock.
+def timer16(base):
+    registers = [base]
+    for low in range(base + 4, base + 14, 2):
+        registers += [low + 1, low]
+    return registers + [base + 2, base + 1]
+
+# usarts: UBRRnH, UBRRnL, UCSRnC, UCSRnB
+def usart(base):
+    return [base + 5, base + 4, base + 2, base + 1]
+
+# mega2560 io registers that only hold configuration, written back in this
+# order.  everything else in io is left alone, because writing it does
+# something: a 1 in TIFRn, EIFR, PCIFR clears a pending interrupt, PINx
+# toggles PORTx, EECR, SPDR, TWDR and UDRn start the hardware.
+CONFIG = ([0x21, 0x22, 0x24, 0x25, 0x27, 0x28, 0x2a, 0x2b,    # DDR and PORT A-G
+           0x2d, 0x2e, 0x30, 0x31, 0x33, 0x34,
+           0x101, 0x102, 0x104, 0x105, 0x107, 0x108, 0x10a, 0x10b]   # H-L
+          + [0x44, 0x47, 0x48, 0x46, 0x45]     # timer 0: TCCR0A, OCR0A/B, TCNT0, TCCR0B
+          + [0xb0, 0xb3, 0xb4, 0xb2, 0xb1]     # timer 2
+          + timer16(0x80) + timer16(0x90) + timer16(0xa0) + timer16(0x120)
+          + range(0x6e, 0x74)                  # TIMSK0-5
+          + [0x69, 0x6a, 0x3d, 0x68, 0x6b, 0x6c, 0x6d]   # EICRA/B, EIMSK, PCICR, PCMSK0-2
+          + [0x7c, 0x7b, 0x7d, 0x7e]           # ADMUX, ADCSRB, DIDR2, DIDR0
+          + usart(0xc0) + usart(0xc8) + usart(0xd0) + usart(0x130)
+          + [0x3e, 0x4a, 0x4b]                 # GPIOR0-2
+          + [0x5b, 0x5c]                       # RAMPZ, EIND
+          + [0x42, 0x41, 0x40]                 # EEARH, EEARL, EEDR
+          + [0x4c, 0xb8, 0xba, 0xbd]           # SPCR, TWBR, TWAR, TWAMR
+          + [0x64, 0x65, 0x74, 0x75])          # PRR0/1, XMCRA/B
+
+# registers with some bits that are safe to write: (address, those bits)
+MASKED = [(0x7a, 0xaf),     # ADCSRA without ADSC and ADIF
+          (0xc0, 0x03), (0xc8, 0x03), (0xd0, 0x03), (0x130, 0x03)]  # UCSRnA: U2X, MPCM
+
+class DeviceSnapshot:
+    # analog is { name: InputPin }, digital is { name: VrPin or anything with
+    # a 'state' and SetPin() }
+    def __init__(self, dev, mem, eepromImage, crank, analog, digital):
+        self.dev = dev
+        self.mem = mem
+        self.eepromImage = eepromImage
+        self.crank = crank
+        self.analog = analog
+        self.digital = digital
+
+    def save(self, filename):
+        pins = []
+        for name in sorted(self.analog):
+            pins.append(PIN.pack(name, 'a', self.analog[name].GetAnalogValue(5.0)))
+        for name in sorted(self.digital):
+            pins.append(PIN.pack(name, 'd', ord(self.digital[name].state)))
+        ram = self.mem.read_block(0, RAM_SIZE)
+        eeprom = self.eepromImage.read()
+        header = HEADER.pack(MAGIC, VERSION, len(ram), len(eeprom), len(pins),
+                             self.dev.PC, self.crank.currentAngleDegrees, self.crank.rpm)
+        data = bytearray(header)
+        data += ram
+        data += eeprom
+        data += ''.join(pins)
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+    def restore(self, filename):
+        with open(filename, 'rb') as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self.restoreFrom(m)
+            finally:
+                m.close()
+
+    def restoreFrom(self, m):
+        (magic, version, ram_size, eeprom_size, pin_count,
+         pc, angle, rpm) = HEADER.unpack_from(m, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a snapshot, or the wrong version")
+        if ram_size != RAM_SIZE or eeprom_size != self.eepromImage.size:
+            raise ValueError("snapshot is for a different device")
+        offset = HEADER.size
+        ram = bytearray(m[offset : offset + ram_size])
+        self.mem.write_block(SRAM_START, ram[SRAM_START:])
+        self.mem.write_block(0, ram[:32])    # r0-r31
+        for address in [SREG, SPH, SPL] + CONFIG:
+            self.mem.set(address, ram[address])
+        for address, bits in MASKED:
+            self.mem.set(address, ram[address] & bits)
+        offset += ram_size
+        self.eepromImage.write(bytearray(m[offset : offset + eeprom_size]))
+        offset += eeprom_size
+        for index in range(pin_count):
+            name, kind, value = PIN.unpack_from(m, offset + index * PIN.size)
+            name = name.rstrip('\0')
+            if kind == 'a':
+                self.analog[name].SetAnalogValue(value)
+            else:
+                self.digital[name].state = chr(int(value))
+                self.digital[name].SetPin(self.digital[name].state)
+        self.dev.PC = pc
+        self.crank.currentAngleDegrees = angle
+        self.crank.SetRPM(rpm)
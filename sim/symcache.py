@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+#
+# on-disk cache of the flattened variable layout of an elf file, so that
+# unchanged firmware doesn't need its dwarf parsed again.
+#
+# the cache lives next to the elf, e.g. firmware.elf.symbols, and is
+# keyed by the sha256 of the elf and by the compilation unit name:
+#
+# { "version": 1,
+#   "sha256": "...",
+#   "units": { "speeduino/speeduino.ino.cpp": <layout>, ... } }
+#
+# see dwarf.Globals for the layout.
+
+import hashlib
+import json
+import os
+
+VERSION = 1
+
+def digest(filename):
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+class SymbolCache:
+    def __init__(self, elf_file_name):
+        self.filename = elf_file_name + '.symbols'
+        self.sha256 = digest(elf_file_name)
+
+    # all the units for this elf, or empty if the cache is missing or stale
+    def units(self):
+        try:
+            with open(self.filename, 'rb') as f:
+                contents = json.load(f)
+        except (IOError, ValueError):   # missing or corrupt, just rebuild it
+            return {}
+        if contents.get('version') != VERSION or contents.get('sha256') != self.sha256:
+            return {}
+        return contents.get('units', {})
+
+    # returns the layout for cu_name, or None
+    def load(self, cu_name):
+        return self.units().get(cu_name)
+
+    def save(self, cu_name, layout):
+        units = self.units()
+        units[cu_name] = layout
+        contents = {'version': VERSION, 'sha256': self.sha256, 'units': units}
+        # write and rename, so a reader never sees half a file
+        tmpname = '%s.%d.tmp' % (self.filename, os.getpid())
+        try:
+            with open(tmpname, 'wb') as f:
+                json.dump(contents, f)
+            os.rename(tmpname, self.filename)
+        except (IOError, OSError):      # read-only dir etc, the cache is optional
+            if os.path.exists(tmpname):
+                os.unlink(tmpname)
@@ -0,0 +1,43 @@
+import sys
+sys.path.append("../..")
+import capture
+
+import unittest
+import StringIO
+
+# keeps what was written after close()
+class KeepingStringIO(StringIO.StringIO):
+    def close(self):
+        self.kept = self.getvalue()
+        StringIO.StringIO.close(self)
+
+class TestCapture(unittest.TestCase):
+    def test_round_trip(self):
+        f = KeepingStringIO()
+        c = capture.SerialCapture(f)
+        c.record(1000, capture.TX, ord('r'))
+        c.record(87000, capture.RX, 0)
+        c.record(2**40, capture.RX, 255)
+        c.close()
+        records = capture.readCapture(StringIO.StringIO(f.kept))
+        self.assertEqual([(1000, 'T', 114), (87000, 'R', 0), (2**40, 'R', 255)],
+                         records)
+        self.assertEqual('\x00\xff', capture.stream(records, capture.RX))
+        self.assertEqual('r', capture.stream(records, capture.TX))
+
+    def test_chunks(self):
+        f = StringIO.StringIO()
+        c = capture.SerialCapture(f, chunk=100)
+        self.assertEqual('', f.getvalue())   # nothing written yet
+        for i in range(25):
+            c.record(i, capture.RX, i)
+        self.assertTrue(0 < len(f.getvalue()) < capture.HEADER.size + 25 * capture.RECORD.size)
+        c.flush()
+        self.assertEqual(25, len(capture.readCapture(StringIO.StringIO(f.getvalue()))))
+
+    def test_bad_magic(self):
+        with self.assertRaises(ValueError):
+            capture.readCapture(StringIO.StringIO('SPDT\x01\x00'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python capture_test.py
@@ -0,0 +1,72 @@
+import sys
+sys.path.append("../..")
+import console
+
+import unittest
+import re
+import StringIO
+
+class TestConsole(unittest.TestCase):
+    def test_lines(self):
+        out = StringIO.StringIO()
+        c = console.DebugConsole(out)
+        c.feed(0, "hel")
+        self.assertEqual('', out.getvalue())   # not a whole line yet
+        c.feed(100, "lo\r\nworld\n")
+        self.assertEqual("hello\nworld\n", out.getvalue())
+        self.assertEqual(["hello", "world"], c.lines())
+        c.clear()
+        self.assertEqual([], c.lines())
+
+    def test_memory_only(self):
+        c = console.DebugConsole()
+        c.feed(0, "a\nb\n")
+        self.assertEqual(["a", "b"], c.lines())
+
+    def test_ring(self):
+        c = console.DebugConsole(size=3)
+        for i in range(10):
+            c.feed(i, "%d\n" % i)
+        self.assertEqual(["7", "8", "9"], c.lines())
+        self.assertEqual(10, c.total)
+
+    def test_timestamps(self):
+        c = console.DebugConsole(timestamps=True)
+        c.feed(1500000000, "x")
+        c.feed(1600000000, "y\n")   # the time of the start of the line
+        self.assertEqual(["1.500000 xy"], c.lines())
+
+    def test_filter(self):
+        c = console.DebugConsole(filter=re.compile("^RPM").search)
+        c.feed(0, "RPM 800\nnoise\nRPM 900\n")
+        self.assertEqual(["RPM 800", "RPM 900"], c.lines())
+
+    def test_rate(self):
+        out = StringIO.StringIO()
+        c = console.DebugConsole(out, rate=2)
+        for i in range(5):
+            c.feed(i * 1000, "%d\n" % i)
+        c.feed(10**9, "next\n")
+        self.assertEqual("0\n1\n[3 lines suppressed]\nnext\n", out.getvalue())
+        self.assertEqual(6, len(c.lines()))   # the ring has them all
+
+    def test_close(self):
+        out = StringIO.StringIO()
+        c = console.DebugConsole(out, rate=1)
+        c.feed(0, "a\nb\nc\nno newline")
+        self.assertEqual("a\n", out.getvalue())
+        c.close()
+        self.assertEqual("a\n[3 lines suppressed]\n", out.getvalue())
+        self.assertEqual(["a", "b", "c", "no newline"], c.lines())
+        c = console.DebugConsole(out)
+        c.feed(0, "last")
+        c.close()
+        self.assertTrue(out.getvalue().endswith("last\n"))
+
+    def test_long_line(self):
+        c = console.DebugConsole(maxLine=4)
+        c.feed(0, "abcdefg\n")
+        self.assertEqual(["abcd", "efg"], c.lines())
+
+if __name__ == '__main__':
+    unittest.main()
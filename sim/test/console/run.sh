@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python console_test.py
@@ -0,0 +1,97 @@
+import sys
+sys.path.append("../..")
+import crank
+
+import unittest
+
+# same methods as pysimulavr.SystemClock
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+    def GetCurrentTime(self):
+        return self.now
+
+class TestCrank(unittest.TestCase):
+    def test_angle(self):
+        sc = FakeClock()
+        c = crank.Crank(sc, 1000)    # 6 degrees per ms
+        self.assertEqual(0, c.currentAngleDegrees)
+        sc.now = 1000000
+        self.assertAlmostEqual(6, c.currentAngleDegrees)
+        sc.now = 121000000           # wraps at 720
+        self.assertAlmostEqual(6, c.currentAngleDegrees)
+
+    def test_set_angle(self):
+        sc = FakeClock()
+        c = crank.Crank(sc, 1000)
+        sc.now = 5000000
+        c.currentAngleDegrees = 730
+        self.assertAlmostEqual(10, c.currentAngleDegrees)
+        sc.now = 6000000
+        self.assertAlmostEqual(16, c.currentAngleDegrees)
+
+    def test_set_rpm(self):
+        sc = FakeClock()
+        c = crank.Crank(sc, 1000)
+        sc.now = 1000000
+        c.SetRPM(2000)              # the angle doesn't jump
+        self.assertAlmostEqual(6, c.currentAngleDegrees)
+        sc.now = 2000000
+        self.assertAlmostEqual(18, c.currentAngleDegrees)
+
+    def test_nsec_until(self):
+        sc = FakeClock()
+        c = crank.Crank(sc, 1000)
+        self.assertEqual(1000000, c.nsecUntil(6))
+        self.assertEqual(120000000, c.nsecUntil(0))   # a whole cycle
+        sc.now = 1000000
+        self.assertEqual(119000000, c.nsecUntil(0))
+        c.SetRPM(0)
+        self.assertEqual(-1, c.nsecUntil(6))
+
+    def test_profile(self):
+        # 0 to 1200 rpm in 1 s, i.e. 0 to 7.2 degrees per ms, then steady
+        profile = crank.RpmProfile([(0, 0), (1, 1200)])
+        self.assertAlmostEqual(600, profile.rpmAt(500000000))
+        self.assertAlmostEqual(3600, profile.angleAt(10**9))
+        self.assertAlmostEqual(3600 + 7.2, profile.angleAt(10**9 + 1000000))
+        self.assertAlmostEqual(900, profile.angleAt(500000000))
+        self.assertAlmostEqual(500000000, profile.timeAt(900), delta=1)
+        self.assertAlmostEqual(10**9 + 1000000, profile.timeAt(3607.2), delta=1)
+
+    def test_decel(self):
+        # 1200 down to 0, and it stays stopped
+        profile = crank.RpmProfile([(0, 1200), (1, 0)])
+        self.assertAlmostEqual(3600, profile.angleAt(10**9))
+        self.assertAlmostEqual(3600, profile.angleAt(2 * 10**9))
+        self.assertAlmostEqual(10**9 - 500000000 * 2 ** 0.5, profile.timeAt(1800), delta=1)
+        self.assertEqual(None, profile.timeAt(3601))
+
+    def test_stall(self):
+        profile = crank.RpmProfile([(0, 0), (1, 0), (2, 1200)])
+        self.assertAlmostEqual(0, profile.angleAt(10**9))
+        self.assertAlmostEqual(1.5 * 10**9, profile.timeAt(900), delta=1)
+
+    def test_crank_profile(self):
+        sc = FakeClock()
+        c = crank.Crank(sc, 1000)
+        sc.now = 1000000
+        c.SetProfile(crank.RpmProfile([(0, 1000), (1, 2000)]))
+        self.assertAlmostEqual(6, c.currentAngleDegrees)
+        self.assertAlmostEqual(1000, c.rpm)
+        sc.now = 501000000
+        self.assertAlmostEqual(1500, c.rpm)
+        sc.now += c.nsecUntil(100)
+        self.assertAlmostEqual(100, c.currentAngleDegrees, places=3)
+        self.assertTrue(c.currentAngleDegrees >= 100)
+
+    def test_profiles(self):
+        for name, points in crank.PROFILES.items():
+            profile = crank.RpmProfile(points)
+            self.assertEqual(200, profile.rpmAt(0), name)
+            # every edge can be found again from its angle
+            for t in range(0, 20 * 10**9, 10**8):
+                self.assertAlmostEqual(t, profile.timeAt(profile.angleAt(t)), delta=1)
+
+if __name__ == '__main__':
+    unittest.main()
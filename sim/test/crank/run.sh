@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python crank_test.py
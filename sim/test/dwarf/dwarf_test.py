@@ -4,6 +4,7 @@ import dwarf
 import memory
 
 import unittest
+import array
 
 # TODO: embed the type name in the wrapper
 
@@ -147,6 +148,128 @@ class TestDwarf(unittest.TestCase):
         self.assertEqual(1, npsval.read())
 
 
+    def test_index(self):
+        mem = memory.DictMemory()
+        variables = dwarf.Globals(mem, 'speeduino.elf', 'speeduino/speeduino.ino.cpp')
+        cu_die = variables.dwarf.getCuDie('speeduino/speeduino.ino.cpp')
+        self.assertTrue(cu_die is variables.cu_die)
+        fpt = variables.dwarf.getVarDie(cu_die, 'fpPrimeTime')
+        self.assertTrue(fpt is variables.dwarf.getVarDie(cu_die, 'fpPrimeTime'))
+        self.assertTrue(fpt is variables.dwarf.getDieByOffset(cu_die, fpt.offset))
+        with self.assertRaises(ValueError):
+            variables.dwarf.getCuDie('no_such_cu')
+        with self.assertRaises(ValueError):
+            variables.dwarf.getDieByOffset(cu_die, 0)
+
+    def test_descriptor(self):
+        mem = memory.DictMemory()
+        variables = dwarf.Globals(mem, 'speeduino.elf', 'speeduino/speeduino.ino.cpp')
+        triggerAngle = variables.descriptor('configPage4.triggerAngle')
+        self.assertEqual('configPage4.triggerAngle', triggerAngle.name)
+        self.assertEqual(3846, triggerAngle.address)            # (in this particular elf file)
+        self.assertEqual(2, triggerAngle.byte_size)
+        self.assertEqual(5, triggerAngle.encoding)
+        self.assertTrue(triggerAngle is variables.descriptor('configPage4.triggerAngle'))
+        self.assertTrue(triggerAngle is variables.variable('configPage4').member('triggerAngle').descriptor())
+        variables.write('configPage4.triggerAngle', -2)
+        self.assertDictEqual({3846:254, 3847:255}, mem.rw)
+        self.assertEqual(-2, variables.read('configPage4.triggerAngle'))
+        nps = variables.descriptor('npage_size[1]')
+        self.assertEqual(700, nps.address)
+        self.assertEqual(2, variables.read('data_structure_version'))   # const
+        with self.assertRaises(ValueError):
+            variables.descriptor('configPage4')                  # not a primitive
+        with self.assertRaises(ValueError):
+            variables.descriptor('configPage4.no_such_member')
+
+    def test_symbol_cache(self):
+        mem = memory.DictMemory()
+        dwarf.Globals(mem, 'speeduino.elf', 'speeduino/speeduino.ino.cpp') # makes sure the cache exists
+        variables = dwarf.Globals(mem, 'speeduino.elf', 'speeduino/speeduino.ino.cpp')
+        self.assertEqual(3846, variables.address('configPage4.triggerAngle'))
+        self.assertEqual(4975, variables.address('fpPrimeTime'))
+        self.assertEqual(698, variables.address('npage_size'))
+        self.assertEqual(700, variables.address('npage_size[1]'))
+        variables.write('configPage4.triggerAngle', 1)
+        self.assertEqual(1, variables.read('configPage4.triggerAngle'))
+        self.assertIn('triggerAngle', variables.getAllMemberNames('configPage4'))
+        self.assertTrue(variables.dwarf.file is None)       # didn't need the dwarf
+        uncached = dwarf.Globals(mem, 'speeduino.elf', 'speeduino/speeduino.ino.cpp', cache=False)
+        for name in ['configPage4.triggerAngle', 'currentStatus.RPM', 'fpPrimeTime', 'clutchTrigger']:
+            self.assertEqual(uncached.descriptor(name).fields(), variables.descriptor(name).fields())
+
+    def test_block(self):
+        mem = memory.DictMemory()
+        variables = dwarf.Globals(mem, 'speeduino.elf', 'speeduino/speeduino.ino.cpp')
+        self.assertEqual(bytearray(4), mem.read_block(3846, 4))
+        mem.write_block(3846, b'\x01\x00')
+        self.assertDictEqual({3846:1, 3847:0}, mem.rw)
+        self.assertEqual(1, variables.read('configPage4.triggerAngle'))
+        # uint16_t[12]
+        nps = variables.variable('npage_size')
+        self.assertEqual(24, nps.byte_size())
+        self.assertEqual(24, variables.size('npage_size'))
+        nps.write_block(bytearray(range(24)))
+        self.assertEqual(0x0302, nps.get(1).read())
+        self.assertEqual(bytearray(range(24)), variables.read_block('npage_size'))
+        with self.assertRaises(ValueError):
+            variables.write_block('npage_size', bytearray(23))
+        configPage4 = variables.variable('configPage4')
+        self.assertEqual(configPage4.byte_size(), len(configPage4.read_block()))
+
+    def test_snapshot(self):
+        mem = memory.DictMemory()
+        variables = dwarf.Globals(mem, 'speeduino.elf', 'speeduino/speeduino.ino.cpp')
+        variables.write('configPage4.triggerAngle', -5)
+        variables.write('configPage4.TrigPattern', 3)    # bitfield
+        variables.write('configPage4.triggerTeeth', 36)
+        snapshot = variables.snapshot('configPage4')
+        self.assertEqual(-5, snapshot['triggerAngle'])
+        self.assertEqual(3, snapshot['TrigPattern'])
+        self.assertEqual(36, snapshot['triggerTeeth'])
+        self.assertEqual(0, snapshot['crankRPM'])
+        configPage4 = variables.variable('configPage4')
+        self.assertDictEqual(snapshot, configPage4.snapshot())
+        for name in configPage4.getAllMemberNames():
+            if name in snapshot:
+                self.assertEqual(configPage4.member(name).read(), snapshot[name])
+
+    def test_array_block(self):
+        mem = memory.DictMemory()
+        variables = dwarf.Globals(mem, 'speeduino.elf', 'speeduino/speeduino.ino.cpp')
+        # uint16_t[12]
+        nps = variables.variable('npage_size')
+        nps.write(range(100, 112))
+        self.assertEqual(105, nps.get(5).read())
+        self.assertEqual(array.array('H', range(100, 112)), nps.read())
+        self.assertEqual(array.array('H', [102, 103]), nps.read(2, 4))
+        self.assertEqual(array.array('H', range(100, 112)), variables.read('npage_size'))
+        variables.writeArray('npage_size', [7, 8], 10)
+        self.assertEqual(array.array('H', [105, 106, 107, 108, 109, 7, 8]), variables.readArray('npage_size', 5))
+        with self.assertRaises(ValueError):
+            nps.write(range(13))                 # too many
+        with self.assertRaises(ValueError):
+            variables.writeArray('npage_size', [65536])
+        with self.assertRaises(ValueError):
+            variables.readArray('npage_size', 4, 13)
+        # uint8_t[512]
+        variables.write('cltCalibrationTable', [x >> 1 for x in range(512)])
+        self.assertEqual(100, variables.read('cltCalibrationTable[200]'))
+        self.assertEqual(255, variables.read('cltCalibrationTable')[511])
+        with self.assertRaises(ValueError):
+            variables.writeArray('npage_size', [1.5])   # not integral
+
+    def test_encode_array(self):
+        self.assertEqual(bytearray('\x01\x00'), dwarf.encodeArray(2, 1, [True, 0]))
+        with self.assertRaises(ValueError):
+            dwarf.encodeArray(2, 1, [0, 2])      # bool is 0 or 1
+        with self.assertRaises(ValueError):
+            dwarf.encodeArray(8, 1, [256])
+        with self.assertRaises(ValueError):
+            dwarf.encodeArray(5, 2, [1, 2.5])
+        self.assertEqual(bytearray('\x00\x00\xc0\x3f'), dwarf.encodeArray(4, 4, [1.5]))
+        self.assertEqual(bytearray(), dwarf.encodeArray(2, 1, []))
+
     # TODO: make pointers work
     #
     #def test_struct_array(self):
@@ -0,0 +1,95 @@
+import sys
+sys.path.append("../..")
+import eeprom
+
+import os
+import tempfile
+import unittest
+
+# same methods as the simulavr eeprom
+class FakeEeprom:
+    def __init__(self, size):
+        self.data = [0] * size
+    def GetSize(self):
+        return len(self.data)
+    def ReadFromAddress(self, addr):
+        return self.data[addr]
+    def WriteAtAddress(self, addr, val):
+        self.data[addr] = val
+
+class EepromTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def readFile(self):
+        with open(self.filename, 'rb') as f:
+            return bytearray(f.read())
+
+    def testLoad(self):
+        with open(self.filename, 'wb') as f:
+            f.write(bytearray(range(16)))
+        dev = FakeEeprom(16)
+        image = eeprom.EepromImage(dev, self.filename)
+        image.load()
+        self.assertEqual(range(16), dev.data)
+        self.assertEqual([], image.save())          # nothing changed
+
+    def testShortFile(self):
+        with open(self.filename, 'wb') as f:
+            f.write(bytearray([1, 2]))
+        dev = FakeEeprom(8)
+        image = eeprom.EepromImage(dev, self.filename)
+        image.load()
+        self.assertEqual([1, 2, 0, 0, 0, 0, 0, 0], dev.data)
+        dev.data[7] = 9
+        self.assertEqual([(0, 8)], image.save())    # the whole thing, once
+        self.assertEqual(bytearray([1, 2, 0, 0, 0, 0, 0, 9]), self.readFile())
+        dev.data[3] = 5
+        self.assertEqual([(3, 4)], image.save())
+
+    def testShortFileErased(self):
+        with open(self.filename, 'wb') as f:
+            f.write(bytearray(100))
+        dev = FakeEeprom(4096)
+        dev.data = [0xff] * 4096
+        image = eeprom.EepromImage(dev, self.filename)
+        image.load()
+        dev.data[3000] = 1
+        image.save()
+        fresh = FakeEeprom(4096)
+        eeprom.EepromImage(fresh, self.filename).load()
+        self.assertEqual(0, fresh.data[99])
+        self.assertEqual(0xff, fresh.data[100])     # not a hole
+        self.assertEqual(1, fresh.data[3000])
+
+    def testDirtyRanges(self):
+        with open(self.filename, 'wb') as f:
+            f.write(bytearray(4096))
+        dev = FakeEeprom(4096)
+        image = eeprom.EepromImage(dev, self.filename)
+        image.load()
+        dev.data[10] = 1
+        dev.data[11] = 2
+        dev.data[4095] = 3
+        self.assertEqual([(10, 12), (4095, 4096)], image.save())
+        expected = bytearray(4096)
+        expected[10:12] = bytearray([1, 2])
+        expected[4095] = 3
+        self.assertEqual(expected, self.readFile())
+        self.assertEqual([], image.save())
+
+    def testSaveWithoutLoad(self):
+        dev = FakeEeprom(4)
+        dev.data = [4, 3, 2, 1]
+        image = eeprom.EepromImage(dev, self.filename)
+        self.assertEqual([(0, 4)], image.save())
+        self.assertEqual(bytearray([4, 3, 2, 1]), self.readFile())
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(EepromTest)
+    unittest.TextTestRunner(verbosity=2).run(suite)
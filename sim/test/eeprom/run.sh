@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python eeprom_test.py
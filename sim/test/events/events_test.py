@@ -0,0 +1,77 @@
+import sys
+sys.path.append("../..")
+import events
+
+import unittest
+
+# steps every period ns, count times
+class Ticker:
+    def __init__(self, period, count=None):
+        self.period = period
+        self.count = count
+        self.times = []
+    def step(self, now):
+        self.times.append(now)
+        if self.count is not None and len(self.times) >= self.count:
+            return -1
+        return self.period
+
+class TestEventQueue(unittest.TestCase):
+    def test_empty(self):
+        q = events.EventQueue()
+        self.assertIsNone(q.next())
+        self.assertIsNone(q.run(100))
+
+    def test_order(self):
+        q = events.EventQueue()
+        a = Ticker(10)
+        b = Ticker(15)
+        q.add(a, 0)
+        q.add(b, 0)
+        t = q.run(0)
+        while t <= 30:
+            t = q.run(t)
+        self.assertEqual([0, 10, 20, 30], a.times)
+        self.assertEqual([0, 15, 30], b.times)
+        self.assertEqual(40, t)
+
+    def test_same_time_one_run(self):
+        q = events.EventQueue()
+        tickers = [Ticker(10) for i in range(5)]
+        for ticker in tickers:
+            q.add(ticker, 0)
+        self.assertEqual(10, q.run(0))
+        self.assertEqual(20, q.run(10))   # all of them, in one go
+        for ticker in tickers:
+            self.assertEqual([0, 10], ticker.times)
+
+    def test_stop(self):
+        q = events.EventQueue()
+        a = Ticker(10, 2)
+        q.add(a, 0)
+        self.assertEqual(10, q.run(0))
+        self.assertIsNone(q.run(10))
+        self.assertEqual(0, len(q))
+
+    def test_add_twice(self):
+        q = events.EventQueue()
+        a = Ticker(100)
+        q.add(a, 50)
+        q.add(a, 70)      # later, ignored
+        self.assertEqual(50, q.next())
+        q.add(a, 20)      # sooner wins
+        self.assertEqual(20, q.next())
+        self.assertEqual(1, len(q))
+        self.assertEqual(150, q.run(50))
+        self.assertEqual([50], a.times)   # the stale entry at 50 didn't step it again
+
+    def test_remove(self):
+        q = events.EventQueue()
+        a = Ticker(10)
+        q.add(a, 0)
+        q.remove(a)
+        self.assertIsNone(q.run(100))
+        self.assertEqual([], a.times)
+
+if __name__ == '__main__':
+    unittest.main()
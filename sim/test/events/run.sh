@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python events_test.py
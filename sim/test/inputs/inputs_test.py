@@ -0,0 +1,68 @@
+import sys
+sys.path.append("../..")
+import inputs
+import events
+
+import unittest
+
+# same methods as pysimulavr.SystemClock
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+    def GetCurrentTime(self):
+        return self.now
+
+# what the scheduler uses of dispatcher.Dispatcher: members are only
+# stepped while they're in the queue
+class FakeDispatcher:
+    def __init__(self, sc):
+        self.sc = sc
+        self.events = events.EventQueue()
+    def add(self, member, delay=0):
+        self.events.add(member, self.sc.GetCurrentTime() + delay)
+    # steps everything due until the queue is empty
+    def runAll(self):
+        t = self.events.next()
+        while t is not None:
+            self.sc.now = t
+            t = self.events.run(t)
+
+class FakePin:
+    def __init__(self, name):
+        self.name = name
+        self.values = []
+    def SetAnalogValue(self, volts):
+        self.values.append(volts)
+
+class TestInputScheduler(unittest.TestCase):
+    def test_add_after_idle(self):
+        sc = FakeClock()
+        dispatcher = FakeDispatcher(sc)
+        scheduler = inputs.InputScheduler(sc, dispatcher)
+        tps = FakePin('tps')
+        scheduler.add(tps, iter([(0, 1.0), (1000, 2.0)]))
+        dispatcher.runAll()
+        self.assertEqual([1.0, 2.0], tps.values)
+        self.assertIsNone(dispatcher.events.next())   # idle now
+        sc.now = 5000
+        bat = FakePin('bat')
+        scheduler.add(bat, iter([(0, 12.0), (1000, 13.0), (2000, 14.0)]))
+        self.assertEqual([12.0], bat.values)
+        dispatcher.runAll()
+        self.assertEqual([12.0, 13.0, 14.0], bat.values)   # the rest plays
+        self.assertEqual(7000, sc.now)
+
+    def test_one_wake_per_change(self):
+        sc = FakeClock()
+        dispatcher = FakeDispatcher(sc)
+        scheduler = inputs.InputScheduler(sc, dispatcher)
+        pins = [FakePin('p%d' % i) for i in range(3)]
+        for pin in pins:
+            scheduler.add(pin, iter([(0, 1.0), (1000, 2.0)]))
+        self.assertEqual(1000, dispatcher.events.next())
+        dispatcher.runAll()
+        for pin in pins:
+            self.assertEqual([1.0, 2.0], pin.values)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python inputs_test.py
@@ -0,0 +1,100 @@
+import sys
+sys.path.append("../..")
+import pipe
+
+import unittest
+import os, time, tty, select
+
+# what the pipe uses of dispatcher.Dispatcher
+class FakeDispatcher:
+    def __init__(self):
+        self.posted = []
+        self.added = {}
+    def post(self, member):
+        self.posted.append(member)
+    def add(self, member, delay=0):
+        self.added[member] = delay
+    def remove(self, member):
+        del self.added[member]
+
+class FakeRxPin:
+    def __init__(self):
+        self.queue = ''
+        self.listener = None
+    def popChars(self):
+        d = self.queue
+        self.queue = ''
+        return d
+
+class FakeTxPin:
+    def __init__(self):
+        self.queue = ''
+    def pushChars(self, c):
+        self.queue += c
+    def shift(self):    # the avr reads it
+        self.queue = ''
+
+class TestPipe(unittest.TestCase):
+    def setUp(self):
+        self.dispatcher = FakeDispatcher()
+        self.rxpin = FakeRxPin()
+        self.txpin = FakeTxPin()
+        self.pipe = pipe.Pipe('/tmp/testpipe', self.rxpin, self.txpin,
+                              self.dispatcher, latency=500000, idle=50000000)
+        self.host = os.open('/tmp/testpipe', os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.host)
+
+    def tearDown(self):
+        os.close(self.host)
+        self.pipe.close()
+
+    def test_setup(self):
+        self.assertIs(self.pipe, self.rxpin.listener)
+        self.assertEqual({self.pipe: 50000000}, self.dispatcher.added)   # idle poll
+        self.assertEqual([], self.dispatcher.posted)   # nothing until there's traffic
+        self.assertEqual(50000000, self.pipe.step(1000))   # still nothing
+
+    def test_close(self):
+        self.pipe.close()
+        self.assertFalse(os.path.lexists('/tmp/testpipe'))
+        self.assertEqual({}, self.dispatcher.added)   # no more polling
+        self.assertFalse(os.path.exists('pipe.dump'))   # no dump unless asked
+        # reopen so that tearDown has something to close
+        self.setUp()
+
+    def test_host_to_avr(self):
+        os.write(self.host, 'r\x00\x0f')
+        for i in range(100):
+            if self.dispatcher.posted:
+                break
+            time.sleep(0.01)
+        self.assertEqual([self.pipe], self.dispatcher.posted)
+        self.assertEqual(500000, self.pipe.step(1000))   # polls while busy
+        self.assertEqual('r\x00\x0f', self.txpin.queue)
+        self.txpin.shift()
+        self.assertEqual(50000000, self.pipe.step(2000))   # and not after
+
+    def test_avr_to_host(self):
+        self.rxpin.queue = 'hello'
+        self.assertEqual(500000, self.pipe.step(1000))
+        self.assertEqual('hello', os.read(self.host, 100))
+
+    def test_host_not_reading(self):
+        # more than the pty holds: the rest waits, past MAXPENDING the
+        # oldest goes
+        self.rxpin.queue = 'x' * 200000
+        self.assertEqual(500000, self.pipe.step(1000))
+        self.assertTrue(0 < len(self.pipe.outgoing) <= pipe.Pipe.MAXPENDING)
+        self.assertTrue(self.pipe.dropped > 0)
+        read = 0
+        for i in range(1000):
+            if select.select([self.host], [], [], 0.01)[0]:
+                read += len(os.read(self.host, 100000))
+            elif not self.pipe.outgoing:
+                break
+            self.pipe.step(1000 + i)
+        self.assertEqual(0, len(self.pipe.outgoing))
+        self.assertEqual(200000, read + self.pipe.dropped)   # none lost quietly
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python pipe_test.py
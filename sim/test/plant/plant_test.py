@@ -0,0 +1,60 @@
+import sys
+sys.path.append("../..")
+import plant
+
+import unittest
+
+# ms per pulse for 8 pulses a cycle to make afr with air at map
+def widths(engine, afr):
+    fuel = engine.airPerCycle() / afr
+    return [fuel / engine.injectorFlow / 8 + engine.injectorDeadMs] * 8
+
+class TestPlant(unittest.TestCase):
+    def test_cranking(self):
+        engine = plant.EnginePlant(200)
+        for cycle in range(10):
+            engine.cycle([], [], 0.0)
+        # the starter holds it at cranking speed, no fuel is lean
+        self.assertEqual(200, engine.rpm)
+        self.assertTrue(engine.starting)
+        self.assertAlmostEqual(engine.leanAfr, engine.afr)
+        self.assertTrue(engine.mapKpa < 35)
+
+    def test_idle(self):
+        engine = plant.EnginePlant(200)
+        for cycle in range(100):
+            engine.cycle(widths(engine, 14.7), [15] * 4, 0.0)
+        self.assertFalse(engine.starting)
+        self.assertAlmostEqual(14.7, engine.afr, places=1)
+        self.assertTrue(600 < engine.rpm < 1200)
+
+    def test_spark(self):
+        # best spark makes more rpm than retarded spark
+        rpms = []
+        for advance in (25, 0):
+            engine = plant.EnginePlant(200)
+            for cycle in range(100):
+                engine.cycle(widths(engine, 13.0), [advance] * 4, 0.0)
+            rpms.append(engine.rpm)
+        self.assertTrue(rpms[0] > rpms[1])
+
+    def test_throttle(self):
+        engine = plant.EnginePlant(200)
+        for cycle in range(100):
+            engine.cycle(widths(engine, 13.0), [25] * 4, 0.0)
+        idle = engine.rpm
+        for cycle in range(20):
+            engine.cycle(widths(engine, 13.0), [25] * 4, 1.0)
+        self.assertTrue(engine.mapKpa > 95)
+        self.assertTrue(engine.rpm > idle)
+
+    def test_stall(self):
+        engine = plant.EnginePlant(200)
+        for cycle in range(100):
+            engine.cycle(widths(engine, 14.7), [15] * 4, 0.0)
+        for cycle in range(100):
+            engine.cycle([], [], 0.0)   # fuel cut
+        self.assertEqual(0, engine.rpm)
+
+if __name__ == '__main__':
+    unittest.main()
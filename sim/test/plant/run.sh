@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python plant_test.py
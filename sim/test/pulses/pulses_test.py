@@ -0,0 +1,68 @@
+import sys
+sys.path.append("../..")
+import crank
+import pulses
+
+import unittest
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+    def GetCurrentTime(self):
+        return self.now
+
+class TestPulses(unittest.TestCase):
+    def test_buffer(self):
+        buf = pulses.EdgeBuffer(4)
+        self.assertEqual([], buf.edges())
+        buf.record(10, 1)
+        buf.record(20, 0)
+        self.assertEqual([(10, 1), (20, 0)], buf.edges())
+        for t in range(30, 70, 10):
+            buf.record(t, t / 10 % 2)
+        # only the last 4
+        self.assertEqual([(30, 1), (40, 0), (50, 1), (60, 0)], buf.edges())
+        self.assertEqual(6, buf.count)
+        self.assertEqual([(50, 1), (60, 0)], buf.edges(since=4))
+        self.assertEqual([(30, 1), (40, 0), (50, 1), (60, 0)], buf.edges(since=0))
+        buf.clear(1)
+        self.assertEqual([(60, 0)], buf.edges())
+        buf.clear()
+        self.assertEqual([], buf.edges())
+        buf.record(70, 1)
+        self.assertEqual([(70, 1)], buf.edges())
+        self.assertEqual([(60, 0), (70, 1)], buf.edges(since=5))
+
+    def test_analyze(self):
+        edges = [(0, 0), (100, 1), (300, 0), (1100, 1), (1500, 0), (2100, 1)]
+        stats = pulses.analyze(edges)
+        self.assertEqual([100, 1100], stats.starts)
+        self.assertEqual([200, 400], stats.widths)
+        self.assertEqual(2, stats.count)
+        self.assertEqual(200, stats.minWidth)
+        self.assertEqual(400, stats.maxWidth)
+        self.assertEqual(300, stats.meanWidth)
+        self.assertAlmostEqual(600 / 2100.0, stats.duty)
+
+    def test_active_low(self):
+        edges = [(0, 1), (100, 0), (300, 1)]
+        stats = pulses.analyze(edges, active=0)
+        self.assertEqual([200], stats.widths)
+
+    def test_empty(self):
+        stats = pulses.analyze([])
+        self.assertEqual(0, stats.count)
+        self.assertEqual(0.0, stats.duty)
+
+    def test_angles(self):
+        sc = FakeClock()
+        c = crank.Crank(sc, 1000)   # 6 degrees per ms
+        stats = pulses.analyze([(1000000, 1), (2000000, 0), (121000000, 1),
+                                (122000000, 0)], crank=c)
+        self.assertEqual(2, len(stats.startAngles))
+        self.assertAlmostEqual(6, stats.startAngles[0])
+        self.assertAlmostEqual(6, stats.startAngles[1])
+        self.assertAlmostEqual(12, stats.endAngles[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python pulses_test.py
@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python sensors_test.py
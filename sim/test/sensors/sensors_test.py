@@ -0,0 +1,41 @@
+import sys
+sys.path.append("../..")
+import sensors
+
+import unittest
+
+class TestSensors(unittest.TestCase):
+    def test_map(self):
+        table = sensors.SENSORS['map']
+        self.assertAlmostEqual(sensors.mpx4250(100), table(100))
+        self.assertAlmostEqual(sensors.mpx4250(100.5), table(100.5))
+        self.assertAlmostEqual(5.1 * (0.00369 * 100 + 0.04), table(100))
+        self.assertEqual(5.0, table(300))   # clamped to vcc
+
+    def test_afr(self):
+        table = sensors.SENSORS['o2']
+        self.assertAlmostEqual(0.0, table(7.3125))
+        self.assertAlmostEqual(3.0, table(14.4375))
+        self.assertAlmostEqual(5.0, table(19.1875))
+        self.assertAlmostEqual(5.0, table(25))
+
+    def test_thermistor(self):
+        table = sensors.SENSORS['clt']
+        # 20C is 3520 ohms
+        self.assertAlmostEqual(5.0 * 3520 / (3520 + 2490), table(20))
+        # hotter is lower
+        volts = table.convert(range(-40, 131, 10))
+        for v0, v1 in zip(volts, volts[1:]):
+            self.assertTrue(v1 < v0)
+        self.assertAlmostEqual(sensors.thermistor(42.5), table(42.5), places=2)
+
+    def test_battery(self):
+        self.assertAlmostEqual(2.59, sensors.SENSORS['bat'](12.7), places=2)
+
+    def test_waveform(self):
+        table = sensors.SENSORS['tps']
+        self.assertEqual([(0, 0.0), (10, 2.5)],
+                         list(table.waveform([(0, 0), (10, 50)])))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,6 +12,8 @@ import time
 import datetime
 import types
 import struct
+import os
+import socket
 
 class ServerTest(unittest.TestCase):
 
@@ -48,6 +50,194 @@ class ServerTest(unittest.TestCase):
         us_per_iter = td.total_seconds() * 1000000 / iterations
         print "round trip us per iter %f" % us_per_iter # about 36 us per round-trip
 
+    def testPipelined(self):
+        ptyname = "/tmp/testclient"
+        myclient = test_client.Client(ptyname)
+        myserver = server.Server(ptyname)
+        myserver.run()
+
+        # all the requests in one write, the server answers them all
+        os.write(myclient.mfd, ''.join(
+            '\x00' + messages.Request(0, j, 0).toSerial() + '\x00' for j in range(80)))
+        frames = server.FrameBuffer()
+        packets = []
+        while len(packets) < 80:
+            myclient.epoll.poll(1)
+            try:
+                packets.extend(frames.feed(os.read(myclient.mfd, 1000)))
+            except OSError:
+                pass
+        self.assertEqual([3 * j for j in range(80)],
+                         [messages.Response.fromSerial(p).y for p in packets])
+        myserver.stop()
+
+    def testTwoClients(self):
+        clients = [test_client.Client("/tmp/testclient%d" % i) for i in range(2)]
+        myserver = server.Server()
+        for i in range(2):
+            myserver.addPty("/tmp/testclient%d" % i)
+        myserver.run()
+        for i in range(10):
+            for j, myclient in enumerate(clients):
+                resBytes = myclient.rpc(messages.Request(0, i + j, 0).toSerial())
+                self.assertEqual(3 * (i + j), messages.Response.fromSerial(resBytes).y)
+        myserver.stop()
+
+    # request frame => response packet, over a socket
+    def socketRpc(self, sock, j):
+        sock.sendall('\x00' + messages.Request(0, j, 0).toSerial() + '\x00')
+        frames = server.FrameBuffer()
+        packets = []
+        while not packets:
+            packets = frames.feed(sock.recv(1000))
+        return messages.Response.fromSerial(packets[0]).y
+
+    def testClientGone(self):
+        myserver = server.Server()
+        gone, goneServer = socket.socketpair()
+        ok, okServer = socket.socketpair()
+        goneFd = os.dup(goneServer.fileno())
+        myserver.addClient(goneFd)
+        myserver.addClient(os.dup(okServer.fileno()))
+        goneServer.close()
+        okServer.close()
+        # hangs up before the answer, so the server gets EPIPE
+        gone.close()
+        myserver.send(goneFd, '\x00hello\x00')
+        self.assertEqual(1, len(myserver.clients))
+        myserver.run()
+        self.assertEqual(6, self.socketRpc(ok, 2))   # still serving
+        myserver.stop()
+        ok.close()
+
+    def testBadRequest(self):
+        myserver = server.Server()
+        bad, badServer = socket.socketpair()
+        ok, okServer = socket.socketpair()
+        myserver.addClient(os.dup(badServer.fileno()))
+        myserver.addClient(os.dup(okServer.fileno()))
+        badServer.close()
+        okServer.close()
+        myserver.run()
+        # 2 * 200 doesn't fit in the response
+        bad.sendall('\x00' + messages.Request(200, 1, 0).toSerial() + '\x00')
+        bad.sendall('\x00' + messages.RequestBatch(
+            [messages.Request(200, 1, 0)]).toSerial() + '\x00')
+        time.sleep(0.1)
+        self.assertEqual(6, self.socketRpc(ok, 2))   # still serving
+        self.assertEqual(9, self.socketRpc(bad, 3))  # the bad one too
+        myserver.stop()
+        bad.close()
+        ok.close()
+
+    def testSlowClient(self):
+        myserver = server.Server()
+        slow, slowServer = socket.socketpair()
+        ok, okServer = socket.socketpair()
+        myserver.addClient(os.dup(slowServer.fileno()))
+        myserver.addClient(os.dup(okServer.fileno()))
+        slowServer.close()
+        okServer.close()
+        myserver.run()
+        # far more answers than the socket buffer holds, and never read
+        request = '\x00' + messages.Request(0, 1, 0).toSerial() + '\x00'
+        slow.setblocking(0)
+        try:
+            for i in range(20000):
+                slow.send(request * 10)
+        except socket.error:
+            pass
+        time.sleep(0.1)
+        self.assertEqual(9, self.socketRpc(ok, 3))   # not held up
+        myserver.stop()                              # not stuck in a write
+        slow.close()
+        ok.close()
+
+    def testFrameBuffer(self):
+        frames = server.FrameBuffer()
+        self.assertEqual([], frames.feed("junk\x00abc"))
+        self.assertEqual(["abc", "defg"], frames.feed("\x00\x00\x00defg\x00"))
+        self.assertEqual([], frames.feed("\x00x\x00"))      # too short
+        self.assertEqual(["hijk"], frames.feed("hijk\x00"))
+
+    def testFrameBufferByteAtATime(self):
+        frames = server.FrameBuffer()
+        stream = "\x00\x00".join("packet%d" % i for i in range(1000)) + "\x00"
+        packets = []
+        for c in stream:
+            packets.extend(frames.feed(c))
+        # the first one isn't after a delimiter
+        self.assertEqual(["packet%d" % i for i in range(1, 1000)], packets)
+        self.assertEqual(0, len(frames.buffer))
+
+    def testFrameBufferNoise(self):
+        frames = server.FrameBuffer()
+        noise = "\x00" + "\x00\x01" * 10000 + "\x00abcd"
+        self.assertEqual([], frames.feed(noise))
+        self.assertEqual(["abcdefg"], frames.feed("efg\x00"))
+
+    def testFrameBufferLongNoise(self):
+        frames = server.FrameBuffer()
+        self.assertEqual([], frames.feed("\x00"))
+        noise = "\x01" * 800000
+        t0 = datetime.datetime.now()
+        for i in range(0, len(noise), 16):
+            self.assertEqual([], frames.feed(noise[i:i + 16]))
+            self.assertTrue(len(frames.buffer) <= server.FrameBuffer.MAXFRAME)
+        # each feed only looks at its own bytes
+        self.assertTrue((datetime.datetime.now() - t0).total_seconds() < 5)
+        request = messages.Request(0, 2, 0).toSerial()
+        self.assertEqual([request], frames.feed("\x00" + request + "\x00"))
+
+    def testBatch(self):
+        ptyname = "/tmp/testclient"
+        myclient = test_client.Client(ptyname)
+        myserver = server.Server(ptyname)
+        myserver.run()
+
+        batch = messages.RequestBatch([messages.Request(j, j + 1, 0) for j in range(4)])
+        resBytes = myclient.rpc(batch.toSerial())
+        res = messages.ResponseBatch.fromSerial(resBytes)
+        self.assertEqual([(2 * j, 3 * (j + 1)) for j in range(4)],
+                         [(r.x, r.y) for r in res.responses])
+        myserver.stop()
+
+    def testBatchPack(self):
+        batch = messages.RequestBatch([messages.Request(1, 2, 3), messages.Request(4, 5, 6)])
+        self.assertEqual("\x02\x01\x02\x03\x04\x05\x06", batch.pack())
+        batch2 = messages.RequestBatch.unpack(batch.pack())
+        self.assertEqual([(1, 2, 3), (4, 5, 6)], [(r.a, r.b, r.c) for r in batch2.requests])
+        self.assertEqual(0, len(messages.ResponseBatch.unpack("\x00").responses))
+        with self.assertRaises(ValueError):
+            messages.RequestBatch.unpack("\x02\x01\x02\x03")   # count says 2
+
+    def testBatchTooBig(self):
+        self.assertEqual(1 + 3 * 255, len(messages.RequestBatch(
+            [messages.Request(1, 2, 3)] * 255).pack()))
+        with self.assertRaises(ValueError):
+            messages.RequestBatch([messages.Request(1, 2, 3)] * 256).pack()
+        with self.assertRaises(ValueError):
+            messages.ResponseBatch([messages.Response(1, 2)] * 256).pack()
+
+    def testBatchPerformance(self):
+        ptyname = "/tmp/testclient"
+        myclient = test_client.Client(ptyname)
+        myserver = server.Server(ptyname)
+        myserver.run()
+
+        iterations = 5000
+        t0 = datetime.datetime.now()
+        for i in range(0, iterations):
+            j = i % 80
+            batch = messages.RequestBatch([messages.Request(0, j, c) for c in range(4)])
+            res = messages.ResponseBatch.fromSerial(myclient.rpc(batch.toSerial()))
+            self.assertEqual(3 * j, res.responses[3].y)
+        t1 = datetime.datetime.now()
+        td = t1 - t0
+        us_per_iter = td.total_seconds() * 1000000 / (iterations * 4)
+        print "batched round trip us per request %f" % us_per_iter
+        myserver.stop()
+
     def testCrc(self):
         message = "hello"
         mycodec = codec.Codec()
@@ -73,6 +263,21 @@ class ServerTest(unittest.TestCase):
         self.assertEqual(1, res2.x)
         self.assertEqual(2, res2.y)
 
+    def testCrcTable(self):
+        self.assertEqual(256, len(codec.CRC_TABLE))
+        self.assertEqual(0x1021, codec.CRC_TABLE[1])
+        for message in ["", "hello", "\x00\x02\x00", "".join(map(chr, range(256)))]:
+            self.assertEqual(codec.crc16(message), codec.crc16Table(message))
+        self.assertEqual(50018, codec.crc16Table("hello"))
+        self.assertEqual(0x31c3, codec.crc16Table("123456789"))  # the check value
+
+    def testCrcIncremental(self):
+        crc = codec.Crc16()
+        crc.update("hel")
+        crc.update("lo")
+        self.assertEqual(50018, crc.value)
+        self.assertEqual(50018, codec.crc16Table("lo", codec.crc16Table("hel")))
+
     def testCrcBytes(self):
         mycodec = codec.Codec()
         myCrcBytes = mycodec.crcBytes("hello")
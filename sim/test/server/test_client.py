@@ -3,7 +3,6 @@ sys.path.append("../..")
 import server
 
 import sys, os, pty, select, fcntl, termios, tty
-import collections
 
 # simple client for python server
 class Client:
@@ -34,16 +33,14 @@ class Client:
 
     def rpc(self, request):
         self.write(request)
-        mybuffer = ''
+        frames = server.FrameBuffer()
         while True:                         # wait for input
             events = self.epoll.poll(1)
             if len(events) != 1: continue   # timed out
             fileno = events[0][0]
             if self.mfd != fileno: continue # should never happen
-            packetGen = server.Server.readPackets(fileno, mybuffer)
+            packets = frames.feed(os.read(fileno, 1000))
+            if not packets: continue        # not a whole packet yet
             # take the first one, maybe it's the right one?
             # TODO: find the actual right one?  maybe catching up is enough
-            mypacket = next(packetGen)
-            # empty the queue, to try to catch up if we're behind
-            collections.deque(packetGen, maxlen=0)
-            return mypacket
+            return packets[0]
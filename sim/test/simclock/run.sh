@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python simclock_test.py
@@ -0,0 +1,24 @@
+import sys
+sys.path.append("../..")
+import simclock
+
+import unittest
+import os, tempfile
+
+class TestSimClock(unittest.TestCase):
+    def test_round_trip(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            clock = simclock.ClockFile(filename, period=500)
+            reader = simclock.ClockReader(filename)
+            self.assertEqual(0, reader.now())
+            self.assertEqual(500, clock.step(123456789012))
+            self.assertEqual(123456789012, reader.now())
+            reader.close()
+            clock.close()
+        finally:
+            os.unlink(filename)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python snapshot_test.py
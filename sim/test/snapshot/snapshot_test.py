@@ -0,0 +1,140 @@
+import sys
+sys.path.append("../..")
+import eeprom
+import memory
+import snapshot
+
+import os
+import tempfile
+import unittest
+
+# these have the same methods as the simulavr and sim objects
+class FakeEeprom:
+    def __init__(self, size):
+        self.data = [0] * size
+    def GetSize(self):
+        return len(self.data)
+    def ReadFromAddress(self, addr):
+        return self.data[addr]
+    def WriteAtAddress(self, addr, val):
+        self.data[addr] = val
+
+class FakeDevice:
+    def __init__(self):
+        self.PC = 0
+
+class FakeCrank:
+    def __init__(self):
+        self.currentAngleDegrees = 0
+        self.rpm = 0
+    def SetRPM(self, rpm):
+        self.rpm = rpm
+
+class FakeAnalogPin:
+    def __init__(self, value):
+        self.value = value
+    def GetAnalogValue(self, vcc):
+        return self.value
+    def SetAnalogValue(self, value):
+        self.value = value
+
+class FakeDigitalPin:
+    def __init__(self, state):
+        self.state = state
+    def SetPin(self, state):
+        self.pinState = state
+
+# remembers which addresses were written
+class RecordingMemory(memory.DictMemory):
+    def __init__(self):
+        memory.DictMemory.__init__(self)
+        self.written = set()
+    def set(self, addr, val):
+        self.written.add(addr)
+        memory.DictMemory.set(self, addr, val)
+    def write_block(self, addr, data):
+        self.written.update(range(addr, addr + len(data)))
+        memory.DictMemory.write_block(self, addr, data)
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def makeSnapshot(self):
+        return snapshot.DeviceSnapshot(FakeDevice(), memory.DictMemory(),
+            eeprom.EepromImage(FakeEeprom(4096), self.filename + '.eeprom'), FakeCrank(),
+            {'map': FakeAnalogPin(0.0), 'o2': FakeAnalogPin(0.0)},
+            {'crank': FakeDigitalPin('L')})
+
+    def testRoundTrip(self):
+        warm = self.makeSnapshot()
+        warm.dev.PC = 1234
+        warm.mem.write_block(0x200, bytearray([1, 2, 3]))
+        warm.mem.set(0xc6, 7)   # UDR0, not restored
+        warm.eepromImage.eeprom.data[10] = 42
+        warm.crank.currentAngleDegrees = 359
+        warm.crank.rpm = 2000
+        warm.analog['map'].value = 1.25
+        warm.analog['o2'].value = 2.5
+        warm.digital['crank'].state = 'H'
+        warm.save(self.filename)
+        self.assertEqual(snapshot.HEADER.size + snapshot.RAM_SIZE + 4096 + 3 * snapshot.PIN.size,
+                         os.path.getsize(self.filename))
+
+        cold = self.makeSnapshot()
+        cold.restore(self.filename)
+        self.assertEqual(1234, cold.dev.PC)
+        self.assertEqual(bytearray([1, 2, 3]), cold.mem.read_block(0x200, 3))
+        self.assertEqual(0, cold.mem.get(0xc6))
+        self.assertEqual(42, cold.eepromImage.eeprom.data[10])
+        self.assertEqual(359, cold.crank.currentAngleDegrees)
+        self.assertEqual(2000, cold.crank.rpm)
+        self.assertEqual(1.25, cold.analog['map'].value)
+        self.assertEqual(2.5, cold.analog['o2'].value)
+        self.assertEqual('H', cold.digital['crank'].state)
+        self.assertEqual('H', cold.digital['crank'].pinState)
+
+    def testIo(self):
+        warm = self.makeSnapshot()
+        warm.mem.set(0x5f, 0x82)      # SREG
+        warm.mem.set(0x5d, 0xf0)      # SPL
+        warm.mem.set(0x5e, 0x21)      # SPH
+        warm.mem.set(0x10, 99)        # r16
+        warm.mem.set(0x81, 0x0b)      # TCCR1B
+        warm.mem.set(0x85, 0x12)      # TCNT1H
+        warm.mem.set(0x7a, 0xd7)      # ADCSRA with ADSC and ADIF
+        warm.mem.set(0x36, 0x00)      # TIFR1, nothing pending when saved
+        warm.mem.set(0x20, 0xff)      # PINA
+        warm.save(self.filename)
+
+        cold = self.makeSnapshot()
+        cold.mem = RecordingMemory()
+        cold.mem.set(0x36, 0x02)      # TIFR1 OCF1A pending
+        cold.mem.written.clear()
+        cold.restore(self.filename)
+        self.assertEqual(0x02, cold.mem.get(0x36))   # still pending
+        self.assertEqual(0x82, cold.mem.get(0x5f))
+        self.assertEqual(0x21f0, cold.mem.get(0x5e) << 8 | cold.mem.get(0x5d))
+        self.assertEqual(99, cold.mem.get(0x10))
+        self.assertEqual(0x0b, cold.mem.get(0x81))
+        self.assertEqual(0x12, cold.mem.get(0x85))
+        self.assertEqual(0x87, cold.mem.get(0x7a))   # without ADSC and ADIF
+        # flags, PINx, EECR, SPDR, TWCR, TWDR, UDRn are never written
+        for address in [0x35, 0x36, 0x3c, 0x3b, 0x20, 0x23, 0x106, 0x109, 0x3f,
+                        0x4e, 0xbc, 0xbb, 0xc6, 0xce, 0xd6, 0x136]:
+            self.assertNotIn(address, cold.mem.written)
+
+    def testBadFile(self):
+        with open(self.filename, 'wb') as f:
+            f.write('x' * 100)
+        with self.assertRaises(ValueError):
+            self.makeSnapshot().restore(self.filename)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(SnapshotTest)
+    unittest.TextTestRunner(verbosity=2).run(suite)
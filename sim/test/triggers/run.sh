@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python triggers_test.py
@@ -0,0 +1,67 @@
+import sys
+sys.path.append("../..")
+import triggers
+
+import unittest
+
+# the 36-1 wheel vr.py used to have, 5 degrees per character
+OLD_36_1 = ("LHLHLHLHLHLH" "LHLHLHLHLHLH" "LHLHLHLHLHLH"
+            "LHLHLHLHLHLH" "LHLHLHLHLHLH" "LHLHLHLHLHLL") * 2
+
+class TestTriggers(unittest.TestCase):
+    def test_wheel(self):
+        wheel = triggers.Wheel(triggers.teeth([10, 100], 20))
+        self.assertEqual([10, 30, 100, 120], wheel.angles)
+        self.assertEqual('L', wheel.stateAt(0))
+        self.assertEqual('H', wheel.stateAt(10))
+        self.assertEqual('H', wheel.stateAt(29.9))
+        self.assertEqual('L', wheel.stateAt(30))
+        self.assertEqual('L', wheel.stateAt(719))
+        self.assertEqual(10, wheel.nextEdge(0))
+        self.assertEqual(30, wheel.nextEdge(10))
+        self.assertEqual(10, wheel.nextEdge(120))    # wraps around
+
+    def test_wrapped_tooth(self):
+        wheel = triggers.Wheel(triggers.teeth([710], 20))
+        self.assertEqual([10, 710], wheel.angles)
+        self.assertEqual('H', wheel.stateAt(0))
+        self.assertEqual('L', wheel.stateAt(10))
+
+    def test_empty(self):
+        wheel = triggers.Wheel([])
+        self.assertEqual('L', wheel.stateAt(100))
+        self.assertEqual(None, wheel.nextEdge(100))
+
+    def test_36_1(self):
+        pattern = triggers.PATTERNS['36-1']
+        old = triggers.Wheel(triggers.fromStates(OLD_36_1))
+        self.assertEqual(old.angles, pattern.crank.angles)
+        self.assertEqual(old.states, pattern.crank.states)
+        self.assertEqual(2 * 2 * 35, len(pattern.crank.angles))
+        self.assertEqual(36, pattern.config['triggerTeeth'])
+
+    def test_60_2(self):
+        crank = triggers.PATTERNS['60-2'].crank
+        self.assertEqual(2 * 2 * 58, len(crank.angles))
+        # the gap is before 360
+        self.assertEqual(363, crank.nextEdge(348))
+
+    def test_nissan360(self):
+        pattern = triggers.PATTERNS['nissan360']
+        self.assertEqual(720, len(pattern.crank.angles))
+        self.assertEqual('L', pattern.cam.stateAt(31))
+        self.assertEqual('H', pattern.cam.stateAt(32))
+        self.assertEqual(180 + 24, pattern.cam.nextEdge(180))
+
+    def test_all(self):
+        for name, pattern in triggers.PATTERNS.items():
+            self.assertEqual(name, pattern.name)
+            self.assertTrue(pattern.crank.angles, name)
+            self.assertTrue('TrigPattern' in pattern.config, name)
+            # edges alternate, so every one is a real change of state
+            for wheel in (pattern.crank, pattern.cam):
+                for pos in range(len(wheel.states)):
+                    self.assertNotEqual(wheel.states[pos - 1], wheel.states[pos], name)
+
+if __name__ == '__main__':
+    unittest.main()
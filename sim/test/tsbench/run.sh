@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python tsbench_test.py
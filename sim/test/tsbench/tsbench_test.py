@@ -0,0 +1,98 @@
+import sys
+sys.path.append("../..")
+import tsbench
+
+import unittest
+import os, pty, tty, threading, struct, StringIO
+
+# answers the commands tsbench sends, like comms.ino does, on the
+# master side of a pty
+class FakeEcu:
+    def __init__(self, fd):
+        self.fd = fd
+        self.commands = []
+        self.silent = False
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def read(self, n):
+        data = ''
+        while len(data) < n:
+            d = os.read(self.fd, n - len(data))
+            if not d:
+                raise EOFError()
+            data += d
+        return data
+
+    def run(self):
+        try:
+            while True:
+                command = self.read(1)
+                self.commands.append(command)
+                if command == 'A':
+                    response = ''.join(chr(i) for i in range(tsbench.OCH_BLOCK_SIZE))
+                elif command == 'r':
+                    canid, cmd, offset, length = struct.unpack('<BBHH', self.read(6))
+                    response = ''.join(chr(i) for i in range(offset, offset + length))
+                elif command == 'p':
+                    zero, page, offset, length = struct.unpack('<BBHH', self.read(6))
+                    response = chr(page) * length
+                elif command == 'd':
+                    zero, page = struct.unpack('<BB', self.read(2))
+                    response = struct.pack('>I', 0xdeadbe00 + page)
+                else:
+                    continue
+                if not self.silent:
+                    os.write(self.fd, response)
+        except (EOFError, OSError):
+            return
+
+class TestTsBench(unittest.TestCase):
+    def setUp(self):
+        master, slave = pty.openpty()
+        tty.setraw(master)
+        self.ecu = FakeEcu(master)
+        self.client = tsbench.Client.open(os.ttyname(slave), timeout=0.2)
+        os.close(slave)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(50, tsbench.percentile(values, 50))
+        self.assertEqual(99, tsbench.percentile(values, 99))
+        self.assertEqual(100, tsbench.percentile(values, 100))
+        self.assertEqual(1, tsbench.percentile([1], 90))
+        self.assertEqual(0.0, tsbench.percentile([], 50))
+
+    def test_requests(self):
+        self.assertEqual(tsbench.OCH_BLOCK_SIZE, len(self.client.realtime()))
+        self.assertEqual('\x04\x05\x06', self.client.outputChannels(4, 3))
+        self.assertEqual('\x02' * 288, self.client.readPage(2))
+        self.assertEqual('\x03' * 10, self.client.readPage(3, 100, 10))
+        self.assertEqual(0xdeadbe07, self.client.pageCrc(7))
+
+    def test_timeout(self):
+        self.ecu.silent = True
+        self.assertIsNone(self.client.realtime())
+        self.ecu.silent = False
+        self.assertEqual(0xdeadbe01, self.client.pageCrc(1))
+
+    def test_benchmark(self):
+        benchmark = tsbench.Benchmark(self.client, {'r': 1000, 'p': 500, 'd': 500, 'A': 0})
+        benchmark.run(count=40)
+        stats = benchmark.stats
+        self.assertEqual(40, sum(len(s.wall) for s in stats.values()))
+        self.assertEqual(0, len(stats['A'].wall))
+        self.assertTrue(len(stats['r'].wall) >= 10)
+        self.assertEqual(4 * len(stats['d'].wall), stats['d'].bytes)
+        out = StringIO.StringIO()
+        benchmark.report(out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(5, len(lines))   # times, heading, r, p, d
+        self.assertTrue(lines[2].startswith('r '))
+
+if __name__ == '__main__':
+    unittest.main()
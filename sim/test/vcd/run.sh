@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python vcd_test.py
@@ -0,0 +1,100 @@
+import sys
+sys.path.append("../..")
+import vcd
+
+import os
+import tempfile
+import unittest
+from StringIO import StringIO
+
+# a file that remembers its writes
+class FakeFile(StringIO):
+    def __init__(self):
+        StringIO.__init__(self)
+        self.writes = 0
+        self.closed_value = None
+    def write(self, data):
+        self.writes += 1
+        StringIO.write(self, data)
+    def close(self):
+        self.closed_value = self.getvalue()
+        StringIO.close(self)
+
+SIGNALS = [('crank', 1), ('RPM', 16), ('advance', 8)]
+
+class TestVcd(unittest.TestCase):
+    def test_vcd(self):
+        f = FakeFile()
+        writer = vcd.VcdWriter(f, SIGNALS)
+        writer.change(0, 0, 1)
+        writer.change(0, 1, 2000)
+        writer.change(5, 2, -1)
+        writer.close()
+        lines = f.closed_value.split('\n')
+        self.assertTrue('$var wire 1 ! crank $end' in lines)
+        self.assertTrue('$var wire 16 " RPM $end' in lines)
+        changes = lines[lines.index('$enddefinitions $end') + 1:]
+        self.assertEqual(['#0', '$dumpvars', '0!', 'b0 "', 'b0 #', '$end',
+                          '1!', 'b11111010000 "', '#5', 'b11111111 #', ''], changes)
+
+    def test_vcd_initial(self):
+        f = FakeFile()
+        writer = vcd.VcdWriter(f, SIGNALS, initial=[1, 850, -2])
+        writer.close()
+        lines = f.closed_value.split('\n')
+        changes = lines[lines.index('$enddefinitions $end') + 1:]
+        self.assertEqual(['#0', '$dumpvars', '1!', 'b1101010010 "', 'b11111110 #', '$end', ''],
+                         changes)
+
+    def test_identifier(self):
+        self.assertEqual('!', vcd.VcdWriter.identifier(0))
+        self.assertEqual('~', vcd.VcdWriter.identifier(93))
+        self.assertEqual('!"', vcd.VcdWriter.identifier(94))
+
+    def test_chunks(self):
+        f = FakeFile()
+        writer = vcd.BinaryWriter(f, SIGNALS, chunk=vcd.CHANGE.size * 100)
+        writes = f.writes
+        for t in range(1000):
+            writer.change(t, 0, t % 2)
+        # one write per 100 changes, not per change
+        self.assertTrue(f.writes - writes <= 11)
+        writer.close()
+
+    def test_binary(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            writer = vcd.openTrace(filename, SIGNALS, initial=[0, 800, 0])
+            writer.change(0, 0, 1)
+            writer.change(10, 2, -5)
+            writer.change(20, 1, 2**32 - 1)     # a uint32 field
+            writer.close()
+            with open(filename, 'rb') as f:
+                signals, changes = vcd.readBinary(f)
+            self.assertEqual(SIGNALS, signals)
+            self.assertEqual([(0, 0, 0), (0, 1, 800), (0, 2, 0),
+                              (0, 0, 1), (10, 2, -5), (20, 1, 2**32 - 1)], changes)
+        finally:
+            os.unlink(filename)
+
+    def test_long_name(self):
+        with self.assertRaises(ValueError):
+            vcd.BinaryWriter(FakeFile(), [('a_very_long_signal_name', 1)])
+
+    def test_ring(self):
+        ring = vcd.TraceRing(3)
+        for t in range(4):
+            ring.change(t, 0, t % 2)
+        ring.change(4, 0, 2**32 - 2)
+        class Collect:
+            def __init__(self):
+                self.changes = []
+            def change(self, t, index, value):
+                self.changes.append((t, index, value))
+        collect = Collect()
+        ring.writeTo(collect)
+        self.assertEqual([(2, 0, 0), (3, 0, 1), (4, 0, 2**32 - 2)], collect.changes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,3 @@
+#!/bin/sh
+
+python waveforms_test.py
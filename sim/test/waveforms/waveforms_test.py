@@ -0,0 +1,60 @@
+import sys
+sys.path.append("../..")
+import waveforms
+
+import itertools
+import os
+import tempfile
+import unittest
+
+def take(waveform, count):
+    return list(itertools.islice(waveform, count))
+
+class TestWaveforms(unittest.TestCase):
+    def test_constant(self):
+        self.assertEqual([(0, 2.5)], list(waveforms.constant(2.5)))
+
+    def test_steps(self):
+        self.assertEqual([(0, 1.0), (2000000000, 2.0)],
+            list(waveforms.steps([(0, 1.0), (1, 1.0), (2, 2.0)])))
+
+    def test_ramp(self):
+        events = list(waveforms.ramp([(0, 0.0), (0.03, 3.0), (1, 3.0)]))
+        self.assertEqual([0, 10000000, 20000000, 30000000], [t for t, v in events])
+        for (t, volts), expected in zip(events, [0.0, 1.0, 2.0, 3.0]):
+            self.assertAlmostEqual(expected, volts)
+
+    def test_sine(self):
+        events = take(waveforms.sine(2.5, 1.0, 25), 3)
+        self.assertAlmostEqual(2.5, events[0][1])
+        self.assertAlmostEqual(3.5, events[1][1])
+        self.assertAlmostEqual(2.5, events[2][1])
+
+    def test_random_walk(self):
+        walk = take(waveforms.randomWalk(2.5, 1), 100)
+        self.assertEqual(walk, take(waveforms.randomWalk(2.5, 1), 100))
+        self.assertNotEqual(walk, take(waveforms.randomWalk(2.5, 2), 100))
+        self.assertEqual((0, 2.5), walk[0])
+        for (t0, v0), (t1, v1) in zip(walk, walk[1:]):
+            self.assertTrue(t1 > t0)
+            self.assertTrue(abs(v1 - v0) <= 0.05)
+
+    def test_random_walk_limits(self):
+        # pinned at the top it doesn't yield the same value again
+        walk = take(waveforms.randomWalk(5.0, 3, step=0.01, low=4.99), 50)
+        for (t0, v0), (t1, v1) in zip(walk, walk[1:]):
+            self.assertNotEqual(v0, v1)
+            self.assertTrue(4.99 <= v1 <= 5.0)
+
+    def test_trace(self):
+        fd, filename = tempfile.mkstemp()
+        try:
+            os.write(fd, "seconds,volts\n0,1.5\n0.5,1.5\n1.5,4\n")
+            os.close(fd)
+            self.assertEqual([(0, 1.5), (1500000000, 4.0)],
+                             list(waveforms.trace(filename)))
+        finally:
+            os.unlink(filename)
+
+if __name__ == '__main__':
+    unittest.main()
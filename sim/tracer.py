@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#
+# Signal tracing for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+
+import heapq
+
+# every period ns, copies the new edges of some pins (anything with a
+# pulses.EdgeBuffer called edges), and the struct members that
+# changed to a writer from vcd.py.  the pins keep their own edges, so
+# this doesn't cost anything per edge.  add it to a
+# dispatcher.Dispatcher to get it stepped.
+class Tracer(object):
+    # pins is a list of (name, pin)
+    def __init__(self, sc, writer, pins, variables=None, struct_name=None,
+                 fields=(), period=10000000):
+        self.sc = sc
+        self.writer = writer
+        self.pins = [pin for name, pin in pins]
+        self.variables = variables
+        self.struct_name = struct_name
+        self.fields = fields
+        self.period = period
+        self.since = [pin.edges.count for pin in self.pins]
+        self.values = {}
+        if fields:    # what's there now went in the writer's initial values
+            snapshot = variables.snapshot(struct_name)
+            self.values = dict((field, int(snapshot[field])) for field in fields)
+        self.dropped = 0   # edges that fell out of a pin's buffer first
+
+    # (name, width) for the writer
+    @staticmethod
+    def signals(pins, variables=None, struct_name=None, fields=()):
+        result = [(name, 1) for name, pin in pins]
+        for field in fields:
+            descriptor = variables.descriptor('%s.%s' % (struct_name, field))
+            result.append((field, descriptor.bit_size or descriptor.byte_size * 8))
+        return result
+
+    # the values now, in the same order, for the writer's initial values
+    @staticmethod
+    def initial(pins, variables=None, struct_name=None, fields=()):
+        result = [pin.level() for name, pin in pins]
+        if fields:
+            snapshot = variables.snapshot(struct_name)
+            result.extend(int(snapshot[field]) for field in fields)
+        return result
+
+    def collect(self):
+        edges = []
+        for index, pin in enumerate(self.pins):
+            buf = pin.edges
+            self.dropped += max(0, buf.count - buf.size - self.since[index])
+            edges.append([(t, index, state) for t, state in buf.edges(self.since[index])])
+            self.since[index] = buf.count
+        change = self.writer.change
+        for t, index, state in heapq.merge(*edges):
+            change(int(t), index, state)
+        if self.fields:
+            now = self.sc.GetCurrentTime()
+            snapshot = self.variables.snapshot(self.struct_name)
+            for index, field in enumerate(self.fields, len(self.pins)):
+                value = int(snapshot[field])
+                if self.values.get(field) != value:
+                    change(now, index, value)
+                    self.values[field] = value
+
+    # for dispatcher.Dispatcher
+    def step(self, now):
+        self.collect()
+        return self.period
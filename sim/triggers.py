@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# Trigger wheel patterns for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# each pattern is the crank and cam signals over one engine cycle (720
+# degrees), as lists of (angle, state) edges, plus the configPage4 values
+# that select the matching decoder in speeduino/decoders.ino.
+#
+# teeth are 'H' and the gaps between them are 'L', so with TrigEdge = 0
+# (rising) the decoder sees the leading edge of each tooth.
+
+import bisect
+
+# the edges of one signal, split into parallel lists so lookups are just
+# a bisect.
+class Wheel(object):
+    def __init__(self, edges):
+        edges = sorted((angle % 720, state) for angle, state in edges)
+        self.angles = [angle for angle, state in edges]
+        self.states = [state for angle, state in edges]
+
+    # 'H' or 'L' at angle (0-720).  before the first edge it's whatever
+    # the last edge left it at, since the pattern repeats.
+    def stateAt(self, angle):
+        if not self.angles:
+            return 'L'
+        return self.states[bisect.bisect_right(self.angles, angle) - 1]
+
+    # angle of the first edge after angle, or None if there are no edges
+    def nextEdge(self, angle):
+        if not self.angles:
+            return None
+        pos = bisect.bisect_right(self.angles, angle)
+        return self.angles[pos % len(self.angles)]
+
+# edges for teeth given as (start, width) in degrees
+def teeth(starts, width):
+    edges = []
+    for start in starts:
+        edges.append((start, 'H'))
+        edges.append((start + width, 'L'))
+    return edges
+
+# edges from a string of 'L' and 'H' spread evenly over 720 degrees
+def fromStates(states):
+    step = 720.0 / len(states)
+    return [(pos * step, states[pos]) for pos in range(len(states))
+            if states[pos] != states[pos - 1]]
+
+class TriggerPattern(object):
+    def __init__(self, name, crank, cam, config):
+        self.name = name
+        self.crank = Wheel(crank)
+        self.cam = Wheel(cam)
+        self.config = config  # { variable name: value }
+
+# one tooth on the cam, 45 degrees wide starting at 405
+CAM_ONE_TOOTH = teeth([405], 45)
+
+# n-m on the crank, each tooth is half the pitch, the missing ones are last.
+def missingTooth(count, missing):
+    pitch = 360.0 / count
+    starts = [rev * 360 + tooth * pitch + pitch / 2
+              for rev in range(2) for tooth in range(count - missing)]
+    return TriggerPattern('%d-%d' % (count, missing), teeth(starts, pitch / 2),
+        CAM_ONE_TOOTH,
+        {'TrigPattern': 0, 'TrigSpeed': 0,
+         'triggerTeeth': count, 'triggerMissingTeeth': missing})
+
+# even teeth on the crank and one on the cam
+def dualWheel(count):
+    pitch = 360.0 / count
+    starts = [tooth * pitch + pitch / 2 for tooth in range(count * 2)]
+    return TriggerPattern('dual-%d' % count, teeth(starts, pitch / 2),
+        CAM_ONE_TOOTH,
+        {'TrigPattern': 2, 'TrigSpeed': 0,
+         'triggerTeeth': count, 'triggerMissingTeeth': 0})
+
+# one tooth per cylinder per cycle, no cam.  the decoder uses
+# configPage2.nCylinders, which sim.py sets to 4.
+def distributor(cylinders):
+    pitch = 720.0 / cylinders
+    starts = [tooth * pitch for tooth in range(cylinders)]
+    return TriggerPattern('distributor-%d' % cylinders, teeth(starts, pitch / 2),
+        [], {'TrigPattern': 1})
+
+# six teeth 60 degrees apart plus a sync tooth 20 degrees after the
+# second one, which the decoder calls tooth 3.
+def gm7x():
+    starts = [rev * 360 + tooth * 60 for rev in range(2) for tooth in range(6)]
+    starts += [rev * 360 + 80 for rev in range(2)]
+    return TriggerPattern('gm7x', teeth(starts, 10), [],
+        {'TrigPattern': 3, 'TrigSpeed': 0})
+
+# 360 slots on the cam (one per 2 crank degrees) and, for 4 cylinders, 4
+# windows of 16, 12, 8 and 4 slots starting at each TDC.  with
+# TrigEdgeSec = 0 the windows are where the cam signal is low.
+def nissan360():
+    crank = teeth([slot * 2 + 1 for slot in range(360)], 1)
+    cam = []
+    for cylinder, slots in enumerate([16, 12, 8, 4]):
+        cam.append((cylinder * 180, 'L'))
+        cam.append((cylinder * 180 + slots * 2, 'H'))
+    return TriggerPattern('nissan360', crank, cam,
+        {'TrigPattern': 12, 'TrigEdgeSec': 0})
+
+PATTERNS = dict((pattern.name, pattern) for pattern in [
+    missingTooth(36, 1), missingTooth(60, 2), missingTooth(24, 1),
+    missingTooth(12, 1), missingTooth(4, 1), dualWheel(36), dualWheel(12),
+    distributor(4), gm7x(), nissan360()])
+
+DEFAULT = '36-1'
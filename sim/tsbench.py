@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+# TunerStudio protocol load generator for the simulator
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# talks to the simulated ecu over its pty the way TunerStudio does (see
+# reference/speeduino.ini and speeduino/comms.ino), with each kind of
+# request at its own rate, and reports throughput and latency.  latency
+# in simulated time needs the sim to write a clock file (sim.py
+# --clock-file, see simclock.py).
+#
+#   A   realtime data, ochBlockSize bytes
+#   r   output channels, 'r' canid 0x30 offset length
+#   p   page read, 'p' 0 page offset length
+#   d   page crc32, 'd' 0 page, 4 bytes big-endian
+
+import os, sys, time, select, tty, errno, struct, math, optparse
+import simclock
+
+OCH_BLOCK_SIZE = 99
+# page number: size, from pageSize in the ini
+PAGE_SIZES = dict(enumerate([128, 288, 288, 128, 288, 128, 240, 192, 192, 192, 288], 1))
+CAN_ID = 0
+KINDS = ['A', 'r', 'p', 'd']
+
+# nearest rank, values sorted
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+class Client(object):
+    # fd is anything non-blocking that talks to the ecu
+    def __init__(self, fd, timeout=1.0):
+        self.fd = fd
+        self.timeout = timeout   # wall seconds
+
+    @staticmethod
+    def open(port, timeout=1.0):
+        fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(fd)
+        return Client(fd, timeout)
+
+    def close(self):
+        os.close(self.fd)
+
+    # the length bytes of the response to command, or None if they don't
+    # all come in time
+    def request(self, command, length):
+        os.write(self.fd, command)
+        chunks = []
+        remaining = length
+        deadline = time.time() + self.timeout
+        while remaining > 0:
+            wait = deadline - time.time()
+            if wait <= 0 or not select.select([self.fd], [], [], wait)[0]:
+                self.drain()     # a late answer would look like the next one
+                return None
+            try:
+                data = os.read(self.fd, remaining)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    continue
+                raise
+            chunks.append(data)
+            remaining -= len(data)
+        return ''.join(chunks)
+
+    # throw away anything that arrives in the next wait seconds
+    def drain(self, wait=0.1):
+        while select.select([self.fd], [], [], wait)[0]:
+            try:
+                if not os.read(self.fd, 4096):
+                    return
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+
+    def realtime(self):
+        return self.request('A', OCH_BLOCK_SIZE)
+
+    def outputChannels(self, offset=0, length=OCH_BLOCK_SIZE):
+        return self.request(struct.pack('<cBBHH', 'r', CAN_ID, 0x30, offset, length), length)
+
+    def readPage(self, page, offset=0, length=None):
+        if length is None:
+            length = PAGE_SIZES[page] - offset
+        return self.request(struct.pack('<cBBHH', 'p', 0, page, offset, length), length)
+
+    # the crc, or None
+    def pageCrc(self, page):
+        data = self.request(struct.pack('<cBB', 'd', 0, page), 4)
+        if data is None:
+            return None
+        return struct.unpack('>I', data)[0]
+
+# the latencies of one kind of request
+class KindStats(object):
+    def __init__(self):
+        self.wall = []      # seconds
+        self.sim = []       # ns
+        self.timeouts = 0
+        self.bytes = 0
+
+# sends each kind of request rates[kind] times a wall second, one at a
+# time, because the protocol has no framing.  when the ecu can't keep up,
+# they go back to back.
+class Benchmark(object):
+    # clock is a simclock.ClockReader, or None
+    def __init__(self, client, rates, clock=None, pages=sorted(PAGE_SIZES)):
+        self.client = client
+        self.rates = dict((kind, rate) for kind, rate in rates.items() if rate)
+        self.clock = clock
+        self.pages = pages
+        self.page = 0        # index of the next page to read or crc
+        self.stats = dict((kind, KindStats()) for kind in KINDS)
+        self.wallTime = 0.0
+        self.simTime = 0
+
+    def nextPage(self):
+        page = self.pages[self.page % len(self.pages)]
+        self.page += 1
+        return page
+
+    def issue(self, kind):
+        client = self.client
+        stats = self.stats[kind]
+        simStart = self.clock.now() if self.clock else 0
+        wallStart = time.time()
+        if kind == 'A':
+            result = client.realtime()
+        elif kind == 'r':
+            result = client.outputChannels()
+        elif kind == 'p':
+            result = client.readPage(self.nextPage())
+        else:
+            result = client.pageCrc(self.nextPage())
+        wallEnd = time.time()
+        if result is None:
+            stats.timeouts += 1
+            return
+        stats.wall.append(wallEnd - wallStart)
+        if self.clock:
+            stats.sim.append(self.clock.now() - simStart)
+        stats.bytes += 4 if kind == 'd' else len(result)
+
+    # for seconds of wall time, or until count requests
+    def run(self, seconds=None, count=None):
+        if not self.rates:
+            return
+        wallStart = time.time()
+        simStart = self.clock.now() if self.clock else 0
+        due = dict((kind, wallStart) for kind in self.rates)
+        issued = 0
+        while True:
+            now = time.time()
+            if seconds is not None and now - wallStart >= seconds:
+                break
+            if count is not None and issued >= count:
+                break
+            kind = min(due, key=due.get)
+            if due[kind] > now:
+                time.sleep(due[kind] - now)
+            self.issue(kind)
+            issued += 1
+            # no catching up after a stall, just the next one
+            due[kind] = max(due[kind] + 1.0 / self.rates[kind], time.time() - 1.0 / self.rates[kind])
+        self.wallTime += time.time() - wallStart
+        if self.clock:
+            self.simTime += self.clock.now() - simStart
+
+    def report(self, out=sys.stdout):
+        out.write("%.1f s wall" % self.wallTime)
+        if self.clock:
+            out.write(", %.3f s simulated" % (self.simTime / 10.0**9))
+        out.write("\n")
+        out.write("kind  count  timeouts    req/s  bytes/s   wall ms p50/p90/p99/max")
+        if self.clock:
+            out.write("        sim ms p50/p90/p99/max")
+        out.write("\n")
+        for kind in KINDS:
+            stats = self.stats[kind]
+            if not stats.wall and not stats.timeouts:
+                continue
+            rate = len(stats.wall) / self.wallTime if self.wallTime else 0.0
+            byteRate = stats.bytes / self.wallTime if self.wallTime else 0.0
+            wall = sorted(stats.wall)
+            out.write("%-4s %6d %9d %8.1f %8.0f   %s" % (
+                kind, len(stats.wall), stats.timeouts, rate, byteRate,
+                '/'.join("%.2f" % (1000 * percentile(wall, p)) for p in (50, 90, 99, 100))))
+            if self.clock:
+                sim = sorted(stats.sim)
+                out.write("   %s" % '/'.join("%.3f" % (percentile(sim, p) / 10.0**6)
+                                             for p in (50, 90, 99, 100)))
+            out.write("\n")
+
+def main():
+    opts = optparse.OptionParser("%prog [options]")
+    opts.add_option("--port", type="string", dest="port", default="/tmp/pseudoserial",
+                    help="the simulator's pty")
+    opts.add_option("--seconds", type="float", dest="seconds", default=10.0,
+                    help="how long to run, wall time")
+    opts.add_option("--realtime-rate", type="float", dest="realtime_rate", default=0,
+                    help="'A' realtime requests per second")
+    opts.add_option("--och-rate", type="float", dest="och_rate", default=15,
+                    help="'r' output channel requests per second")
+    opts.add_option("--page-rate", type="float", dest="page_rate", default=1,
+                    help="'p' page reads per second, all the pages in turn")
+    opts.add_option("--crc-rate", type="float", dest="crc_rate", default=1,
+                    help="'d' page crc requests per second")
+    opts.add_option("--timeout", type="float", dest="timeout", default=1.0,
+                    help="seconds to wait for each response")
+    opts.add_option("--clock-file", type="string", dest="clock_file",
+                    help="the sim's --clock-file, for latency in simulated time")
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    client = Client.open(options.port, options.timeout)
+    clock = simclock.ClockReader(options.clock_file) if options.clock_file else None
+    benchmark = Benchmark(client, {'A': options.realtime_rate, 'r': options.och_rate,
+                                   'p': options.page_rate, 'd': options.crc_rate}, clock)
+    benchmark.run(options.seconds)
+    benchmark.report()
+    client.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#
+# Signal trace files for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# writers take (ns, signal index, value) changes, in time order, and write
+# them in chunks of about chunk bytes, so a long run is never all in
+# memory and the file isn't written once per change.
+#
+# VcdWriter writes a value change dump for GTKWave.  BinaryWriter writes
+# a smaller file:
+#
+#   header   magic 'SPDT', version, signal count
+#   signals  signal count * (name, up to 16 characters, width)
+#   changes  (ns, signal index, value) until the end of the file, starting
+#            with every signal's initial value at 0
+#
+# TraceRing keeps only the last size changes, for writing out later.
+
+import array
+import struct
+
+MAGIC = 'SPDT'
+VERSION = 2
+HEADER = struct.Struct('<4sHH')
+SIGNAL = struct.Struct('<16sH')
+CHANGE = struct.Struct('<QHq')   # uint32 fields don't fit in an int32
+
+class ChunkedWriter(object):
+    def __init__(self, f, chunk):
+        self.f = f
+        self.chunk = chunk
+        self.pending = []
+        self.pendingBytes = 0
+
+    def put(self, data):
+        self.pending.append(data)
+        self.pendingBytes += len(data)
+        if self.pendingBytes >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.f.write(''.join(self.pending))
+            self.pending = []
+            self.pendingBytes = 0
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+# signals is a list of (name, width in bits), initial a list of their
+# values at 0 (all 0 by default)
+class VcdWriter(ChunkedWriter):
+    def __init__(self, f, signals, chunk=65536, initial=None):
+        ChunkedWriter.__init__(self, f, chunk)
+        self.signals = signals
+        self.ids = [self.identifier(index) for index in range(len(signals))]
+        self.time = None
+        self.put("$timescale 1ns $end\n$scope module sim $end\n")
+        for ident, (name, width) in zip(self.ids, signals):
+            self.put("$var wire %d %s %s $end\n" % (width, ident, name))
+        self.put("$upscope $end\n$enddefinitions $end\n")
+        # otherwise everything is x until its first change
+        self.put("#0\n$dumpvars\n")
+        self.time = 0
+        for index, value in enumerate(initial or [0] * len(signals)):
+            self.value(index, value)
+        self.put("$end\n")
+
+    # printable ascii, as short as possible
+    @staticmethod
+    def identifier(index):
+        ident = ''
+        while True:
+            ident += chr(33 + index % 94)
+            index //= 94
+            if not index:
+                return ident
+
+    def change(self, t, index, value):
+        if t != self.time:
+            self.put("#%d\n" % t)
+            self.time = t
+        self.value(index, value)
+
+    def value(self, index, value):
+        width = self.signals[index][1]
+        if width == 1:
+            self.put("%d%s\n" % (value & 1, self.ids[index]))
+        else:
+            value &= (1 << width) - 1   # two's complement for negatives
+            self.put("b%s %s\n" % (bin(value)[2:], self.ids[index]))
+
+class BinaryWriter(ChunkedWriter):
+    def __init__(self, f, signals, chunk=65536, initial=None):
+        ChunkedWriter.__init__(self, f, chunk)
+        self.put(HEADER.pack(MAGIC, VERSION, len(signals)))
+        for name, width in signals:
+            if len(name) > SIGNAL.size - 2:
+                raise ValueError("signal name %s is too long" % name)
+            self.put(SIGNAL.pack(name, width))
+        for index, value in enumerate(initial or [0] * len(signals)):
+            self.change(0, index, value)
+
+    def change(self, t, index, value):
+        self.put(CHANGE.pack(t, index, value))
+
+# (signals, [(ns, index, value)]) from a BinaryWriter file
+def readBinary(f):
+    data = f.read()
+    magic, version, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a trace, or the wrong version")
+    offset = HEADER.size
+    signals = []
+    for index in range(count):
+        name, width = SIGNAL.unpack_from(data, offset)
+        signals.append((name.rstrip('\0'), width))
+        offset += SIGNAL.size
+    changes = [CHANGE.unpack_from(data, pos)
+               for pos in range(offset, len(data) - CHANGE.size + 1, CHANGE.size)]
+    return signals, changes
+
+# the same change() as the writers.  the arrays are allocated once.  there's
+# no 64 bit integer array in python 2, so values are doubles, which hold
+# integers exactly up to 2^53.
+class TraceRing(object):
+    def __init__(self, size):
+        self.size = size
+        self.times = array.array('d', [0.0]) * size
+        self.indexes = array.array('H', [0]) * size
+        self.values = array.array('d', [0.0]) * size
+        self.count = 0
+
+    def change(self, t, index, value):
+        pos = self.count % self.size
+        self.times[pos] = t
+        self.indexes[pos] = index
+        self.values[pos] = value
+        self.count += 1
+
+    # oldest first
+    def writeTo(self, writer):
+        first = max(0, self.count - self.size)
+        for count in xrange(first, self.count):
+            pos = count % self.size
+            writer.change(int(self.times[pos]), self.indexes[pos], int(self.values[pos]))
+
+# .vcd files are vcd, anything else is binary
+def openTrace(filename, signals, chunk=65536, initial=None):
+    writer = VcdWriter if filename.endswith('.vcd') else BinaryWriter
+    return writer(open(filename, 'wb'), signals, chunk, initial)
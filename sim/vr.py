@@ -7,61 +7,58 @@
 # This file may be distributed under the terms of the GNU GPLv3 license.
 
 import pysimulavr, sys
+import triggers
+import pulses
 
 # Base class
-class VrPin(pysimulavr.PySimulationMember, pysimulavr.Pin):
-    def __init__(self, crank, sc):
+# the pin only wakes up at its edges: it asks the crank how long until the
+# next change of state and sleeps until then.  add it to a
+# dispatcher.Dispatcher to get it stepped.
+class VrPin(pysimulavr.Pin):
+    def __init__(self, crank, sc, wheel):
         pysimulavr.Pin.__init__(self)
-        pysimulavr.PySimulationMember.__init__(self)
         self.crank = crank
-        self.states = "L"
-        self.state = self.states[0]
         self.sc = sc
+        self.wheel = wheel  # triggers.Wheel
+        self.state = self.wheel.stateAt(0)
+        self.edges = pulses.EdgeBuffer()
 
-    # overrides PySimulationMember.DoStep()
-    def DoStep(self, trueHwStep):
-        pos = len(self.states) * self.crank.currentAngleDegrees/720
-        posFloor = int(pos)
-        self.state = self.states[posFloor]
+    # 1 for high
+    def level(self):
+        return int(self.state == 'H')
+
+    # ns until the next edge, or -1
+    def step(self, now):
+        angle = self.crank.angleAt(now)
+        state = self.wheel.stateAt(angle)
+        if state != self.state:
+            self.edges.record(now, state == 'H')
+        self.state = state
         self.SetPin(self.state)
-        #self.printDebug(posFloor)
-        remainingDegrees = (pos + 1 - posFloor) * 720 / len(self.states)
-        remainingNs = remainingDegrees * self.crank.nsecPerDegree
-        return int(remainingNs)
+        #self.printDebug()
+        nextEdge = self.wheel.nextEdge(angle)
+        if nextEdge is None:
+            return -1  # this means "don't call anymore"
+        # -1 if the crank has stopped; a Crank listener has to add the pin
+        # back when it starts again
+        return self.crank.nsecUntil(nextEdge)
 
-    def printDebug(self, posFloor):
-        print "time %d VR pin %s degrees %d idx %d state %s" % (
+    def printDebug(self):
+        print "time %d VR pin %s degrees %d state %s" % (
             self.sc.GetCurrentTime(), self.name(),
-            self.crank.currentAngleDegrees, posFloor, self.state)
+            self.crank.currentAngleDegrees, self.state)
 
-# Simulate a 36-1 sensor for crank
+# Crank wheel, 36-1 unless some other pattern is given
 class CrankVrPin(VrPin):
-    def __init__(self, crank, sc):
-        VrPin.__init__(self, crank, sc)
-        # 36-1, two revolutions
-        #                1 2 3 4 5 6
-        self.states = ("LHLHLHLHLHLH"
-                       "LHLHLHLHLHLH"
-                       "LHLHLHLHLHLH"
-                       "LHLHLHLHLHLH"
-                       "LHLHLHLHLHLH"
-                       "LHLHLHLHLHLL"
-                       "LHLHLHLHLHLH"
-                       "LHLHLHLHLHLH"
-                       "LHLHLHLHLHLH"
-                       "LHLHLHLHLHLH"
-                       "LHLHLHLHLHLH"
-                       "LHLHLHLHLHLL")
+    def __init__(self, crank, sc, pattern=triggers.PATTERNS[triggers.DEFAULT]):
+        VrPin.__init__(self, crank, sc, pattern.crank)
     def name(self):
         return "crank"
 
     
-# Simulate a one-tooth sensor for cam
+# Cam wheel, one tooth unless some other pattern is given
 class CamVrPin(VrPin):
-    def __init__(self, crank, sc):
-        VrPin.__init__(self, crank, sc)
-        # one tooth out of 8 positions
-        #                1 2 3 4 5 6 7 8
-        self.states = ("LLLLLLLLLHLLLLLL")
+    def __init__(self, crank, sc, pattern=triggers.PATTERNS[triggers.DEFAULT]):
+        VrPin.__init__(self, crank, sc, pattern.cam)
     def name(self):
         return "cam"
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# Analog input waveforms for simulavr
+#
+# Copyright (C) 2019  Joel Truher (Google LLC)
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+#
+# a waveform is a generator of (ns, volts) pairs, in time order, ns from
+# when the waveform starts.  it only yields when the value changes, so a
+# steady input costs nothing after the first value.  see
+# inputs.InputScheduler for what plays them.
+
+import csv
+import math
+import random
+
+# 10ms, like the old random walk
+PERIOD = 10000000
+
+def constant(volts):
+    yield 0, volts
+
+# holds each (seconds, volts) value until the next one
+def steps(points):
+    last = None
+    for sec, volts in sorted(points):
+        if volts != last:
+            yield int(sec * 10**9), volts
+            last = volts
+
+# straight lines between (seconds, volts) points, sampled every period ns,
+# holding the last value.
+def ramp(points, period=PERIOD):
+    points = sorted(points)
+    last = None
+    for (sec0, volts0), (sec1, volts1) in zip(points, points[1:]):
+        t0, t1 = int(sec0 * 10**9), int(sec1 * 10**9)
+        if volts0 == volts1:
+            if volts0 != last:
+                yield t0, volts0
+                last = volts0
+            continue
+        for t in xrange(t0, t1, period):
+            volts = volts0 + (volts1 - volts0) * (t - t0) / float(t1 - t0)
+            yield t, volts
+            last = volts
+    if points and points[-1][1] != last:
+        yield int(points[-1][0] * 10**9), points[-1][1]
+
+def sine(mean, amplitude, hz, period=PERIOD):
+    t = 0
+    while True:
+        yield t, mean + amplitude * math.sin(2 * math.pi * hz * t / 10**9)
+        t += period
+
+# a step of up to +/- step volts every period, between low and high.
+# the same seed always gives the same walk.
+def randomWalk(start, seed, step=0.05, low=0.0, high=5.0, period=PERIOD):
+    rand = random.Random(seed)
+    volts = start
+    yield 0, volts
+    t = 0
+    while True:
+        t += period
+        walked = min(high, max(low, volts + step * (2 * rand.random() - 1)))
+        if walked != volts:   # stuck at low or high
+            volts = walked
+            yield t, volts
+
+# a recorded trace, csv lines of "seconds,volts".  lines that don't start
+# with a number (headers, comments) are skipped.
+def trace(filename):
+    points = []
+    with open(filename, 'rb') as f:
+        for row in csv.reader(f):
+            try:
+                points.append((float(row[0]), float(row[1])))
+            except (IndexError, ValueError):
+                continue
+    return steps(points)